@@ -3,26 +3,86 @@ from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from config import config
 from app.models import db
+from app.models.routing import configure_engines, ReplicaRouter
 from app.services.mqtt_service import MQTTService
+from app.services.compaction_service import CompactionService
+from app.services.ingest_service import IngestService
+from app.services.block_storage_service import BlockStorageService
+from app.services.sketch_service import SketchService
+from app.services.group_aggregate_service import GroupAggregateService
+from app.services.anomaly_service import AnomalyService
+from app.services.liveness_service import LivenessService
+from app.services.purge_service import SensorPurgeService
+from app.services.job_service import JobService, JobWorker
+from app.services.device_key_service import DeviceKeyService
+from app.services.password_service import PasswordService
+from app.services.cache_service import ResultCache
+from app.services.alert_lifecycle_service import AlertLifecycleService
+from app.services.dedup_service import DedupService
+from app.services import key_rotation_service  # Registers the key rotation jobs
+from app.utils.profiling import RequestProfiler
+from app.utils.compression import ResponseCompressor
+from app.utils.json_provider import JSON_PROVIDERS
 
 # Initialize extensions
 jwt = JWTManager()
 mqtt_service = MQTTService()
+compaction_service = CompactionService()
+ingest_service = IngestService()
+block_storage = BlockStorageService()
+sketch_service = SketchService()
+group_aggregates = GroupAggregateService()
+anomaly_service = AnomalyService()
+liveness_service = LivenessService()
+sensor_purge = SensorPurgeService()
+job_service = JobService()
+profiler = RequestProfiler()
+compressor = ResponseCompressor()
+device_keys = DeviceKeyService()
+passwords = PasswordService()
+result_cache = ResultCache()
+alert_lifecycle = AlertLifecycleService()
+dedup_service = DedupService()
+replica_router = ReplicaRouter(db)
 
-def create_app(config_name='default'):
-    """Application factory"""
+def create_app(config_name='default', with_ingest=True):
+    """Application factory (with_ingest=False for job workers: no MQTT, no block sealer)"""
     app = Flask(__name__)
 
     # Load configuration
     app.config.from_object(config[config_name])
 
+    # Fast JSON serialization (native datetime encoding)
+    app.json = JSON_PROVIDERS[app.config['JSON_PROVIDER']](app)
+
     # Initialize extensions
+    configure_engines(app)
     db.init_app(app)
+    replica_router.init_app(app)
     jwt.init_app(app)
+    passwords.init_app(app)
     CORS(app)
+    # Registered before the profiler so compression runs after it adds its payload
+    compressor.init_app(app)
+    profiler.init_app(app)
 
-    # Initialize MQTT service
+    # Initialize ingestion (row or block storage) and MQTT service
+    block_storage.init_app(app)
+    sketch_service.init_app(app)
+    group_aggregates.init_app(app)
+    anomaly_service.init_app(app)
+    liveness_service.init_app(app)
+    result_cache.init_app(app)
+    dedup_service.init_app(app)
+    ingest_service.init_app(app)
     mqtt_service.init_app(app)
+    alert_lifecycle.init_app(app)
+    device_keys.init_app(app)
+
+    # Initialize background jobs (retention compaction, sensor deletion)
+    job_service.init_app(app)
+    compaction_service.init_app(app)
+    sensor_purge.init_app(app)
 
     # Register blueprints
     from app.routes import register_blueprints
@@ -48,7 +108,37 @@ def create_app(config_name='default'):
             print("Default admin user created (username: admin, password: admin123)")
 
     # Connect to MQTT broker
-    mqtt_service.connect()
+    if with_ingest and app.config.get('MQTT_ENABLED', True):
+        mqtt_service.connect()
+
+    # Seal hot blocks in block storage mode
+    if with_ingest and block_storage.enabled:
+        block_storage.start()
+
+    # Flush quantile sketches updated at ingest
+    if with_ingest and sketch_service.enabled:
+        sketch_service.start()
+
+    # Flush the (location, type) aggregates updated at ingest
+    if with_ingest and group_aggregates.enabled:
+        group_aggregates.start()
+
+    # Checkpoint the anomaly detector states fed at ingest
+    if with_ingest and anomaly_service.enabled:
+        anomaly_service.start()
+
+    # Report sensors that stopped sending data
+    if with_ingest and liveness_service.enabled:
+        liveness_service.start()
+
+    # Share the result cache invalidations with the other processes (job workers included)
+    if result_cache.enabled:
+        result_cache.start()
+
+    # Development: run background jobs in this process instead of worker.py
+    if with_ingest and app.config.get('JOB_EMBEDDED_WORKER'):
+        worker = create_job_worker(app)
+        worker.start()
 
     # Health check endpoint
     @app.route('/api/health', methods=['GET'])
@@ -56,3 +146,12 @@ def create_app(config_name='default'):
         return {'status': 'healthy', 'message': 'IoT Platform API is running'}, 200
 
     return app
+
+def create_job_worker(app, name=None):
+    """Job worker with the periodic jobs of this configuration"""
+    worker = JobWorker(app, name)
+    if app.config.get('COMPACTION_ENABLED'):
+        worker.schedule('compaction', app.config['COMPACTION_INTERVAL'])
+    if app.config.get('ALERT_ARCHIVE_ENABLED'):
+        worker.schedule('alert_archive', app.config['ALERT_ARCHIVE_INTERVAL'])
+    return worker
@@ -0,0 +1,165 @@
+import asyncio
+import contextlib
+import os
+from datetime import datetime
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Route
+from app import create_app
+from app.services.async_ingest_service import AsyncIngestService
+from app.services.device_key_service import API_KEY_HEADER
+from app.services.ingest_service import parse_batch, parse_reading_timestamp, SensorDeleted
+from app.services.dedup_service import parse_message_id
+
+
+def create_asgi_app(config_name=None):
+    """
+    ASGI ingestion app (ingest_server.py): POST /api/sensor-data and
+    /api/sensor-data/batch with the same contract as the Flask API, plus
+    the MQTT consumer when INGEST_ASYNC_MQTT is set
+    """
+    config_name = config_name or os.getenv('FLASK_ENV', 'development')
+    flask_app = create_app(config_name, with_ingest=False)
+    service = AsyncIngestService(flask_app)
+
+    def json_response(payload, status_code):
+        return Response(flask_app.json.dumps(payload), status_code=status_code, media_type='application/json')
+
+    async def authenticate(request):
+        """(device key or None, error response or None): X-API-Key or Bearer JWT"""
+        api_key = request.headers.get(API_KEY_HEADER)
+        if api_key:
+            device_key = await service.verify_device_key(api_key)
+            if device_key is None:
+                return None, json_response({'error': 'Invalid API key'}, 401)
+            return device_key, None
+
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if scheme != 'Bearer' or not service.verify_jwt(token):
+            return None, json_response({'msg': 'Missing or invalid Authorization header'}, 401)
+        return None, None
+
+    def check_sensor(sensor, device_key):
+        """Error message for a reading of this sensor, or None"""
+        if not sensor:
+            return 'Sensor not found', 404
+        if device_key and device_key[1] is not None and device_key[1] != sensor.id:
+            return 'API key is not allowed for this sensor', 403
+        if sensor.status == 'deleting':
+            return 'Sensor is being deleted', 409
+        return None
+
+    async def create_sensor_data(request):
+        """Create sensor data (same contract as the Flask endpoint)"""
+        try:
+            device_key, error = await authenticate(request)
+            if error:
+                return error
+
+            try:
+                data = await request.json()
+            except ValueError:
+                data = None
+            if not isinstance(data, dict) or not data.get('sensor_id') or data.get('value') is None:
+                return json_response({'error': 'sensor_id and value are required'}, 400)
+            try:
+                device_timestamp = parse_reading_timestamp(data.get('timestamp'))
+            except (TypeError, ValueError):
+                return json_response({'error': 'Invalid timestamp'}, 400)
+            try:
+                message_id = parse_message_id(data.get('message_id'))
+            except ValueError as e:
+                return json_response({'error': str(e)}, 400)
+
+            sensor = (await service.get_sensors([data['sensor_id']])).get(data['sensor_id'])
+            rejection = check_sensor(sensor, device_key)
+            if rejection:
+                return json_response({'error': rejection[0]}, rejection[1])
+
+            unit = data.get('unit', '')
+            timestamp = device_timestamp or datetime.utcnow()
+            if not await service.store_readings([(sensor, data['value'], unit, device_timestamp, message_id)]):
+                return json_response({'message': 'Duplicate reading ignored', 'duplicate': True}, 200)
+
+            return json_response({
+                'message': 'Sensor data created successfully',
+                'data': {'id': None, 'sensor_id': sensor.id, 'value': str(data['value']),
+                         'unit': unit, 'timestamp': timestamp}
+            }, 201)
+
+        except SensorDeleted as e:
+            return json_response({'error': str(e)}, 409)
+        except Exception as e:
+            return json_response({'error': str(e)}, 500)
+
+    async def create_sensor_data_batch(request):
+        """Create up to INGEST_BATCH_MAX_SIZE readings (same contract as the Flask endpoint)"""
+        try:
+            device_key, error = await authenticate(request)
+            if error:
+                return error
+
+            try:
+                data = await request.json()
+            except ValueError:
+                data = None
+            try:
+                readings, rejected = parse_batch(data, flask_app.config['INGEST_BATCH_MAX_SIZE'])
+            except ValueError as e:
+                return json_response({'error': str(e)}, 400)
+
+            sensors = await service.get_sensors({sensor_ref for _, sensor_ref, _, _, _, _ in readings})
+
+            accepted = []
+            indexes = []
+            for index, sensor_ref, value, unit, timestamp, message_id in readings:
+                sensor = sensors.get(sensor_ref)
+                rejection = check_sensor(sensor, device_key)
+                if rejection:
+                    rejected.append({'index': index, 'error': rejection[0]})
+                else:
+                    accepted.append((sensor, value, unit, timestamp, message_id))
+                    indexes.append(index)
+
+            failures = []
+            stored = await service.store_readings(accepted, failures=failures) if accepted else 0
+            errors = 0
+            for position, error in failures:
+                if isinstance(error, SensorDeleted):
+                    rejected.append({'index': indexes[position], 'error': str(error)})
+                else:
+                    errors += 1
+                    rejected.append({'index': indexes[position], 'error': f"Failed to store reading: {error}"})
+
+            return json_response({
+                'message': f"{stored} readings stored",
+                'accepted': stored,
+                'duplicates': len(accepted) - len(failures) - stored,
+                'rejected': sorted(rejected, key=lambda entry: entry['index'])
+            }, 201 if len(accepted) > len(failures) else 500 if errors else 400)
+
+        except Exception as e:
+            return json_response({'error': str(e)}, 500)
+
+    async def health_check(request):
+        return json_response({'status': 'healthy', 'message': 'IoT async ingestion is running'}, 200)
+
+    @contextlib.asynccontextmanager
+    async def lifespan(_app):
+        await service.start()
+        consumer = None
+        if flask_app.config.get('INGEST_ASYNC_MQTT'):
+            consumer = asyncio.create_task(service.consume_mqtt())
+        try:
+            yield
+        finally:
+            if consumer:
+                consumer.cancel()
+                await asyncio.gather(consumer, return_exceptions=True)
+            await service.stop()
+
+    return Starlette(routes=[
+        Route('/api/sensor-data', create_sensor_data, methods=['POST']),
+        Route('/api/sensor-data/batch', create_sensor_data_batch, methods=['POST']),
+        Route('/api/health', health_check, methods=['GET'])
+    ], lifespan=lifespan)
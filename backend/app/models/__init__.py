@@ -1,8 +1,20 @@
 from flask_sqlalchemy import SQLAlchemy
+from .routing import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 from .user import User
 from .sensor import Sensor
 from .sensor_data import SensorData
 from .alert import Alert
+from .sensor_data_rollup import SensorDataRollup
+from .sensor_data_block import SensorDataBlock
+from .sensor_deletion import SensorDeletion
+from .job import Job
+from .sensor_data_sketch import SensorDataSketch
+from .device_key import DeviceKey
+from .sensor_anomaly_state import SensorAnomalyState
+from .sensor_liveness import SensorLiveness
+from .sensor_group_aggregate import SensorGroupAggregate
+from .alert_archive import AlertArchive
+from .sensor_cache_version import SensorCacheVersion
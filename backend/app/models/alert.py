@@ -5,7 +5,7 @@ class Alert(db.Model):
     __tablename__ = 'alerts'
 
     id = db.Column(db.Integer, primary_key=True)
-    sensor_id = db.Column(db.Integer, db.ForeignKey('sensors.id'), nullable=False)
+    sensor_id = db.Column(db.Integer, db.ForeignKey('sensors.id', ondelete='CASCADE'), nullable=False)
     alert_type = db.Column(db.String(50), nullable=False)  # high_temperature, low_humidity, etc.
     message = db.Column(db.Text, nullable=False)
     severity = db.Column(db.String(20), default='warning')  # info, warning, critical
@@ -13,19 +13,24 @@ class Alert(db.Model):
     actual_value = db.Column(db.Float)
     is_resolved = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
-    resolved_at = db.Column(db.DateTime)
+    resolved_at = db.Column(db.DateTime, index=True)  # Archived ALERT_ARCHIVE_DAYS after resolution
 
     def to_dict(self):
         """Convert alert to dictionary"""
+        return Alert.row_dict(self)
+
+    @staticmethod
+    def row_dict(row):
+        """Dictionary of an alert from a model or a Core row with the same columns"""
         return {
-            'id': self.id,
-            'sensor_id': self.sensor_id,
-            'alert_type': self.alert_type,
-            'message': self.message,
-            'severity': self.severity,
-            'threshold_value': self.threshold_value,
-            'actual_value': self.actual_value,
-            'is_resolved': self.is_resolved,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'resolved_at': self.resolved_at.isoformat() if self.resolved_at else None
+            'id': row.id,
+            'sensor_id': row.sensor_id,
+            'alert_type': row.alert_type,
+            'message': row.message,
+            'severity': row.severity,
+            'threshold_value': row.threshold_value,
+            'actual_value': row.actual_value,
+            'is_resolved': row.is_resolved,
+            'created_at': row.created_at,  # Encoded as ISO 8601 by the JSON provider
+            'resolved_at': row.resolved_at
         }
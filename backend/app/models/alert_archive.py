@@ -0,0 +1,28 @@
+from . import db
+from datetime import datetime
+from .alert import Alert
+
+class AlertArchive(db.Model):
+    """Resolved alerts older than ALERT_ARCHIVE_DAYS, moved out of the alerts table"""
+    __tablename__ = 'alerts_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # Same id as in alerts
+    sensor_id = db.Column(db.Integer, db.ForeignKey('sensors.id', ondelete='CASCADE'), nullable=False, index=True)
+    alert_type = db.Column(db.String(50), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    severity = db.Column(db.String(20))
+    threshold_value = db.Column(db.Float)
+    actual_value = db.Column(db.Float)
+    is_resolved = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, index=True)
+    resolved_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        """Convert archived alert to dictionary"""
+        return AlertArchive.row_dict(self)
+
+    @staticmethod
+    def row_dict(row):
+        """Dictionary of an archived alert (alert dictionary plus archived_at)"""
+        return dict(Alert.row_dict(row), archived_at=row.archived_at)
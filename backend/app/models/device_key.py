@@ -0,0 +1,27 @@
+from . import db
+from datetime import datetime
+
+class DeviceKey(db.Model):
+    """API key of a device or gateway for HTTP ingestion (only its HMAC is stored)"""
+    __tablename__ = 'device_keys'
+
+    id = db.Column(db.Integer, primary_key=True)
+    key_id = db.Column(db.String(32), unique=True, nullable=False)  # Public part of the key, used for lookup
+    key_hash = db.Column(db.String(64), nullable=False)  # HMAC-SHA256 of the secret part
+    name = db.Column(db.String(100), nullable=False)
+    sensor_id = db.Column(db.Integer, db.ForeignKey('sensors.id', ondelete='CASCADE'))  # None: gateway key, any sensor
+    created_by = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    revoked_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        """Convert device key to dictionary (never includes the secret)"""
+        return {
+            'id': self.id,
+            'key_id': self.key_id,
+            'name': self.name,
+            'sensor_id': self.sensor_id,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'revoked_at': self.revoked_at.isoformat() if self.revoked_at else None
+        }
@@ -0,0 +1,64 @@
+from . import db
+from datetime import datetime
+import json
+
+class Job(db.Model):
+    """Background job (database-backed queue consumed by worker.py)"""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('idx_job_queue', 'status', 'priority', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    type = db.Column(db.String(50), nullable=False)  # sensor_purge, compaction, ...
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, completed, failed, cancelled
+    priority = db.Column(db.Integer, nullable=False, default=0)  # Higher runs first
+    parent_id = db.Column(db.Integer, index=True)  # Job that split its work into this one
+    params = db.Column(db.Text)  # JSON
+    checkpoint = db.Column(db.Text)  # JSON, saved by the handler to resume after a crash
+    progress = db.Column(db.Float, default=0)  # 0-100
+    message = db.Column(db.String(255))
+    result = db.Column(db.Text)  # JSON
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, default=0)
+    max_attempts = db.Column(db.Integer, default=3)
+    cancel_requested = db.Column(db.Boolean, default=False)
+    worker_id = db.Column(db.String(100))
+    heartbeat_at = db.Column(db.DateTime)
+    created_by = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    @property
+    def params_dict(self):
+        return json.loads(self.params) if self.params else {}
+
+    @property
+    def checkpoint_dict(self):
+        return json.loads(self.checkpoint) if self.checkpoint else None
+
+    def to_dict(self):
+        """Convert job to dictionary"""
+        return {
+            'id': self.id,
+            'type': self.type,
+            'status': self.status,
+            'priority': self.priority,
+            'parent_id': self.parent_id,
+            'params': self.params_dict,
+            'checkpoint': self.checkpoint_dict,
+            'progress': self.progress,
+            'message': self.message,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'cancel_requested': self.cancel_requested,
+            'worker_id': self.worker_id,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -0,0 +1,162 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+import sqlalchemy as sa
+from flask import request
+from flask_sqlalchemy.session import Session
+
+# Extra engines declared in SQLALCHEMY_BINDS (no model is bound to them)
+INGEST_BIND = 'ingest'
+REPLICA_BIND = 'replica'
+
+# Blueprints whose GET endpoints are read-only and may use the replica
+READ_ONLY_BLUEPRINTS = {'sensors', 'sensor_data', 'alerts'}
+
+_current_bind = ContextVar('current_bind', default=None)
+
+
+@contextmanager
+def use_bind(key):
+    """Route the session's queries to the engine `key` inside this block"""
+    token = _current_bind.set(key)
+    try:
+        yield
+    finally:
+        _current_bind.reset(token)
+
+
+class RoutingSession(Session):
+    """Session that sends queries to the ingest or replica engine when selected"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        key = _current_bind.get()
+        if bind is None and key is not None:
+            engines = self._db.engines
+            # Writes (flush) never go to the replica
+            if key in engines and not (key == REPLICA_BIND and self._flushing):
+                return engines[key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _is_memory_sqlite(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def _engine_options(config, url, pool_size, max_overflow):
+    """Pool and driver options for one engine"""
+    options = {
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+
+    # SQLite (in-memory StaticPool, or a single file) has no pool to size
+    if url.get_backend_name() != 'sqlite':
+        options.update({
+            'pool_size': pool_size,
+            'max_overflow': max_overflow,
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+            'pool_recycle': config['DB_POOL_RECYCLE'],
+        })
+
+    if url.get_backend_name() == 'postgresql' and config['DB_STATEMENT_TIMEOUT_MS']:
+        options['connect_args'] = {'options': f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"}
+
+    return options
+
+
+def configure_engines(app):
+    """
+    Build SQLALCHEMY_ENGINE_OPTIONS and SQLALCHEMY_BINDS from the DB_* settings
+
+    Must run before db.init_app(). Declares an 'ingest' bind (same database,
+    separate pool for the MQTT writer) and, when DATABASE_REPLICA_URL is set,
+    a 'replica' bind for read-only endpoints.
+    """
+    config = app.config
+    primary_url = sa.engine.make_url(config['SQLALCHEMY_DATABASE_URI'])
+
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **_engine_options(config, primary_url, config['DB_POOL_SIZE'], config['DB_MAX_OVERFLOW']),
+        **(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    }
+
+    binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+
+    # A second in-memory SQLite engine would be a different, empty database
+    if not _is_memory_sqlite(primary_url):
+        binds.setdefault(INGEST_BIND, {
+            'url': config['SQLALCHEMY_DATABASE_URI'],
+            **_engine_options(config, primary_url, config['DB_INGEST_POOL_SIZE'], config['DB_INGEST_MAX_OVERFLOW'])
+        })
+
+    if config.get('DATABASE_REPLICA_URL'):
+        replica_url = sa.engine.make_url(config['DATABASE_REPLICA_URL'])
+        binds.setdefault(REPLICA_BIND, {
+            'url': config['DATABASE_REPLICA_URL'],
+            **_engine_options(config, replica_url, config['DB_REPLICA_POOL_SIZE'], config['DB_REPLICA_MAX_OVERFLOW'])
+        })
+
+    config['SQLALCHEMY_BINDS'] = binds
+
+
+class ReplicaRouter:
+    """Send read-only GET requests to the replica, falling back to the primary"""
+
+    def __init__(self, db, app=None):
+        self.db = db
+        self.app = app
+        self.healthy_until = 0.0
+        self.retry_after = 0.0
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Install request hooks when a replica is configured"""
+        self.app = app
+
+        if REPLICA_BIND not in app.config.get('SQLALCHEMY_BINDS', {}):
+            return
+
+        with app.app_context():
+            sa.event.listen(self.db.engines[REPLICA_BIND], 'handle_error', self._on_replica_error)
+
+        app.before_request(self.before_request)
+        app.teardown_request(self.teardown_request)
+        print(f"Read replica routing enabled for: {', '.join(sorted(READ_ONLY_BLUEPRINTS))}")
+
+    def before_request(self):
+        """Select the replica for read-only requests"""
+        if request.method != 'GET' or request.blueprint not in READ_ONLY_BLUEPRINTS:
+            return
+        if self.replica_available():
+            request.environ['iot.replica_token'] = _current_bind.set(REPLICA_BIND)
+
+    def teardown_request(self, exc=None):
+        token = request.environ.pop('iot.replica_token', None)
+        if token is not None:
+            _current_bind.reset(token)
+
+    def replica_available(self):
+        """Cached health check (at most one probe every DB_REPLICA_HEALTH_INTERVAL)"""
+        now = time.monotonic()
+        if now < self.healthy_until:
+            return True
+        if now < self.retry_after:
+            return False
+
+        interval = self.app.config['DB_REPLICA_HEALTH_INTERVAL']
+        try:
+            with self.db.engines[REPLICA_BIND].connect() as connection:
+                connection.execute(sa.text('SELECT 1'))
+            self.healthy_until = now + interval
+            return True
+        except Exception as e:
+            print(f"Read replica unavailable, using primary: {e}")
+            self.retry_after = now + interval
+            return False
+
+    def _on_replica_error(self, context):
+        """Stop using the replica as soon as a connection is lost"""
+        if context.is_disconnect:
+            self.healthy_until = 0.0
+            self.retry_after = time.monotonic() + self.app.config['DB_REPLICA_HEALTH_INTERVAL']
@@ -9,14 +9,17 @@ class Sensor(db.Model):
     name = db.Column(db.String(100), nullable=False)
     type = db.Column(db.String(50), nullable=False)  # temperature, humidity, soil_moisture, light
     location = db.Column(db.String(200))
-    status = db.Column(db.String(20), default='active')  # active, inactive, maintenance
+    status = db.Column(db.String(20), default='active')  # active, inactive, maintenance, offline, deleting
     description = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    # Relationships
-    sensor_data = db.relationship('SensorData', backref='sensor', lazy=True, cascade='all, delete-orphan')
-    alerts = db.relationship('Alert', backref='sensor', lazy=True, cascade='all, delete-orphan')
+    # Relationships (passive_deletes: history is purged in bulk, never loaded by the ORM)
+    sensor_data = db.relationship('SensorData', backref='sensor', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    alerts = db.relationship('Alert', backref='sensor', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    rollups = db.relationship('SensorDataRollup', backref='sensor', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    blocks = db.relationship('SensorDataBlock', backref='sensor', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    sketches = db.relationship('SensorDataSketch', backref='sensor', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
 
     def to_dict(self):
         """Convert sensor to dictionary"""
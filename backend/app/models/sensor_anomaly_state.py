@@ -0,0 +1,11 @@
+from . import db
+from datetime import datetime
+
+class SensorAnomalyState(db.Model):
+    """Checkpoint of a sensor's streaming anomaly detector state"""
+    __tablename__ = 'sensor_anomaly_states'
+
+    id = db.Column(db.Integer, primary_key=True)
+    sensor_id = db.Column(db.Integer, db.ForeignKey('sensors.id', ondelete='CASCADE'), unique=True, nullable=False)
+    encrypted_state = db.Column(db.Text, nullable=False)  # Encrypted AnomalyState JSON (AES-256)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,12 @@
+from . import db
+from datetime import datetime
+
+class SensorCacheVersion(db.Model):
+    """Result cache invalidation counters of a sensor, shared by all processes"""
+    __tablename__ = 'sensor_cache_versions'
+
+    id = db.Column(db.Integer, primary_key=True)
+    sensor_id = db.Column(db.Integer, db.ForeignKey('sensors.id', ondelete='CASCADE'), unique=True, nullable=False)
+    version = db.Column(db.BigInteger, nullable=False, default=0)  # Readings and rewrites of the sensor's data
+    backfill = db.Column(db.BigInteger, nullable=False, default=0)  # Changes to its closed windows
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -5,17 +5,31 @@ class SensorData(db.Model):
     __tablename__ = 'sensor_data'
 
     id = db.Column(db.Integer, primary_key=True)
-    sensor_id = db.Column(db.Integer, db.ForeignKey('sensors.id'), nullable=False)
-    encrypted_value = db.Column(db.Text, nullable=False)  # Encrypted sensor value (AES-256)
+    sensor_id = db.Column(db.Integer, db.ForeignKey('sensors.id', ondelete='CASCADE'), nullable=False)
+    encrypted_value = db.Column(db.Text)  # Encrypted sensor value (AES-256), null for plain readings
+    value = db.Column(db.Float)  # Plain numeric value (VALUE_STORAGE_POLICIES both / plain), null otherwise
     unit = db.Column(db.String(20))  # °C, %, lux, etc.
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    device_timestamp = db.Column(db.DateTime)  # Timestamp sent by the device (duplicate key), null when stamped on receipt
+    message_id = db.Column(db.String(64))  # Message ID sent by the device (duplicate key)
+
+    # A reading is stored once per device timestamp / message ID (NULLs never conflict)
+    __table_args__ = (
+        db.UniqueConstraint('sensor_id', 'device_timestamp', name='uq_sensor_data_device_timestamp'),
+        db.UniqueConstraint('sensor_id', 'message_id', name='uq_sensor_data_message_id'),
+    )
 
     def to_dict(self, decrypted_value=None):
         """Convert sensor data to dictionary"""
+        return SensorData.row_dict(self, decrypted_value)
+
+    @staticmethod
+    def row_dict(row, decrypted_value=None):
+        """Dictionary of a reading from a model or a Core row with the same columns"""
         return {
-            'id': self.id,
-            'sensor_id': self.sensor_id,
+            'id': row.id,
+            'sensor_id': row.sensor_id,
             'value': decrypted_value,  # Decrypted value
-            'unit': self.unit,
-            'timestamp': self.timestamp.isoformat() if self.timestamp else None
+            'unit': row.unit,
+            'timestamp': row.timestamp  # Encoded as ISO 8601 by the JSON provider
         }
@@ -0,0 +1,27 @@
+from . import db
+
+class SensorDataBlock(db.Model):
+    """Compressed block of a sensor's readings (block storage mode)"""
+    __tablename__ = 'sensor_data_blocks'
+    __table_args__ = (
+        db.Index('idx_block_sensor_time', 'sensor_id', 'start_time', 'end_time'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    sensor_id = db.Column(db.Integer, db.ForeignKey('sensors.id', ondelete='CASCADE'), nullable=False)
+    start_time = db.Column(db.DateTime, nullable=False)  # First reading in the block
+    end_time = db.Column(db.DateTime, nullable=False)  # Last reading in the block
+    count = db.Column(db.Integer, nullable=False)
+    unit = db.Column(db.String(20))
+    encrypted_payload = db.Column(db.Text, nullable=False)  # Encrypted Gorilla-compressed points (AES-256)
+
+    def to_dict(self):
+        """Convert block metadata to dictionary"""
+        return {
+            'id': self.id,
+            'sensor_id': self.sensor_id,
+            'start_time': self.start_time.isoformat() if self.start_time else None,
+            'end_time': self.end_time.isoformat() if self.end_time else None,
+            'count': self.count,
+            'unit': self.unit
+        }
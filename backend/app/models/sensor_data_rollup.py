@@ -0,0 +1,32 @@
+from . import db
+
+class SensorDataRollup(db.Model):
+    """Downsampled sensor readings (long-term history tiers)"""
+    __tablename__ = 'sensor_data_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('sensor_id', 'resolution', 'bucket_start', name='uq_rollup_bucket'),
+        db.Index('idx_rollup_sensor_resolution_bucket', 'sensor_id', 'resolution', 'bucket_start'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    sensor_id = db.Column(db.Integer, db.ForeignKey('sensors.id', ondelete='CASCADE'), nullable=False)
+    resolution = db.Column(db.String(10), nullable=False)  # 1m, 1h
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    encrypted_stats = db.Column(db.Text, nullable=False)  # Encrypted JSON {min, max, sum} (AES-256)
+    unit = db.Column(db.String(20))
+
+    def to_dict(self, stats=None):
+        """Convert rollup to dictionary (same shape as a reading, value = average)"""
+        average = stats['sum'] / self.count if stats and self.count else None
+        return {
+            'id': None,
+            'sensor_id': self.sensor_id,
+            'value': average,
+            'min': stats['min'] if stats else None,
+            'max': stats['max'] if stats else None,
+            'count': self.count,
+            'resolution': self.resolution,
+            'unit': self.unit,
+            'timestamp': self.bucket_start
+        }
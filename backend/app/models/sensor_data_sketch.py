@@ -0,0 +1,16 @@
+from . import db
+
+class SensorDataSketch(db.Model):
+    """Hourly quantile sketch of a sensor's readings (DDSketch, mergeable)"""
+    __tablename__ = 'sensor_data_sketches'
+    __table_args__ = (
+        db.UniqueConstraint('sensor_id', 'bucket_start', name='uq_sketch_bucket'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    sensor_id = db.Column(db.Integer, db.ForeignKey('sensors.id', ondelete='CASCADE'), nullable=False)
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    encrypted_sketch = db.Column(db.Text, nullable=False)  # Encrypted DDSketch JSON (AES-256)
+    unit = db.Column(db.String(20))
+    first_timestamp = db.Column(db.DateTime)  # Earliest reading counted by ingestion, older ones are left to sketch_backfill (NULL: whole hour counted)
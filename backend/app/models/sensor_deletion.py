@@ -0,0 +1,41 @@
+from . import db
+from datetime import datetime
+
+class SensorDeletion(db.Model):
+    """Progress of a background sensor purge (kept after the sensor row is gone)"""
+    __tablename__ = 'sensor_deletions'
+
+    id = db.Column(db.Integer, primary_key=True)
+    sensor_id = db.Column(db.Integer, nullable=False, index=True)  # No FK: outlives the sensor
+    sensor_ref = db.Column(db.String(100))  # Sensor.sensor_id at deletion time
+    status = db.Column(db.String(20), default='pending')  # pending, running, completed, failed, cancelled
+    job_id = db.Column(db.Integer)  # sensor_purge job
+    total_rows = db.Column(db.Integer)  # Counted when the purge starts
+    deleted_rows = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    requested_by = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        """Convert sensor deletion to dictionary"""
+        progress = None
+        if self.status == 'completed':
+            progress = 100.0
+        elif self.total_rows:
+            progress = round(min(100.0, 100.0 * (self.deleted_rows or 0) / self.total_rows), 1)
+        return {
+            'id': self.id,
+            'sensor_id': self.sensor_id,
+            'sensor_ref': self.sensor_ref,
+            'status': self.status,
+            'job_id': self.job_id,
+            'total_rows': self.total_rows,
+            'deleted_rows': self.deleted_rows,
+            'progress': progress,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -0,0 +1,17 @@
+from . import db
+
+class SensorGroupAggregate(db.Model):
+    """Hourly count / sum / min / max of the readings of every sensor of a (location, type) group"""
+    __tablename__ = 'sensor_group_aggregates'
+    __table_args__ = (
+        db.UniqueConstraint('location', 'type', 'bucket_start', name='uq_group_bucket'),
+        db.Index('idx_group_bucket_start', 'bucket_start'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    location = db.Column(db.String(200), nullable=False, default='')  # '' for sensors without a location
+    type = db.Column(db.String(50), nullable=False)
+    bucket_start = db.Column(db.DateTime, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    encrypted_stats = db.Column(db.Text, nullable=False)  # Encrypted {sum, min, max} JSON (AES-256)
+    unit = db.Column(db.String(20))
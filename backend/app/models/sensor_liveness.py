@@ -0,0 +1,12 @@
+from . import db
+from datetime import datetime
+
+class SensorLiveness(db.Model):
+    """Last time a sensor sent data, shared by the ingest processes"""
+    __tablename__ = 'sensor_liveness'
+
+    id = db.Column(db.Integer, primary_key=True)
+    sensor_id = db.Column(db.Integer, db.ForeignKey('sensors.id', ondelete='CASCADE'), unique=True, nullable=False)
+    last_seen_at = db.Column(db.DateTime, nullable=False)
+    offline_since = db.Column(db.DateTime)  # Set while the sensor is reported offline
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
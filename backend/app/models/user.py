@@ -1,6 +1,6 @@
 from . import db
 from datetime import datetime
-import bcrypt
+from flask import current_app
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -14,12 +14,16 @@ class User(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def set_password(self, password):
-        """Hash and set password"""
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        """Hash and set password (bcrypt, on the password hashing executor)"""
+        self.password_hash = current_app.extensions['passwords'].hash(password)
 
     def check_password(self, password):
-        """Verify password"""
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        """Verify password (may raise PasswordServiceBusy under login overload)"""
+        return current_app.extensions['passwords'].check(password, self.password_hash)
+
+    def password_needs_rehash(self):
+        """Whether the hash predates the current BCRYPT_ROUNDS"""
+        return current_app.extensions['passwords'].needs_rehash(self.password_hash)
 
     def to_dict(self):
         """Convert user to dictionary"""
@@ -6,9 +6,12 @@ sensors_bp = Blueprint('sensors', __name__, url_prefix='/api/sensors')
 sensor_data_bp = Blueprint('sensor_data', __name__, url_prefix='/api/sensor-data')
 alerts_bp = Blueprint('alerts', __name__, url_prefix='/api/alerts')
 users_bp = Blueprint('users', __name__, url_prefix='/api/users')
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/api/jobs')
+device_keys_bp = Blueprint('device_keys', __name__, url_prefix='/api/device-keys')
+metrics_bp = Blueprint('metrics', __name__, url_prefix='/api/metrics')
 
 # Import routes
-from . import auth, sensors, sensor_data, alerts, users
+from . import auth, sensors, sensor_data, alerts, users, jobs, device_keys, metrics
 
 def register_blueprints(app):
     """Register all blueprints with the Flask app"""
@@ -17,3 +20,6 @@ def register_blueprints(app):
     app.register_blueprint(sensor_data_bp)
     app.register_blueprint(alerts_bp)
     app.register_blueprint(users_bp)
+    app.register_blueprint(jobs_bp)
+    app.register_blueprint(device_keys_bp)
+    app.register_blueprint(metrics_bp)
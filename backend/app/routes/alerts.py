@@ -1,43 +1,46 @@
 from flask import request, jsonify
 from flask_jwt_extended import jwt_required
-from app.models import db, Alert, Sensor
+from sqlalchemy import select
+from app.models import db, Alert, AlertArchive, Sensor
+from app.services.query_service import stream_rows
 from datetime import datetime
 from . import alerts_bp
 
 @alerts_bp.route('', methods=['GET'])
 @jwt_required()
 def get_alerts():
-    """Get all alerts with optional filters"""
+    """Get all alerts with optional filters (archived=true: archived alerts)"""
     try:
         sensor_id = request.args.get('sensor_id', type=int)
         is_resolved = request.args.get('is_resolved')
         severity = request.args.get('severity')
         limit = request.args.get('limit', 100, type=int)
 
-        query = Alert.query
+        # Old resolved alerts live in the archive table
+        model = AlertArchive if request.args.get('archived', '').lower() == 'true' else Alert
+        statement = select(model.__table__)
 
         if sensor_id:
-            query = query.filter_by(sensor_id=sensor_id)
+            statement = statement.where(model.sensor_id == sensor_id)
 
         if is_resolved is not None:
             is_resolved_bool = is_resolved.lower() == 'true'
-            query = query.filter_by(is_resolved=is_resolved_bool)
+            statement = statement.where(model.is_resolved == is_resolved_bool)
 
         if severity:
-            query = query.filter_by(severity=severity)
+            statement = statement.where(model.severity == severity)
 
-        query = query.order_by(Alert.created_at.desc()).limit(limit)
+        statement = statement.order_by(model.created_at.desc()).limit(limit)
 
-        alerts = query.all()
+        # Plain rows instead of ORM objects, sensors loaded once each
+        result = [model.row_dict(row) for row in stream_rows(statement)]
+        sensor_ids = {alert['sensor_id'] for alert in result}
+        sensors = {sensor.id: sensor.to_dict() for sensor in Sensor.query.filter(Sensor.id.in_(sensor_ids))} if sensor_ids else {}
 
         # Include sensor information
-        result = []
-        for alert in alerts:
-            alert_dict = alert.to_dict()
-            sensor = Sensor.query.get(alert.sensor_id)
-            if sensor:
-                alert_dict['sensor'] = sensor.to_dict()
-            result.append(alert_dict)
+        for alert_dict in result:
+            if alert_dict['sensor_id'] in sensors:
+                alert_dict['sensor'] = sensors[alert_dict['sensor_id']]
 
         return jsonify({
             'alerts': result,
@@ -52,7 +55,8 @@ def get_alerts():
 def get_alert(alert_id):
     """Get a specific alert"""
     try:
-        alert = Alert.query.get(alert_id)
+        # Archived alerts keep their id
+        alert = Alert.query.get(alert_id) or AlertArchive.query.get(alert_id)
 
         if not alert:
             return jsonify({'error': 'Alert not found'}), 404
@@ -94,9 +98,9 @@ def resolve_alert(alert_id):
 @alerts_bp.route('/<int:alert_id>', methods=['DELETE'])
 @jwt_required()
 def delete_alert(alert_id):
-    """Delete an alert"""
+    """Delete an alert (archived or not)"""
     try:
-        alert = Alert.query.get(alert_id)
+        alert = Alert.query.get(alert_id) or AlertArchive.query.get(alert_id)
 
         if not alert:
             return jsonify({'error': 'Alert not found'}), 404
@@ -113,20 +117,26 @@ def delete_alert(alert_id):
 @alerts_bp.route('/summary', methods=['GET'])
 @jwt_required()
 def get_alerts_summary():
-    """Get summary of alerts"""
+    """Get summary of alerts (include_archived=true: count archived alerts as resolved)"""
     try:
         total_alerts = Alert.query.count()
         unresolved_alerts = Alert.query.filter_by(is_resolved=False).count()
         critical_alerts = Alert.query.filter_by(severity='critical', is_resolved=False).count()
         warning_alerts = Alert.query.filter_by(severity='warning', is_resolved=False).count()
 
-        return jsonify({
+        summary = {
             'total': total_alerts,
             'unresolved': unresolved_alerts,
             'critical': critical_alerts,
             'warning': warning_alerts,
             'resolved': total_alerts - unresolved_alerts
-        }), 200
+        }
+        if request.args.get('include_archived', '').lower() == 'true':
+            summary['archived'] = AlertArchive.query.count()
+            summary['total'] += summary['archived']
+            summary['resolved'] += summary['archived']
+
+        return jsonify(summary), 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1,6 +1,7 @@
 from flask import request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from app.models import db, User
+from app.services.password_service import PasswordServiceBusy
 from . import auth_bp
 
 @auth_bp.route('/register', methods=['POST'])
@@ -36,6 +37,9 @@ def register():
             'user': user.to_dict()
         }), 201
 
+    except PasswordServiceBusy as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -56,6 +60,14 @@ def login():
         if not user or not user.check_password(data['password']):
             return jsonify({'error': 'Invalid username or password'}), 401
 
+        # Upgrade hashes made with a previous work factor (BCRYPT_ROUNDS)
+        if user.password_needs_rehash():
+            try:
+                user.set_password(data['password'])
+                db.session.commit()
+            except PasswordServiceBusy:
+                db.session.rollback()  # Upgraded at a later login
+
         # Create JWT token
         access_token = create_access_token(
             identity=user.id,
@@ -68,6 +80,9 @@ def login():
             'user': user.to_dict()
         }), 200
 
+    except PasswordServiceBusy as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -0,0 +1,96 @@
+from flask import request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
+from app.models import db, DeviceKey, Sensor
+from . import device_keys_bp
+
+def admin_required():
+    """Check if user is admin"""
+    claims = get_jwt()
+    return claims.get('role') == 'admin'
+
+@device_keys_bp.route('', methods=['GET'])
+@jwt_required()
+def get_device_keys():
+    """List device API keys (admin only)"""
+    try:
+        if not admin_required():
+            return jsonify({'error': 'Admin access required'}), 403
+
+        sensor_id = request.args.get('sensor_id', type=int)
+        include_revoked = request.args.get('include_revoked', 'false').lower() == 'true'
+
+        query = DeviceKey.query
+
+        if sensor_id:
+            query = query.filter_by(sensor_id=sensor_id)
+        if not include_revoked:
+            query = query.filter(DeviceKey.revoked_at.is_(None))
+
+        device_keys = query.order_by(DeviceKey.id.desc()).all()
+
+        return jsonify({
+            'device_keys': [device_key.to_dict() for device_key in device_keys],
+            'total': len(device_keys)
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@device_keys_bp.route('', methods=['POST'])
+@jwt_required()
+def create_device_key():
+    """Create a device API key (admin only); the key is only returned once"""
+    try:
+        if not admin_required():
+            return jsonify({'error': 'Admin access required'}), 403
+
+        data = request.get_json() or {}
+
+        # Validate input
+        if not data.get('name'):
+            return jsonify({'error': 'name is required'}), 400
+
+        # Sensor-scoped key, or gateway key for every sensor
+        sensor_id = data.get('sensor_id')
+        if sensor_id is not None and not Sensor.query.get(sensor_id):
+            return jsonify({'error': 'Sensor not found'}), 404
+
+        device_key, api_key = current_app.extensions['device_keys'].create(
+            data['name'],
+            sensor_id=sensor_id,
+            created_by=get_jwt_identity()
+        )
+
+        return jsonify({
+            'message': 'Device key created successfully',
+            'device_key': device_key.to_dict(),
+            'api_key': api_key
+        }), 201
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@device_keys_bp.route('/<int:device_key_id>', methods=['DELETE'])
+@jwt_required()
+def revoke_device_key(device_key_id):
+    """Revoke a device API key (admin only)"""
+    try:
+        if not admin_required():
+            return jsonify({'error': 'Admin access required'}), 403
+
+        device_key = DeviceKey.query.get(device_key_id)
+
+        if not device_key:
+            return jsonify({'error': 'Device key not found'}), 404
+
+        current_app.extensions['device_keys'].revoke(device_key)
+
+        return jsonify({
+            'message': 'Device key revoked successfully',
+            'device_key': device_key.to_dict()
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,122 @@
+from flask import request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
+from app.models import db, Job
+from app.services.job_service import SUBMITTABLE, NON_CANCELLABLE
+from . import jobs_bp
+
+def admin_required():
+    """Check if user is admin"""
+    claims = get_jwt()
+    return claims.get('role') == 'admin'
+
+@jobs_bp.route('', methods=['GET'])
+@jwt_required()
+def get_jobs():
+    """List background jobs (admin only)"""
+    try:
+        if not admin_required():
+            return jsonify({'error': 'Admin access required'}), 403
+
+        status = request.args.get('status')
+        job_type = request.args.get('type')
+        parent_id = request.args.get('parent_id', type=int)
+        limit = request.args.get('limit', 100, type=int)
+
+        query = Job.query
+
+        if status:
+            query = query.filter_by(status=status)
+        if job_type:
+            query = query.filter_by(type=job_type)
+        if parent_id:
+            query = query.filter_by(parent_id=parent_id)
+
+        jobs = query.order_by(Job.id.desc()).limit(limit).all()
+
+        return jsonify({
+            'jobs': [job.to_dict() for job in jobs],
+            'total': len(jobs),
+            'types': sorted(SUBMITTABLE)
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@jobs_bp.route('', methods=['POST'])
+@jwt_required()
+def submit_job():
+    """Submit a background job (admin only)"""
+    try:
+        if not admin_required():
+            return jsonify({'error': 'Admin access required'}), 403
+
+        data = request.get_json() or {}
+
+        # Validate input
+        if data.get('type') not in SUBMITTABLE:
+            return jsonify({'error': f"type must be one of: {', '.join(sorted(SUBMITTABLE))}"}), 400
+        if not isinstance(data.get('params', {}), dict):
+            return jsonify({'error': 'params must be an object'}), 400
+
+        job = current_app.extensions['jobs'].submit(
+            data['type'],
+            data.get('params'),
+            priority=int(data.get('priority', 0)),
+            created_by=get_jwt_identity()
+        )
+
+        return jsonify({
+            'message': 'Job queued successfully',
+            'job': job.to_dict()
+        }), 202
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@jobs_bp.route('/<int:job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    """Get a background job and its progress (admin only)"""
+    try:
+        if not admin_required():
+            return jsonify({'error': 'Admin access required'}), 403
+
+        job = Job.query.get(job_id)
+
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+
+        return jsonify({'job': job.to_dict()}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@jobs_bp.route('/<int:job_id>/cancel', methods=['POST'])
+@jwt_required()
+def cancel_job(job_id):
+    """Cancel a queued or running job (admin only)"""
+    try:
+        if not admin_required():
+            return jsonify({'error': 'Admin access required'}), 403
+
+        job = Job.query.get(job_id)
+
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+
+        if job.status not in ('queued', 'running'):
+            return jsonify({'error': f"Job is already {job.status}"}), 400
+        if job.type in NON_CANCELLABLE:
+            return jsonify({'error': f"{job.type} jobs cannot be cancelled"}), 400
+
+        job = current_app.extensions['jobs'].cancel(job)
+
+        return jsonify({
+            'message': 'Job cancellation requested',
+            'job': job.to_dict()
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,24 @@
+from flask import jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt
+from . import metrics_bp
+
+def admin_required():
+    """Check if user is admin"""
+    claims = get_jwt()
+    return claims.get('role') == 'admin'
+
+@metrics_bp.route('', methods=['GET'])
+@jwt_required()
+def get_metrics():
+    """Get the counters of this process (admin only)"""
+    try:
+        if not admin_required():
+            return jsonify({'error': 'Admin access required'}), 403
+
+        return jsonify({
+            'result_cache': current_app.extensions['result_cache'].metrics(),
+            'dedup': current_app.extensions['dedup'].metrics()
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,11 +1,22 @@
 from flask import request, jsonify
 from flask_jwt_extended import jwt_required
-from app.models import db, Sensor, SensorData
-from app.utils.encryption import EncryptionService
+from app.models import db, Sensor
+from app.services.history_service import read_history, read_history_columns, read_aligned, aggregate_range, latest_reading
+from app.services.ingest_service import parse_batch, parse_reading_timestamp, SensorDeleted
+from app.services.dedup_service import parse_message_id
+from app.services.device_key_service import device_key_or_jwt_required, device_key_allows
+from app.utils.columnar import series_to_arrow, pyarrow, ARROW_MIMETYPE
+from app.utils.alignment import AGGREGATES
 from datetime import datetime, timedelta
 from flask import current_app
 from . import sensor_data_bp
 
+def cached(key, sensor_ids, end, compute):
+    """compute() through the result cache; sensor_ids are the sensors it reads, end its window end (None: now)"""
+    if not sensor_ids:
+        return compute()  # Every sensor: not cached
+    return current_app.extensions['result_cache'].get_or_compute(key, tuple(sensor_ids), end, compute)
+
 @sensor_data_bp.route('', methods=['GET'])
 @jwt_required()
 def get_sensor_data():
@@ -15,41 +26,49 @@ def get_sensor_data():
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         limit = request.args.get('limit', 100, type=int)
+        # Threshold filters (plain values are filtered by the database)
+        min_value = request.args.get('min_value', type=float)
+        max_value = request.args.get('max_value', type=float)
+
+        response_format = request.args.get('format', 'rows')
+        if (min_value is not None or max_value is not None) and not sensor_id and not start_date:
+            return jsonify({'error': 'min_value / max_value require sensor_id or start_date'}), 400
+
+        start = datetime.fromisoformat(start_date) if start_date else None
+        end = datetime.fromisoformat(end_date) if end_date else None
+
+        if response_format in ('columnar', 'arrow'):
+            if response_format == 'arrow' and pyarrow is None:
+                return jsonify({'error': 'Arrow format requires pyarrow'}), 406
+
+            # One series per sensor: metadata once, parallel timestamp / value arrays
+            series = cached(('history_columns', sensor_id, start, end, limit, min_value, max_value),
+                            [sensor_id] if sensor_id else None, end,
+                            lambda: read_history_columns(sensor_id=sensor_id, start=start, end=end, limit=limit,
+                                                         min_value=min_value, max_value=max_value))
+            if response_format == 'arrow':
+                return current_app.response_class(series_to_arrow(series), mimetype=ARROW_MIMETYPE)
+            return jsonify({
+                'format': 'columnar',
+                'series': series,
+                'total': sum(len(entry['timestamps']) for entry in series)
+            }), 200
+        if response_format != 'rows':
+            return jsonify({'error': 'format must be rows, columnar or arrow'}), 400
 
-        query = SensorData.query
-
-        if sensor_id:
-            query = query.filter_by(sensor_id=sensor_id)
-
-        if start_date:
-            start = datetime.fromisoformat(start_date)
-            query = query.filter(SensorData.timestamp >= start)
-
-        if end_date:
-            end = datetime.fromisoformat(end_date)
-            query = query.filter(SensorData.timestamp <= end)
-
-        query = query.order_by(SensorData.timestamp.desc()).limit(limit)
-
-        data_records = query.all()
-
-        # Decrypt sensor values
-        encryption_service = EncryptionService(current_app.config['ENCRYPTION_KEY'])
-        result = []
-
-        for record in data_records:
-            try:
-                decrypted_value = encryption_service.decrypt(record.encrypted_value)
-                result.append(record.to_dict(decrypted_value=decrypted_value))
-            except Exception as e:
-                print(f"Failed to decrypt sensor data {record.id}: {e}")
-                result.append(record.to_dict(decrypted_value=None))
+        # Raw readings, or rollups for ranges older than the raw retention
+        result = cached(('history', sensor_id, start, end, limit, min_value, max_value),
+                        [sensor_id] if sensor_id else None, end,
+                        lambda: read_history(sensor_id=sensor_id, start=start, end=end, limit=limit,
+                                             min_value=min_value, max_value=max_value))
 
         return jsonify({
             'data': result,
             'total': len(result)
         }), 200
 
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -59,22 +78,16 @@ def get_latest_sensor_data():
     """Get latest sensor data for each sensor"""
     try:
         sensors = Sensor.query.filter_by(status='active').all()
-        encryption_service = EncryptionService(current_app.config['ENCRYPTION_KEY'])
 
         result = []
 
         for sensor in sensors:
-            latest_data = SensorData.query.filter_by(sensor_id=sensor.id)\
-                .order_by(SensorData.timestamp.desc()).first()
+            latest_data = latest_reading(sensor.id)
 
             if latest_data:
-                try:
-                    decrypted_value = encryption_service.decrypt(latest_data.encrypted_value)
-                    sensor_dict = sensor.to_dict()
-                    sensor_dict['latest_data'] = latest_data.to_dict(decrypted_value=decrypted_value)
-                    result.append(sensor_dict)
-                except Exception as e:
-                    print(f"Failed to decrypt sensor data: {e}")
+                sensor_dict = sensor.to_dict()
+                sensor_dict['latest_data'] = latest_data
+                result.append(sensor_dict)
 
         return jsonify({
             'sensors': result,
@@ -84,16 +97,111 @@ def get_latest_sensor_data():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@sensor_data_bp.route('', methods=['POST'])
+@sensor_data_bp.route('/aligned', methods=['GET'])
 @jwt_required()
+def get_aligned_sensor_data():
+    """Get several sensors as one time-aligned matrix (sensor_ids, or type / location filters)"""
+    try:
+        end_date = request.args.get('end_date')
+        start_date = request.args.get('start_date')
+        end = datetime.fromisoformat(end_date) if end_date else datetime.utcnow()
+        start = datetime.fromisoformat(start_date) if start_date else end - timedelta(days=1)
+        interval = request.args.get('interval', 3600, type=int)
+        aggregate = request.args.get('agg', 'avg')
+
+        if aggregate not in AGGREGATES:
+            return jsonify({'error': f"agg must be one of {', '.join(AGGREGATES)}"}), 400
+        if interval <= 0 or start >= end:
+            return jsonify({'error': 'interval must be positive and start_date before end_date'}), 400
+        if (end - start).total_seconds() / interval > current_app.config['ALIGNED_MAX_BUCKETS']:
+            return jsonify({'error': f"At most {current_app.config['ALIGNED_MAX_BUCKETS']} buckets per request"}), 400
+
+        query = Sensor.query.filter(Sensor.status != 'deleting')
+        sensor_ids = request.args.get('sensor_ids')
+        if sensor_ids:
+            try:
+                ids = [int(sensor_id) for sensor_id in sensor_ids.split(',') if sensor_id.strip()]
+            except ValueError:
+                return jsonify({'error': 'sensor_ids must be a comma-separated list of ids'}), 400
+            query = query.filter(Sensor.id.in_(ids))
+        if request.args.get('type'):
+            query = query.filter_by(type=request.args['type'])
+        if request.args.get('location'):
+            query = query.filter_by(location=request.args['location'])
+        if not (sensor_ids or request.args.get('type') or request.args.get('location')):
+            return jsonify({'error': 'sensor_ids, type or location is required'}), 400
+
+        sensors = query.order_by(Sensor.id).all()
+        if sensor_ids:
+            # Columns in the requested order
+            order = {sensor_id: index for index, sensor_id in enumerate(ids)}
+            sensors.sort(key=lambda sensor: order[sensor.id])
+        if not sensors:
+            return jsonify({'error': 'No sensor found'}), 404
+        if len(sensors) > current_app.config['ALIGNED_MAX_SENSORS']:
+            return jsonify({'error': f"At most {current_app.config['ALIGNED_MAX_SENSORS']} sensors per request"}), 400
+
+        columns = [sensor.id for sensor in sensors]
+        result = cached(('aligned', tuple(columns), start_date and start, end_date and end, interval, aggregate),
+                        columns, end if end_date else None,
+                        lambda: read_aligned(sensors, start, end, timedelta(seconds=interval), aggregate))
+        return jsonify(result), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@sensor_data_bp.route('/groups', methods=['GET'])
+@jwt_required()
+def get_group_aggregates():
+    """Get count / avg / min / max per (location, type) group over a range (hourly aggregates)"""
+    try:
+        end_date = request.args.get('end_date')
+        start_date = request.args.get('start_date')
+        end = datetime.fromisoformat(end_date) if end_date else datetime.utcnow()
+        start = datetime.fromisoformat(start_date) if start_date else end - timedelta(days=1)
+
+        interval = request.args.get('interval', type=int)
+        if interval is not None and (interval <= 0 or interval % 3600):
+            return jsonify({'error': 'interval must be a multiple of 3600 seconds'}), 400
+
+        groups = current_app.extensions['group_aggregates'].query(
+            start, end,
+            location=request.args.get('location'),
+            sensor_type=request.args.get('type'),
+            interval=timedelta(seconds=interval) if interval else None
+        )
+
+        return jsonify({
+            'groups': groups,
+            'period': {
+                # Ranges are aligned on whole hours
+                'start': start.replace(minute=0, second=0, microsecond=0).isoformat(),
+                'end': end.isoformat()
+            },
+            'interval': interval
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@sensor_data_bp.route('', methods=['POST'])
+@device_key_or_jwt_required
 def create_sensor_data():
-    """Create sensor data manually (HTTPS endpoint)"""
+    """Create sensor data manually (HTTPS endpoint, user JWT or device X-API-Key)"""
     try:
         data = request.get_json()
 
         # Validate input
-        if not data.get('sensor_id') or data.get('value') is None:
+        if not isinstance(data, dict) or not data.get('sensor_id') or data.get('value') is None:
             return jsonify({'error': 'sensor_id and value are required'}), 400
+        try:
+            timestamp = parse_reading_timestamp(data.get('timestamp'))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid timestamp'}), 400
+        try:
+            message_id = parse_message_id(data.get('message_id'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
         # Find sensor by sensor_id string
         sensor = Sensor.query.filter_by(sensor_id=data['sensor_id']).first()
@@ -101,26 +209,72 @@ def create_sensor_data():
         if not sensor:
             return jsonify({'error': 'Sensor not found'}), 404
 
-        # Encrypt sensor value
-        encryption_service = EncryptionService(current_app.config['ENCRYPTION_KEY'])
-        encrypted_value = encryption_service.encrypt(str(data['value']))
+        if not device_key_allows(sensor):
+            return jsonify({'error': 'API key is not allowed for this sensor'}), 403
 
-        # Create sensor data
-        sensor_data = SensorData(
-            sensor_id=sensor.id,
-            encrypted_value=encrypted_value,
-            unit=data.get('unit', ''),
-            timestamp=datetime.utcnow()
-        )
+        if sensor.status == 'deleting':
+            return jsonify({'error': 'Sensor is being deleted'}), 409
 
-        db.session.add(sensor_data)
-        db.session.commit()
+        # Store sensor data (row or block storage mode)
+        reading = current_app.extensions['ingest'].store_reading(sensor, data['value'], data.get('unit', ''),
+                                                                 timestamp, message_id)
+        if reading is None:
+            # Retry of a stored reading: acknowledged, not stored twice
+            return jsonify({'message': 'Duplicate reading ignored', 'duplicate': True}), 200
 
         return jsonify({
             'message': 'Sensor data created successfully',
-            'data': sensor_data.to_dict(decrypted_value=str(data['value']))
+            'data': reading
         }), 201
 
+    except SensorDeleted as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@sensor_data_bp.route('/batch', methods=['POST'])
+@device_key_or_jwt_required
+def create_sensor_data_batch():
+    """Create up to INGEST_BATCH_MAX_SIZE readings in one request (user JWT or device X-API-Key)"""
+    try:
+        try:
+            readings, rejected = parse_batch(request.get_json(silent=True), current_app.config['INGEST_BATCH_MAX_SIZE'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # One query for every sensor of the batch
+        refs = {sensor_ref for _, sensor_ref, _, _, _, _ in readings}
+        sensors = {sensor.sensor_id: sensor for sensor in Sensor.query.filter(Sensor.sensor_id.in_(refs))}
+
+        accepted = []
+        indexes = []
+        for index, sensor_ref, value, unit, timestamp, message_id in readings:
+            sensor = sensors.get(sensor_ref)
+            if not sensor:
+                rejected.append({'index': index, 'error': 'Sensor not found'})
+            elif not device_key_allows(sensor):
+                rejected.append({'index': index, 'error': 'API key is not allowed for this sensor'})
+            elif sensor.status == 'deleting':
+                rejected.append({'index': index, 'error': 'Sensor is being deleted'})
+            else:
+                accepted.append((sensor, value, unit, timestamp, message_id))
+                indexes.append(index)
+
+        # Sensors marked for deletion since the query above
+        failures = []
+        stored = current_app.extensions['ingest'].store_readings(accepted, failures=failures) if accepted else 0
+        for position, _ in failures:
+            rejected.append({'index': indexes[position], 'error': 'Sensor is being deleted'})
+
+        return jsonify({
+            'message': f"{stored} readings stored",
+            'accepted': stored,
+            'duplicates': len(accepted) - len(failures) - stored,
+            'rejected': sorted(rejected, key=lambda entry: entry['index'])
+        }), 201 if len(accepted) > len(failures) else 400
+
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -135,40 +289,23 @@ def get_sensor_stats(sensor_id):
         if not sensor:
             return jsonify({'error': 'Sensor not found'}), 404
 
-        # Get data from last 24 hours
+        # Get data from last 24 hours (raw readings and rollups)
         start_time = datetime.utcnow() - timedelta(days=1)
-        data_records = SensorData.query.filter(
-            SensorData.sensor_id == sensor_id,
-            SensorData.timestamp >= start_time
-        ).all()
+        aggregate = cached(('stats', sensor_id), [sensor_id], None, lambda: aggregate_range(sensor_id, start_time))
 
-        if not data_records:
+        if not aggregate:
             return jsonify({
                 'sensor': sensor.to_dict(),
                 'stats': None,
                 'message': 'No data available for this sensor'
             }), 200
 
-        # Decrypt and calculate statistics
-        encryption_service = EncryptionService(current_app.config['ENCRYPTION_KEY'])
-        values = []
-
-        for record in data_records:
-            try:
-                decrypted_value = float(encryption_service.decrypt(record.encrypted_value))
-                values.append(decrypted_value)
-            except Exception as e:
-                print(f"Failed to decrypt sensor data: {e}")
-
-        if values:
-            stats = {
-                'min': min(values),
-                'max': max(values),
-                'avg': sum(values) / len(values),
-                'count': len(values)
-            }
-        else:
-            stats = None
+        stats = {
+            'min': aggregate['min'],
+            'max': aggregate['max'],
+            'avg': aggregate['sum'] / aggregate['count'],
+            'count': aggregate['count']
+        }
 
         return jsonify({
             'sensor': sensor.to_dict(),
@@ -178,3 +315,71 @@ def get_sensor_stats(sensor_id):
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+@sensor_data_bp.route('/quantiles/<int:sensor_id>', methods=['GET'])
+@jwt_required()
+def get_sensor_quantiles(sensor_id):
+    """Get percentiles and a value histogram for a sensor over a range (hourly sketches)"""
+    try:
+        sensor = Sensor.query.get(sensor_id)
+
+        if not sensor:
+            return jsonify({'error': 'Sensor not found'}), 404
+
+        end_date = request.args.get('end_date')
+        start_date = request.args.get('start_date')
+        end = datetime.fromisoformat(end_date) if end_date else datetime.utcnow()
+        start = datetime.fromisoformat(start_date) if start_date else end - timedelta(days=1)
+
+        try:
+            percentiles = [float(p) for p in request.args.get('q', '5,50,95,99').split(',') if p.strip()]
+        except ValueError:
+            percentiles = None
+        if percentiles is None or not all(0 <= p <= 100 for p in percentiles):
+            return jsonify({'error': 'q must be percentiles between 0 and 100'}), 400
+        bins = request.args.get('bins', 10, type=int)
+        if not 0 <= bins <= current_app.config['HISTOGRAM_MAX_BINS']:
+            return jsonify({'error': f"bins must be between 0 and {current_app.config['HISTOGRAM_MAX_BINS']}"}), 400
+
+        # Merge one sketch per hour of the range
+        sketch, buckets = cached(('quantiles', sensor_id, start_date and start, end_date and end), [sensor_id],
+                                 end if end_date else None,
+                                 lambda: current_app.extensions['sketches'].query(sensor_id, start, end))
+
+        if sketch.count == 0:
+            return jsonify({
+                'sensor': sensor.to_dict(),
+                'stats': None,
+                'message': 'No data available for this sensor'
+            }), 200
+
+        histogram = []
+        if bins > 0:
+            width = (sketch.max - sketch.min) / bins or 1
+            edges = [sketch.min + i * width for i in range(bins + 1)]
+            histogram = [
+                {'from': edges[i], 'to': edges[i + 1], 'count': count}
+                for i, count in enumerate(sketch.histogram(edges))
+            ]
+
+        return jsonify({
+            'sensor': sensor.to_dict(),
+            'stats': {
+                'min': sketch.min,
+                'max': sketch.max,
+                'avg': sketch.sum / sketch.count,
+                'count': sketch.count,
+                'quantiles': {f"p{p:g}": sketch.quantile(p / 100) for p in percentiles},
+                'histogram': histogram
+            },
+            'period': {
+                # Ranges are aligned on whole hours
+                'start': start.replace(minute=0, second=0, microsecond=0).isoformat(),
+                'end': end.isoformat()
+            },
+            'buckets': buckets,
+            'relative_accuracy': sketch.relative_accuracy
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
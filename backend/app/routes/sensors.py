@@ -1,8 +1,24 @@
-from flask import request, jsonify
+from flask import request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import db, Sensor
+from app.models import db, Sensor, SensorDeletion
+from app.services.sensor_service import (
+    parse_bulk_items, bulk_create_sensors, bulk_update_sensors, bulk_set_status, SENSOR_STATUSES
+)
 from . import sensors_bp
 
+
+def bulk_response(results):
+    """Per-item results with their counts: 201/200 if anything was written, else 400"""
+    counts = {result: sum(1 for item in results if item['result'] == result) for result in ('created', 'updated', 'error')}
+    status_code = 201 if counts['created'] else 200 if counts['updated'] else 400
+    return jsonify({
+        'message': f"{counts['created']} sensors created, {counts['updated']} updated, {counts['error']} rejected",
+        'created': counts['created'],
+        'updated': counts['updated'],
+        'rejected': counts['error'],
+        'results': results
+    }), status_code
+
 @sensors_bp.route('', methods=['GET'])
 @jwt_required()
 def get_sensors():
@@ -15,6 +31,9 @@ def get_sensors():
 
         if status:
             query = query.filter_by(status=status)
+        else:
+            # Sensors being deleted are only listed on request (?status=deleting)
+            query = query.filter(Sensor.status != 'deleting')
         if sensor_type:
             query = query.filter_by(type=sensor_type)
 
@@ -90,6 +109,9 @@ def update_sensor(sensor_id):
         if not sensor:
             return jsonify({'error': 'Sensor not found'}), 404
 
+        if sensor.status == 'deleting':
+            return jsonify({'error': 'Sensor is being deleted'}), 409
+
         data = request.get_json()
 
         # Update fields
@@ -118,17 +140,89 @@ def update_sensor(sensor_id):
 @sensors_bp.route('/<int:sensor_id>', methods=['DELETE'])
 @jwt_required()
 def delete_sensor(sensor_id):
-    """Delete a sensor"""
+    """Delete a sensor (history purged in the background)"""
     try:
         sensor = Sensor.query.get(sensor_id)
 
         if not sensor:
             return jsonify({'error': 'Sensor not found'}), 404
 
-        db.session.delete(sensor)
-        db.session.commit()
+        deletion = current_app.extensions['sensor_purge'].request_deletion(
+            sensor, requested_by=get_jwt_identity()
+        )
+
+        return jsonify({
+            'message': 'Sensor deletion scheduled',
+            'deletion': deletion.to_dict()
+        }), 202
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@sensors_bp.route('/<int:sensor_id>/deletion', methods=['GET'])
+@jwt_required()
+def get_sensor_deletion(sensor_id):
+    """Get the progress of a sensor deletion (also after the sensor is gone)"""
+    try:
+        deletion = SensorDeletion.query.filter_by(sensor_id=sensor_id)\
+            .order_by(SensorDeletion.id.desc()).first()
+
+        if not deletion:
+            return jsonify({'error': 'No deletion found for this sensor'}), 404
+
+        return jsonify({'deletion': deletion.to_dict()}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        return jsonify({'message': 'Sensor deleted successfully'}), 200
+@sensors_bp.route('/bulk', methods=['POST'])
+@jwt_required()
+def create_sensors_bulk():
+    """Create up to SENSOR_BULK_MAX_SIZE sensors in one transaction ("upsert": true updates existing ones)"""
+    try:
+        data = request.get_json(silent=True)
+        try:
+            items = parse_bulk_items(data, 'sensors', current_app.config['SENSOR_BULK_MAX_SIZE'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        return bulk_response(bulk_create_sensors(items, upsert=data.get('upsert') is True))
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@sensors_bp.route('/bulk', methods=['PUT'])
+@jwt_required()
+def update_sensors_bulk():
+    """Update up to SENSOR_BULK_MAX_SIZE sensors (by id or sensor_id) in one transaction"""
+    try:
+        try:
+            items = parse_bulk_items(request.get_json(silent=True), 'sensors', current_app.config['SENSOR_BULK_MAX_SIZE'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        return bulk_response(bulk_update_sensors(items))
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@sensors_bp.route('/bulk/status', methods=['PUT'])
+@jwt_required()
+def update_sensors_status_bulk():
+    """Set the status of up to SENSOR_BULK_MAX_SIZE sensors (ids or sensor_id strings)"""
+    try:
+        data = request.get_json(silent=True)
+        try:
+            refs = parse_bulk_items(data, 'sensors', current_app.config['SENSOR_BULK_MAX_SIZE'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if data.get('status') not in SENSOR_STATUSES:
+            return jsonify({'error': f"status must be one of {', '.join(SENSOR_STATUSES)}"}), 400
+
+        return bulk_response(bulk_set_status(refs, data['status']))
 
     except Exception as e:
         db.session.rollback()
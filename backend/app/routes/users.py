@@ -1,6 +1,7 @@
 from flask import request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt
 from app.models import db, User
+from app.services.password_service import PasswordServiceBusy
 from . import users_bp
 
 def admin_required():
@@ -81,6 +82,9 @@ def update_user(user_id):
             'user': user.to_dict()
         }), 200
 
+    except PasswordServiceBusy as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -0,0 +1,125 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, delete, literal, or_, and_
+from app.models import db, Alert, AlertArchive
+from app.services.alert_service import resolve_alerts
+from app.services.job_service import job_handler
+from app.services.mqtt_service import threshold_resolutions
+
+# Columns copied from alerts to alerts_archive
+ARCHIVED_COLUMNS = ('id', 'sensor_id', 'alert_type', 'message', 'severity', 'threshold_value',
+                    'actual_value', 'is_resolved', 'created_at', 'resolved_at')
+
+
+class AlertLifecycleService:
+    """
+    Automatic resolution and archival of alerts
+
+    A reading back inside its threshold band (by the type's hysteresis)
+    resolves the open alerts of its sensor. Sensors known to have no open
+    alert are not checked again for ALERT_RESOLVE_RECHECK seconds, so the
+    usual in-band reading costs no query.
+
+    Resolved alerts older than ALERT_ARCHIVE_DAYS are moved to
+    alerts_archive by the alert_archive job, ALERT_ARCHIVE_CHUNK_SIZE at a
+    time: the alerts table only holds open and recent alerts.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.checked = {}  # (sensor_id, alert_type) -> monotonic time it had no open alert
+        self.lock = threading.Lock()
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize alert lifecycle service with Flask app"""
+        self.app = app
+        app.extensions['alert_lifecycle'] = self
+
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config.get('ALERT_AUTO_RESOLVE', True)
+
+    def opened(self, sensor_id, alert_type):
+        """An alert was opened (or found open): check it on the next in-band reading"""
+        with self.lock:
+            self.checked.pop((sensor_id, alert_type), None)
+
+    def cleared(self, sensor, value):
+        """
+        Alert types a reading clears that may still be open
+
+        They are then assumed resolved until ALERT_RESOLVE_RECHECK seconds
+        pass (alerts opened by another process) or opened() is called.
+        """
+        if not self.enabled:
+            return []
+        now = time.monotonic()
+        recheck = self.app.config['ALERT_RESOLVE_RECHECK']
+        alert_types = []
+        with self.lock:
+            for alert_type in threshold_resolutions(sensor, value):
+                checked_at = self.checked.get((sensor.id, alert_type))
+                if checked_at is None or now - checked_at >= recheck:
+                    self.checked[(sensor.id, alert_type)] = now
+                    alert_types.append(alert_type)
+        return alert_types
+
+    def resolve_cleared(self, sensor, value):
+        """Resolve and commit the open alerts a reading clears; returns how many"""
+        resolved = 0
+        for alert_type in self.cleared(sensor, value):
+            resolved += resolve_alerts([sensor.id], alert_type)
+        if resolved:
+            db.session.commit()
+            print(f"Resolved {resolved} alert(s) of sensor {sensor.sensor_id}: value {value} back to normal")
+        return resolved
+
+    def discard(self, sensor_id):
+        """Forget a sensor (sensor deletion)"""
+        with self.lock:
+            for key in [key for key in self.checked if key[0] == sensor_id]:
+                del self.checked[key]
+
+    def archive_once(self, job=None):
+        """
+        Move alerts resolved more than ALERT_ARCHIVE_DAYS ago (created, when
+        resolved_at is unknown) to alerts_archive; returns how many
+        """
+        cutoff = datetime.utcnow() - timedelta(days=self.app.config['ALERT_ARCHIVE_DAYS'])
+        chunk_size = self.app.config['ALERT_ARCHIVE_CHUNK_SIZE']
+        archived = 0
+
+        while True:
+            ids = [row.id for row in db.session.query(Alert.id).filter(
+                Alert.is_resolved.is_(True),
+                # Alerts resolved before resolved_at existed: age by creation
+                or_(Alert.resolved_at < cutoff, and_(Alert.resolved_at.is_(None), Alert.created_at < cutoff))
+            ).order_by(Alert.id).limit(chunk_size)]
+            if not ids:
+                break
+
+            # Copy and delete in one transaction: an alert is never in both tables
+            columns = [getattr(Alert, column) for column in ARCHIVED_COLUMNS]
+            db.session.execute(insert(AlertArchive).from_select(
+                [*ARCHIVED_COLUMNS, 'archived_at'],
+                select(*columns, literal(datetime.utcnow())).where(Alert.id.in_(ids))
+            ))
+            db.session.execute(delete(Alert).where(Alert.id.in_(ids)))
+            db.session.commit()
+            archived += len(ids)
+            if job:
+                job.update(message=f"{archived} alerts archived")
+
+        if archived:
+            print(f"Alert archival done: {archived} alerts archived")
+        return archived
+
+
+@job_handler('alert_archive')
+def run_alert_archive(job):
+    """Job: archive old resolved alerts (scheduled every ALERT_ARCHIVE_INTERVAL)"""
+    return {'archived': job.app.extensions['alert_lifecycle'].archive_once(job)}
@@ -0,0 +1,39 @@
+from datetime import datetime
+from app.models import db, Alert
+
+
+def create_alert(sensor, alert_type, message, severity, threshold, actual_value):
+    """Create and commit an alert unless one is already open for this sensor and type; returns it or None"""
+    # Check if an unresolved alert already exists
+    existing_alert = Alert.query.filter_by(
+        sensor_id=sensor.id,
+        alert_type=alert_type,
+        is_resolved=False
+    ).first()
+    if existing_alert:
+        return None
+
+    alert = Alert(
+        sensor_id=sensor.id,
+        alert_type=alert_type,
+        message=message,
+        severity=severity,
+        threshold_value=threshold,
+        actual_value=actual_value,
+        is_resolved=False
+    )
+    db.session.add(alert)
+    db.session.commit()
+    print(f"Created alert: {message}")
+    return alert
+
+
+def resolve_alerts(sensor_ids, alert_type):
+    """Resolve the open alerts of this type for these sensors (no commit); returns how many"""
+    if not sensor_ids:
+        return 0
+    return Alert.query.filter(
+        Alert.sensor_id.in_(sensor_ids),
+        Alert.alert_type == alert_type,
+        Alert.is_resolved.is_(False)
+    ).update({'is_resolved': True, 'resolved_at': datetime.utcnow()}, synchronize_session=False)
@@ -0,0 +1,225 @@
+import atexit
+import json
+import threading
+import sqlalchemy as sa
+from sqlalchemy.pool import NullPool
+from app.models import db, SensorAnomalyState
+from app.models.routing import use_bind, INGEST_BIND
+from app.services.sensor_service import writable_sensor_ids
+from app.utils.anomaly import AnomalyDetector, AnomalyState, OUTLIER, JUMP, STUCK
+from app.utils.encryption import EncryptionService
+
+ANOMALY_MESSAGES = {
+    OUTLIER: '{name} value {value} deviates from its recent mean ({baseline:.4g})',
+    JUMP: '{name} value jumped from {baseline:.4g} to {value}',
+    STUCK: '{name} value is stuck at {value}'
+}
+
+# PostgreSQL advisory lock held by the one process running the detector
+DETECTOR_LOCK_ID = 4242001
+
+
+class AnomalyService:
+    """
+    Streaming anomaly detection at ingest (ANOMALY_ENABLED)
+
+    Keeps one AnomalyState per sensor in memory, fed with every reading
+    by the ingest service, and checkpoints the states (encrypted) to
+    sensor_anomaly_states every ANOMALY_CHECKPOINT_INTERVAL seconds and on
+    shutdown. A sensor's state is loaded from its checkpoint the first
+    time this process sees it.
+
+    A detector must see every reading of its sensors in order: only one
+    process runs it, the one holding a PostgreSQL advisory lock on a
+    dedicated connection (retried every ANOMALY_CHECKPOINT_INTERVAL by
+    the others, taken over when its holder exits). Readings ingested by
+    other processes are not checked, so ingestion should go through a
+    single process (see README); on SQLite every process runs it.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.encryption_service = None
+        self.detector = None
+        self.states = {}  # sensor_id -> AnomalyState
+        self.dirty = set()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.leader = False
+        self.lock_engine = None
+        self.lock_connection = None
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize anomaly service with Flask app"""
+        self.app = app
+        self.encryption_service = EncryptionService.from_config(app.config)
+        self.detector = AnomalyDetector(
+            alpha=app.config['ANOMALY_ALPHA'],
+            warmup=app.config['ANOMALY_WARMUP'],
+            z_threshold=app.config['ANOMALY_Z_THRESHOLD'],
+            jump_threshold=app.config['ANOMALY_JUMP_THRESHOLD'],
+            stuck_count=app.config['ANOMALY_STUCK_COUNT']
+        )
+        app.extensions['anomalies'] = self
+
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config.get('ANOMALY_ENABLED', True)
+
+    @property
+    def active(self):
+        """Whether this process runs the detector"""
+        return self.enabled and self.leader
+
+    def start(self):
+        """Take the detector lock, then checkpoint states every ANOMALY_CHECKPOINT_INTERVAL seconds"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self._claim()
+        self.thread = threading.Thread(target=self._loop, name='anomaly-checkpoint', daemon=True)
+        self.thread.start()
+        atexit.register(self.checkpoint)
+
+    def _loop(self):
+        while not self.stop_event.wait(self.app.config['ANOMALY_CHECKPOINT_INTERVAL']):
+            try:
+                self.checkpoint()
+                self._claim()
+            except Exception as e:
+                print(f"Error checkpointing anomaly states: {e}")
+
+    def _claim(self):
+        """Take or check the detector lock; states are reloaded from the checkpoints when it changes hands"""
+        url = sa.engine.make_url(self.app.config['SQLALCHEMY_DATABASE_URI'])
+        if url.get_backend_name() != 'postgresql':
+            self.leader = True
+            return
+
+        if self.lock_connection is not None:
+            try:
+                self.lock_connection.execute(sa.text('SELECT 1'))
+                return
+            except Exception as e:
+                print(f"Lost the anomaly detector lock: {e}")
+                self._release()
+
+        if self.lock_engine is None:
+            self.lock_engine = sa.create_engine(url, poolclass=NullPool)
+        connection = self.lock_engine.connect()
+        try:
+            held = connection.execute(sa.text('SELECT pg_try_advisory_lock(:id)'), {'id': DETECTOR_LOCK_ID}).scalar()
+            connection.commit()
+        except Exception:
+            connection.close()
+            raise
+        if not held:
+            connection.close()
+            return
+        with self.lock:
+            # Another process may have run the detector meanwhile
+            self.states = {}
+            self.dirty = set()
+            self.lock_connection = connection
+            self.leader = True
+        print("Anomaly detector running in this process")
+
+    def _release(self):
+        with self.lock:
+            self.leader = False
+            self.states = {}
+            self.dirty = set()
+            connection, self.lock_connection = self.lock_connection, None
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def _load(self, sensor_ids):
+        """Checkpointed states of sensors not seen yet by this process"""
+        rows = SensorAnomalyState.query.filter(SensorAnomalyState.sensor_id.in_(sensor_ids)).all()
+        loaded = {}
+        for row in rows:
+            try:
+                loaded[row.sensor_id] = AnomalyState.from_list(json.loads(self.encryption_service.decrypt(row.encrypted_state)))
+            except Exception as e:
+                print(f"Failed to load anomaly state of sensor {row.sensor_id}: {e}")
+        return loaded
+
+    def evaluate(self, readings):
+        """
+        Feed (sensor, value) readings to the detector
+
+        Returns the alerts to open, as create_alert keyword arguments
+        paired with their sensor. Non-numeric values are ignored, and
+        nothing is checked unless this process runs the detector.
+        """
+        if not self.leader:
+            return []
+        unknown = {sensor.id for sensor, _ in readings if sensor.id not in self.states}
+        loaded = self._load(unknown) if unknown else {}
+
+        alerts = []
+        with self.lock:
+            for sensor_id in unknown:
+                self.states.setdefault(sensor_id, loaded.get(sensor_id) or AnomalyState())
+            for sensor, value in readings:
+                try:
+                    value = float(value)
+                except (TypeError, ValueError):
+                    continue
+                state = self.states.get(sensor.id)
+                if state is None:
+                    continue  # Discarded meanwhile (sensor deletion)
+                self.dirty.add(sensor.id)
+                for alert_type, baseline in self.detector.update(state, value):
+                    alerts.append((sensor, {
+                        'alert_type': alert_type,
+                        'message': ANOMALY_MESSAGES[alert_type].format(name=sensor.name, value=value, baseline=baseline),
+                        'severity': 'warning',
+                        'threshold': baseline,
+                        'actual_value': value
+                    }))
+        return alerts
+
+    def discard(self, sensor_id):
+        """Forget the state of a sensor (sensor deletion)"""
+        with self.lock:
+            self.states.pop(sensor_id, None)
+            self.dirty.discard(sensor_id)
+
+    def checkpoint(self):
+        """Save the states updated since the last checkpoint"""
+        with self.lock:
+            changed = {sensor_id: self.states[sensor_id].to_list() for sensor_id in self.dirty if sensor_id in self.states}
+            self.dirty = set()
+        if not changed:
+            return
+        with self.app.app_context(), use_bind(INGEST_BIND):
+            try:
+                # Sensors deleted meanwhile, possibly from another process
+                writable = writable_sensor_ids(changed)
+                for sensor_id in set(changed) - writable:
+                    self.discard(sensor_id)
+                changed = {sensor_id: values for sensor_id, values in changed.items() if sensor_id in writable}
+                existing = {row.sensor_id: row for row in SensorAnomalyState.query.filter(
+                    SensorAnomalyState.sensor_id.in_(changed))}
+                for sensor_id, values in changed.items():
+                    row = existing.get(sensor_id)
+                    if row is None:
+                        row = SensorAnomalyState(sensor_id=sensor_id)
+                        db.session.add(row)
+                    row.encrypted_state = self.encryption_service.encrypt(json.dumps(values))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Failed to checkpoint anomaly states, will retry: {e}")
+                with self.lock:
+                    self.dirty.update(changed)
+            finally:
+                db.session.remove()
@@ -0,0 +1,510 @@
+import asyncio
+import functools
+import hmac
+import json
+import time
+from datetime import datetime
+import jwt
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.models import SensorData, Sensor, Alert, DeviceKey
+from app.models.routing import use_bind, INGEST_BIND
+from app.services.device_key_service import parse_api_key, hash_secret, KeyCache
+from app.services.mqtt_service import threshold_alerts
+from app.services.ingest_service import (value_policy, value_columns, parse_reading_timestamp, stored_reading_filter,
+                                         is_keyed, keyed_insert, written_rows, SensorDeleted)
+from app.services.dedup_service import parse_message_id
+from app.utils.encryption import EncryptionService
+
+# Async drivers of the database backends
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite'
+}
+
+
+def async_database_url(config):
+    """ASYNC_DATABASE_URL, or SQLALCHEMY_DATABASE_URI with its async driver"""
+    if config.get('ASYNC_DATABASE_URL'):
+        return config['ASYNC_DATABASE_URL']
+    url = sa.engine.make_url(config['SQLALCHEMY_DATABASE_URI'])
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+
+class AsyncSensor:
+    """Cached sensor columns used by ingestion (same attribute names as Sensor)"""
+
+    __slots__ = ('id', 'sensor_id', 'name', 'type', 'location', 'status', 'expires_at')
+
+    def __init__(self, row, expires_at):
+        self.id = row.id
+        self.sensor_id = row.sensor_id
+        self.name = row.name
+        self.type = row.type
+        self.location = row.location
+        self.status = row.status
+        self.expires_at = expires_at
+
+
+class AsyncIngestService:
+    """
+    asyncio ingestion of readings (HTTP and MQTT) for ingest_server.py
+
+    Shares the models, encryption and in-memory parts (sketches, hot
+    blocks) of the Flask app, but writes rows through an async driver
+    (asyncpg): readings from every connection go to one queue, and
+    INGEST_ASYNC_WRITERS tasks insert them INGEST_ASYNC_BATCH_SIZE at a
+    time with one executemany each. A request waits for the commit of its
+    batch, so 201 still means stored.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.config = app.config
+        self.encryption_service = EncryptionService.from_config(app.config)
+        self.engine = None
+        self.queue = None
+        self.writers = []
+        self.sensors = {}  # sensor_id string -> AsyncSensor
+        self.device_keys = KeyCache(app.config)
+
+    async def start(self):
+        """Open the async engine and start the writer tasks"""
+        options = {'pool_size': self.config['INGEST_ASYNC_POOL_SIZE'], 'max_overflow': 0}
+        url = sa.engine.make_url(async_database_url(self.config))
+        if url.get_backend_name() == 'sqlite':
+            options = {}
+        elif self.config['DB_STATEMENT_TIMEOUT_MS']:
+            options['connect_args'] = {'server_settings': {'statement_timeout': str(self.config['DB_STATEMENT_TIMEOUT_MS'])}}
+        self.engine = create_async_engine(url, pool_pre_ping=self.config['DB_POOL_PRE_PING'], **options)
+
+        self.queue = asyncio.Queue(maxsize=self.config['INGEST_ASYNC_QUEUE_SIZE'])
+        self.writers = [asyncio.create_task(self._writer()) for _ in range(self.config['INGEST_ASYNC_WRITERS'])]
+
+        # Sketch and group aggregate flushing, anomaly checkpoints, liveness and block sealing keep running on their threads
+        if self.app.extensions['sketches'].enabled:
+            self.app.extensions['sketches'].start()
+        if self.app.extensions['group_aggregates'].enabled:
+            self.app.extensions['group_aggregates'].start()
+        if self.app.extensions['anomalies'].enabled:
+            self.app.extensions['anomalies'].start()
+        if self.app.extensions['liveness'].enabled:
+            self.app.extensions['liveness'].start()
+        if self.app.extensions['block_storage'].enabled:
+            self.app.extensions['block_storage'].start()
+
+    async def stop(self):
+        """Write the queued readings, then close the engine"""
+        if self.queue is not None:
+            await self.queue.join()
+        for writer in self.writers:
+            writer.cancel()
+        await asyncio.gather(*self.writers, return_exceptions=True)
+        if self.engine is not None:
+            await self.engine.dispose()
+        await asyncio.to_thread(self.app.extensions['sketches'].flush)
+        await asyncio.to_thread(self.app.extensions['group_aggregates'].flush)
+        await asyncio.to_thread(self.app.extensions['anomalies'].checkpoint)
+        self.app.extensions['liveness'].stop()
+        await asyncio.to_thread(self.app.extensions['liveness'].sync)
+        if self.app.extensions['block_storage'].enabled:
+            await asyncio.to_thread(self.app.extensions['block_storage'].seal_all)
+        self.app.extensions['result_cache'].stop()
+        await asyncio.to_thread(self.app.extensions['result_cache'].sync)
+
+    # ------------------------------------------------------------------
+    # Authentication
+    # ------------------------------------------------------------------
+
+    def verify_jwt(self, token):
+        """Claims of a valid access token issued by the Flask API, else None"""
+        try:
+            claims = jwt.decode(token, self.config['JWT_SECRET_KEY'],
+                                algorithms=[self.config.get('JWT_ALGORITHM', 'HS256')])
+        except jwt.PyJWTError:
+            return None
+        return claims if claims.get('type') == 'access' else None
+
+    async def verify_device_key(self, api_key):
+        """(DeviceKey id, sensor_id or None) of a valid X-API-Key, else None (cached like DeviceKeyService)"""
+        parsed = parse_api_key(api_key)
+        if parsed is None:
+            return None
+        key_id, secret = parsed
+
+        entry = self.device_keys.get(key_id)
+        if entry is None:
+            async with self.engine.connect() as connection:
+                row = (await connection.execute(
+                    sa.select(DeviceKey.key_hash, DeviceKey.id, DeviceKey.sensor_id, DeviceKey.revoked_at)
+                    .where(DeviceKey.key_id == key_id)
+                )).first()
+            if row and not row.revoked_at:
+                entry = self.device_keys.put(key_id, row.key_hash, row.id, row.sensor_id)
+            else:
+                entry = self.device_keys.put(key_id)
+
+        key_hash, device_key_id, sensor_id, _ = entry
+        if key_hash is None or not hmac.compare_digest(key_hash, hash_secret(self.config['DEVICE_KEY_SECRET'], secret)):
+            return None
+        return device_key_id, sensor_id
+
+    # ------------------------------------------------------------------
+    # Sensors
+    # ------------------------------------------------------------------
+
+    async def get_sensors(self, sensor_refs, create_type=None):
+        """
+        {sensor_id string: AsyncSensor} of the given sensors, cached for
+        INGEST_ASYNC_SENSOR_CACHE_TTL seconds. With create_type, missing
+        sensors are created (MQTT auto-registration).
+        """
+        now = time.monotonic()
+        found = {}
+        missing = set()
+        for sensor_ref in sensor_refs:
+            sensor = self.sensors.get(sensor_ref)
+            if sensor and sensor.expires_at > now:
+                found[sensor_ref] = sensor
+            else:
+                missing.add(sensor_ref)
+        if not missing:
+            return found
+
+        columns = (Sensor.id, Sensor.sensor_id, Sensor.name, Sensor.type, Sensor.location, Sensor.status)
+        expires_at = now + self.config['INGEST_ASYNC_SENSOR_CACHE_TTL']
+        async with self.engine.begin() as connection:
+            rows = (await connection.execute(sa.select(*columns).where(Sensor.sensor_id.in_(missing)))).all()
+            for row in rows:
+                found[row.sensor_id] = self.sensors[row.sensor_id] = AsyncSensor(row, expires_at)
+
+            if create_type is not None:
+                for sensor_ref in missing - set(found):
+                    try:
+                        async with connection.begin_nested():
+                            row = (await connection.execute(
+                                sa.insert(Sensor).values(
+                                    sensor_id=sensor_ref, name=f"Sensor {sensor_ref}", type=create_type, status='active'
+                                ).returning(*columns)
+                            )).one()
+                        print(f"Created new sensor: {sensor_ref}")
+                    except sa.exc.IntegrityError:
+                        # Created meanwhile by another process
+                        row = (await connection.execute(sa.select(*columns).where(Sensor.sensor_id == sensor_ref))).one()
+                    found[sensor_ref] = self.sensors[sensor_ref] = AsyncSensor(row, expires_at)
+        return found
+
+    def forget_sensors(self, ids):
+        """Drop cached sensors by database id (found being deleted)"""
+        self.sensors = {sensor_ref: sensor for sensor_ref, sensor in self.sensors.items() if sensor.id not in ids}
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+
+    def _buffer_block(self, sensor, value, unit, timestamp):
+        """IngestService.buffer_block (sealing a block writes it: run off the event loop)"""
+        with self.app.app_context(), use_bind(INGEST_BIND):
+            return self.app.extensions['ingest'].buffer_block(sensor, value, unit, timestamp)
+
+    def _count(self, future, sensor, value, unit, timestamp):
+        """Done callback of a queued row: IngestService.count_reading once the row is written"""
+        if future.cancelled() or future.exception() is not None or future.result() is not True:
+            return
+        with self.app.app_context():
+            self.app.extensions['ingest'].count_reading(sensor, value, unit, timestamp)
+
+    async def is_duplicate(self, sensor, timestamp, message_id, pending):
+        """IngestService.is_duplicate, possible duplicates confirmed with the async engine"""
+        dedup = self.app.extensions['dedup']
+        if not dedup.enabled or (timestamp is None and message_id is None):
+            return False
+        keys = dedup.keys(sensor.id, timestamp, message_id)
+        duplicate = dedup.maybe_seen(sensor.id, timestamp, message_id) and (
+            not pending.isdisjoint(keys)
+            or await self.stored(sensor.id, timestamp, message_id)
+            or (self.app.extensions['block_storage'].enabled
+                and await asyncio.to_thread(self._in_blocks, sensor.id, timestamp))
+        )
+        if duplicate:
+            dedup.duplicate()
+        else:
+            pending.update(keys)
+        return duplicate
+
+    def _in_blocks(self, sensor_id, timestamp):
+        """IngestService.in_blocks (decrypts sealed blocks: run off the event loop)"""
+        with self.app.app_context(), use_bind(INGEST_BIND):
+            return self.app.extensions['ingest'].in_blocks(sensor_id, timestamp)
+
+    async def stored(self, sensor_id, timestamp, message_id):
+        """IngestService.stored with the async engine"""
+        async with self.engine.connect() as connection:
+            return (await connection.execute(
+                sa.select(SensorData.id).where(stored_reading_filter(sensor_id, timestamp, message_id)).limit(1)
+            )).first() is not None
+
+    async def store_readings(self, readings, wait=True, failures=None):
+        """
+        Store (sensor, value, unit, timestamp, message_id) readings, skipping duplicates
+
+        Rows are queued for the writer tasks; with wait=True, returns once
+        they are committed. A reading whose row could not be written raises
+        (SensorDeleted when its sensor was marked for deletion meanwhile),
+        or is appended to `failures` as (position in readings, error) when
+        a list is given. Returns the number of readings stored (rows the
+        database dropped as duplicates are not counted).
+        """
+        block_mode = self.app.extensions['block_storage'].enabled
+        futures = []
+        stored = []
+        pending = set()
+        for position, (sensor, value, unit, timestamp, message_id) in enumerate(readings):
+            if await self.is_duplicate(sensor, timestamp, message_id, pending):
+                continue
+            device_timestamp = timestamp
+            timestamp = timestamp or datetime.utcnow()
+            stored.append((sensor, value, timestamp))
+            if block_mode:
+                await asyncio.to_thread(self._buffer_block, sensor, value, unit, timestamp)
+                continue
+
+            # Counted in liveness, sketches and group aggregates only once written
+            future = asyncio.get_running_loop().create_future()
+            future.add_done_callback(functools.partial(self._count, sensor=sensor, value=value,
+                                                       unit=unit, timestamp=timestamp))
+            await self.queue.put(({
+                'sensor_id': sensor.id,
+                **value_columns(self.encryption_service, value_policy(self.app.config, sensor.type), value),
+                'unit': unit,
+                'timestamp': timestamp,
+                'device_timestamp': device_timestamp,
+                'message_id': message_id
+            }, future))
+            futures.append((position, len(stored) - 1, future))
+
+        if wait and futures:
+            results = await asyncio.gather(*(future for _, _, future in futures), return_exceptions=True)
+            failed = [(position, index, result) for (position, index, _), result in zip(futures, results)
+                      if isinstance(result, Exception)]
+            if failed and failures is None:
+                raise failed[0][2]
+            failures = failures if failures is not None else []
+            failures.extend((position, error) for position, _, error in failed)
+            # Not written: failed, or dropped by the database (stored meanwhile by another process)
+            dropped = {index for (_, index, _), result in zip(futures, results) if result is not True}
+            for _ in range(sum(result is False for result in results)):
+                self.app.extensions['dedup'].duplicate()
+            stored = [reading for index, reading in enumerate(stored) if index not in dropped]
+
+        self.app.extensions['ingest'].invalidate_results([(sensor, timestamp) for sensor, _, timestamp in stored])
+        await self.detect_anomalies([(sensor, value) for sensor, value, _ in stored])
+        return len(stored)
+
+    async def detect_anomalies(self, readings):
+        """Streaming anomaly detector of the Flask app (in memory), alerts written here"""
+        anomalies = self.app.extensions['anomalies']
+        if not anomalies.active or not readings:
+            return
+        try:
+            # Loading the checkpoint of a sensor seen for the first time queries the database
+            alerts = await asyncio.to_thread(self._evaluate_anomalies, readings)
+            await self.open_alerts(alerts)
+        except Exception as e:
+            print(f"Error checking anomalies: {e}")
+
+    def _evaluate_anomalies(self, readings):
+        """AnomalyService.evaluate (may load checkpoints: run off the event loop)"""
+        with self.app.app_context(), use_bind(INGEST_BIND):
+            return self.app.extensions['anomalies'].evaluate(readings)
+
+    async def _writer(self):
+        """Insert queued rows in batches (one executemany and commit per batch)"""
+        batch_size = self.config['INGEST_ASYNC_BATCH_SIZE']
+        linger = self.config['INGEST_ASYNC_LINGER_MS'] / 1000.0
+        while True:
+            batch = [await self.queue.get()]
+            deadline = time.monotonic() + linger
+            while len(batch) < batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                try:
+                    results = await self._write_rows([row for row, _ in batch])
+                except Exception as e:
+                    if len(batch) == 1:
+                        results = [e]
+                    else:
+                        # Rows come from unrelated requests: one bad row only fails its own request
+                        print(f"Failed to write {len(batch)} readings, retrying row by row: {e}")
+                        results = [await self._write_row(row) for row, _ in batch]
+                for (_, future), result in zip(batch, results):
+                    if future.done():
+                        continue
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+                errors = [result for result in results
+                          if isinstance(result, Exception) and not isinstance(result, SensorDeleted)]
+                if errors:
+                    print(f"Failed to write {len(errors)} readings: {errors[0]}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _write_rows(self, rows):
+        """
+        Insert rows in one transaction; returns one written flag per row
+
+        Same as ingest_service.write_readings: keyed rows skip duplicates
+        (stored meanwhile by another process) and return their keys. Sensor
+        statuses are checked again in the transaction, as the cached ones
+        may be stale: rows of sensors missing or being deleted are not
+        inserted, their result is SensorDeleted.
+        """
+        statement = keyed_insert(self.engine.dialect.name)
+        async with self.engine.begin() as connection:
+            sensor_ids = {row['sensor_id'] for row in rows}
+            writable = set((await connection.execute(sa.select(Sensor.id).where(
+                Sensor.id.in_(sensor_ids), Sensor.status != 'deleting'))).scalars())
+            if writable != sensor_ids:
+                self.forget_sensors(sensor_ids - writable)
+            written = [True if row['sensor_id'] in writable else SensorDeleted('Sensor is being deleted')
+                       for row in rows]
+            plain = [row for index, row in enumerate(rows) if written[index] is True and not is_keyed(row)]
+            keyed = [index for index, row in enumerate(rows) if written[index] is True and is_keyed(row)]
+            if plain:
+                await connection.execute(sa.insert(SensorData), plain)
+            if keyed:
+                keyed_rows = [rows[index] for index in keyed]
+                if statement is None:
+                    await connection.execute(sa.insert(SensorData), keyed_rows)
+                else:
+                    flags = written_rows(keyed_rows, await connection.execute(statement, keyed_rows))
+                    for index, flag in zip(keyed, flags):
+                        written[index] = flag
+        return written
+
+    async def _write_row(self, row):
+        """Insert one row in its own transaction; returns its written flag, or the error"""
+        try:
+            return (await self._write_rows([row]))[0]
+        except Exception as e:
+            return e
+
+    # ------------------------------------------------------------------
+    # MQTT
+    # ------------------------------------------------------------------
+
+    async def open_alerts(self, alerts):
+        """Insert (sensor, alert) pairs, one open alert per sensor and type (alert_service.create_alert)"""
+        if not alerts:
+            return
+        lifecycle = self.app.extensions['alert_lifecycle']
+        async with self.engine.begin() as connection:
+            for sensor, alert in alerts:
+                lifecycle.opened(sensor.id, alert['alert_type'])
+                existing = (await connection.execute(sa.select(Alert.id).where(
+                    Alert.sensor_id == sensor.id,
+                    Alert.alert_type == alert['alert_type'],
+                    Alert.is_resolved.is_(False)
+                ).limit(1))).first()
+                if existing:
+                    continue
+                await connection.execute(sa.insert(Alert).values(
+                    sensor_id=sensor.id,
+                    alert_type=alert['alert_type'],
+                    message=alert['message'],
+                    severity=alert['severity'],
+                    threshold_value=alert['threshold'],
+                    actual_value=alert['actual_value'],
+                    is_resolved=False
+                ))
+                print(f"Created alert: {alert['message']}")
+
+    async def resolve_cleared(self, sensor, value):
+        """Resolve the open alerts a value clears (AlertLifecycleService.resolve_cleared)"""
+        alert_types = self.app.extensions['alert_lifecycle'].cleared(sensor, value)
+        if not alert_types:
+            return
+        async with self.engine.begin() as connection:
+            result = await connection.execute(sa.update(Alert).where(
+                Alert.sensor_id == sensor.id,
+                Alert.alert_type.in_(alert_types),
+                Alert.is_resolved.is_(False)
+            ).values(is_resolved=True, resolved_at=datetime.utcnow()))
+        if result.rowcount:
+            print(f"Resolved {result.rowcount} alert(s) of sensor {sensor.sensor_id}: value {value} back to normal")
+
+    async def check_alerts(self, sensor, value):
+        """Threshold alerts of MQTTService.check_alerts"""
+        try:
+            await self.open_alerts([(sensor, alert) for alert in threshold_alerts(sensor, value)])
+            await self.resolve_cleared(sensor, value)
+        except Exception as e:
+            print(f"Error checking alerts: {e}")
+
+    async def handle_mqtt_message(self, raw_payload):
+        """Same message format and behaviour as MQTTService.on_message"""
+        try:
+            payload = json.loads(raw_payload)
+
+            sensor_ref = payload.get('sensor_id')
+            value = payload.get('value')
+            unit = payload.get('unit', '')
+
+            if not sensor_ref or value is None:
+                print("Invalid message format: missing sensor_id or value")
+                return
+            try:
+                timestamp = parse_reading_timestamp(payload.get('timestamp'))
+                message_id = parse_message_id(payload.get('message_id'))
+            except (TypeError, ValueError) as e:
+                print(f"Invalid message format: {e}")
+                return
+
+            sensor = (await self.get_sensors([sensor_ref], create_type=payload.get('type', 'unknown')))[sensor_ref]
+            if sensor.status == 'deleting':
+                return
+
+            if not await self.store_readings([(sensor, value, unit, timestamp, message_id)]):
+                return  # Duplicate
+            await self.check_alerts(sensor, float(value))
+
+        except json.JSONDecodeError:
+            print(f"Failed to decode JSON message: {raw_payload}")
+        except SensorDeleted:
+            return
+        except Exception as e:
+            print(f"Error processing message: {e}")
+
+    async def consume_mqtt(self):
+        """Subscribe to MQTT_TOPIC with aiomqtt and ingest messages concurrently, reconnecting on errors"""
+        import aiomqtt
+
+        pending = set()
+        while True:
+            try:
+                async with aiomqtt.Client(
+                    self.config['MQTT_BROKER_HOST'],
+                    self.config['MQTT_BROKER_PORT'],
+                    username=self.config.get('MQTT_USERNAME') or None,
+                    password=self.config.get('MQTT_PASSWORD') or None,
+                    identifier='iot_platform_async_ingest'
+                ) as client:
+                    await client.subscribe(self.config['MQTT_TOPIC'])
+                    print(f"Subscribed to topic: {self.config['MQTT_TOPIC']}")
+                    async for message in client.messages:
+                        task = asyncio.create_task(self.handle_mqtt_message(message.payload))
+                        pending.add(task)
+                        task.add_done_callback(pending.discard)
+            except aiomqtt.MqttError as e:
+                print(f"MQTT connection lost ({e}), reconnecting in 5 seconds")
+                await asyncio.sleep(5)
@@ -0,0 +1,260 @@
+import atexit
+import threading
+from datetime import datetime, timedelta
+from app.models import db, SensorDataBlock
+from app.models.routing import use_bind, INGEST_BIND
+from app.services.sensor_service import writable_sensor_ids
+from app.utils.encryption import EncryptionService
+from app.utils.timeseries_codec import encode_block, decode_block
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_millis(timestamp):
+    return (timestamp - EPOCH) // timedelta(milliseconds=1)
+
+
+def from_millis(millis):
+    return EPOCH + timedelta(milliseconds=millis)
+
+
+class HotBlock:
+    """In-memory block absorbing new points until it is sealed"""
+    __slots__ = ('window_start', 'unit', 'points')
+
+    def __init__(self, window_start, unit):
+        self.window_start = window_start
+        self.unit = unit
+        self.points = []
+
+
+class BlockStorageService:
+    """
+    Block storage mode (STORAGE_MODE=block)
+
+    New readings go to a per-sensor hot buffer. A block is sealed when its
+    time window (BLOCK_DURATION) ends or it reaches BLOCK_MAX_POINTS: the
+    points are compressed (delta-of-delta timestamps, XOR values), encrypted
+    once and written as a single sensor_data_blocks row. Hot buffers live in
+    the process memory, so at most one unsealed window per sensor is lost on
+    a crash; they are sealed on shutdown.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.encryption_service = None
+        self.buffers = {}  # sensor_id -> HotBlock
+        self.failed = []  # (sensor_id, HotBlock) to retry
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stop_event = threading.Event()
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize block storage with Flask app"""
+        self.app = app
+        self.encryption_service = EncryptionService.from_config(app.config)
+        app.extensions['block_storage'] = self
+
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config.get('STORAGE_MODE') == 'block'
+
+    def start(self):
+        """Seal expired hot blocks every BLOCK_FLUSH_INTERVAL seconds"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._loop, name='block-sealer', daemon=True)
+        self.thread.start()
+        atexit.register(self.seal_all)
+        print("Block storage mode enabled")
+
+    def _loop(self):
+        while not self.stop_event.wait(self.app.config['BLOCK_FLUSH_INTERVAL']):
+            try:
+                self.seal_expired()
+            except Exception as e:
+                print(f"Error sealing blocks: {e}")
+
+    def _window_start(self, timestamp):
+        duration_ms = self.app.config['BLOCK_DURATION'] * 1000
+        return from_millis(to_millis(timestamp) // duration_ms * duration_ms)
+
+    def append(self, sensor_id, timestamp, value, unit):
+        """Add a point to the sensor's hot block, sealing the previous one if needed"""
+        window_start = self._window_start(timestamp)
+        sealed = None
+
+        with self.lock:
+            hot = self.buffers.get(sensor_id)
+            if hot and (hot.window_start != window_start
+                        or len(hot.points) >= self.app.config['BLOCK_MAX_POINTS']):
+                sealed = self.buffers.pop(sensor_id)
+                hot = None
+            if hot is None:
+                hot = self.buffers[sensor_id] = HotBlock(window_start, unit)
+            hot.points.append((to_millis(timestamp), float(value)))
+
+        if sealed:
+            self._write_blocks([(sensor_id, sealed)])
+
+    def seal_expired(self):
+        """Seal hot blocks whose time window is over"""
+        now = datetime.utcnow()
+        duration = timedelta(seconds=self.app.config['BLOCK_DURATION'])
+        with self.lock:
+            expired = [(sensor_id, hot) for sensor_id, hot in self.buffers.items()
+                       if hot.window_start + duration <= now]
+            for sensor_id, _ in expired:
+                del self.buffers[sensor_id]
+            expired += self.failed
+            self.failed = []
+        if expired:
+            with self.app.app_context(), use_bind(INGEST_BIND):
+                self._write_blocks(expired)
+                db.session.remove()
+
+    def seal_all(self):
+        """Seal every hot block (shutdown)"""
+        with self.lock:
+            pending = list(self.buffers.items()) + self.failed
+            self.buffers = {}
+            self.failed = []
+        if pending:
+            with self.app.app_context(), use_bind(INGEST_BIND):
+                self._write_blocks(pending)
+                db.session.remove()
+
+    def discard(self, sensor_id):
+        """Drop the unsealed points of a sensor (sensor deletion)"""
+        with self.lock:
+            self.buffers.pop(sensor_id, None)
+            self.failed = [(sid, hot) for sid, hot in self.failed if sid != sensor_id]
+
+    def _write_blocks(self, hot_blocks):
+        """
+        Compress, encrypt once per block and store
+
+        Blocks of sensors missing or being deleted (purged from any process)
+        are dropped. When the single commit fails, blocks are written sensor
+        by sensor, so one failing sensor only delays its own blocks.
+        """
+        by_sensor = {}
+        for sensor_id, hot in hot_blocks:
+            by_sensor.setdefault(sensor_id, []).append(hot)
+        try:
+            writable = writable_sensor_ids(by_sensor)
+            for sensor_id in writable:
+                self._add_blocks(sensor_id, by_sensor[sensor_id])
+            db.session.commit()
+            return
+        except Exception as e:
+            db.session.rollback()
+            if len(by_sensor) == 1:
+                print(f"Failed to write sensor data blocks, will retry: {e}")
+                with self.lock:
+                    self.failed.extend(hot_blocks)
+                return
+            print(f"Failed to write sensor data blocks, retrying sensor by sensor: {e}")
+
+        for sensor_id, hots in by_sensor.items():
+            try:
+                if writable_sensor_ids([sensor_id]):
+                    self._add_blocks(sensor_id, hots)
+                    db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Failed to write the blocks of sensor {sensor_id}, will retry: {e}")
+                with self.lock:
+                    self.failed.extend((sensor_id, hot) for hot in hots)
+
+    def _add_blocks(self, sensor_id, hot_blocks):
+        for hot in hot_blocks:
+            points = sorted(hot.points)
+            db.session.add(SensorDataBlock(
+                sensor_id=sensor_id,
+                start_time=from_millis(points[0][0]),
+                end_time=from_millis(points[-1][0]),
+                count=len(points),
+                unit=hot.unit,
+                encrypted_payload=self.encryption_service.encrypt(encode_block(points))
+            ))
+
+    def decode(self, block):
+        """Decrypt and decompress a block into [(timestamp, value), ...]"""
+        points = decode_block(self.encryption_service.decrypt_bytes(block.encrypted_payload))
+        return [(from_millis(ts), value) for ts, value in points]
+
+    def hot_points(self, sensor_id=None, start=None, end=None):
+        """Unsealed points as [(sensor_id, timestamp, value, unit), ...]"""
+        with self.lock:
+            buffers = [(sid, hot.unit, list(hot.points)) for sid, hot in self.buffers.items()
+                       if sensor_id is None or sid == sensor_id]
+        points = []
+        for sid, unit, hot_points in buffers:
+            for ts, value in hot_points:
+                timestamp = from_millis(ts)
+                if (start is None or timestamp >= start) and (end is None or timestamp <= end):
+                    points.append((sid, timestamp, value, unit))
+        return points
+
+    def contains(self, sensor_id, timestamp):
+        """Whether a hot or sealed block of the sensor holds a point at this timestamp (millisecond precision)"""
+        millis = to_millis(timestamp)
+        with self.lock:
+            hot_blocks = [hot for sid, hot in self.failed if sid == sensor_id]
+            if sensor_id in self.buffers:
+                hot_blocks.append(self.buffers[sensor_id])
+            if any(ts == millis for hot in hot_blocks for ts, _ in hot.points):
+                return True
+
+        point_time = from_millis(millis)
+        blocks = SensorDataBlock.query.filter(
+            SensorDataBlock.sensor_id == sensor_id,
+            SensorDataBlock.start_time <= point_time,
+            SensorDataBlock.end_time >= point_time
+        )
+        for block in blocks:
+            try:
+                if any(ts == point_time for ts, _ in self.decode(block)):
+                    return True
+            except Exception as e:
+                print(f"Failed to decrypt sensor data block {block.id}: {e}")
+        return False
+
+    def read(self, sensor_id=None, start=None, end=None, limit=None):
+        """
+        Newest-first points of sealed and hot blocks overlapping the range
+
+        Only blocks overlapping [start, end] are decrypted; with a limit,
+        decoding stops once older blocks cannot contribute.
+        """
+        points = self.hot_points(sensor_id, start, end)
+
+        query = SensorDataBlock.query
+        if sensor_id:
+            query = query.filter_by(sensor_id=sensor_id)
+        if start:
+            query = query.filter(SensorDataBlock.end_time >= start)
+        if end:
+            query = query.filter(SensorDataBlock.start_time <= end)
+
+        for block in query.order_by(SensorDataBlock.end_time.desc()).yield_per(100):
+            if limit and len(points) >= limit:
+                points.sort(key=lambda point: point[1], reverse=True)
+                if block.end_time < points[limit - 1][1]:
+                    break
+            try:
+                decoded = self.decode(block)
+            except Exception as e:
+                print(f"Failed to decrypt sensor data block {block.id}: {e}")
+                continue
+            for timestamp, value in decoded:
+                if (start is None or timestamp >= start) and (end is None or timestamp <= end):
+                    points.append((block.sensor_id, timestamp, value, block.unit))
+
+        points.sort(key=lambda point: point[1], reverse=True)
+        return points[:limit] if limit else points
@@ -0,0 +1,224 @@
+import atexit
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import update, bindparam
+from app.models import db, Sensor, SensorCacheVersion
+from app.models.routing import use_bind, INGEST_BIND
+from app.services.sensor_service import UPSERT_INSERTS
+
+# Sensor IDs per IN (...) query of a sync
+SYNC_CHUNK_SIZE = 1000
+
+
+class ResultCache:
+    """
+    Bounded LRU cache of read results (statistics, history, quantiles)
+
+    Entries are keyed by (endpoint, sensors, range, parameters) and hold
+    the version counters of their sensors, bumped by the ingest path for
+    every reading:
+
+    - windows ending before now - RESULT_CACHE_CLOSED_GRACE are closed:
+      cached until evicted (or RESULT_CACHE_CLOSED_TTL), only invalidated
+      by a reading timestamped that far in the past (backfill);
+    - windows touching now are invalidated by any new reading of their
+      sensors and expire after RESULT_CACHE_TTL seconds.
+
+    A process's own bumps invalidate its entries at once. They are also
+    added to the shared counters of sensor_cache_versions every
+    RESULT_CACHE_SYNC_INTERVAL seconds, and the counters of the cached
+    sensors read back: writes by other processes (other workers, MQTT
+    listener, async ingest server, purge and compaction jobs) reach every
+    cache within about two sync intervals.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.entries = OrderedDict()  # key -> (value, sensor_ids, versions, closed, expires_at)
+        self.versions = {}  # sensor_id -> number of readings ingested by this process
+        self.backfills = {}  # sensor_id -> number of readings older than the closed grace
+        self.shared = {}  # sensor_id -> (version, backfill) of sensor_cache_versions at the last sync
+        self.pending = {}  # sensor_id -> [version, backfill] increments not yet written
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0, 'expirations': 0}
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stop_event = threading.Event()
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize result cache with Flask app"""
+        self.app = app
+        app.extensions['result_cache'] = self
+
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config.get('RESULT_CACHE_SIZE', 0) > 0
+
+    def start(self):
+        """Start the thread sharing the invalidation counters"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._loop, name='result-cache-sync', daemon=True)
+        self.thread.start()
+        atexit.register(self.sync)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _loop(self):
+        while not self.stop_event.wait(self.app.config['RESULT_CACHE_SYNC_INTERVAL']):
+            self.sync()
+
+    def closed_before(self):
+        """Windows ending before this time are closed"""
+        return datetime.utcnow() - timedelta(seconds=self.app.config['RESULT_CACHE_CLOSED_GRACE'])
+
+    def bump(self, sensor_id, timestamp=None):
+        """Invalidate the open windows of a sensor (and its closed ones for a backdated reading)"""
+        backfill = timestamp is not None and timestamp < self.closed_before()
+        with self.lock:
+            self._bump(sensor_id, backfill)
+
+    def _bump(self, sensor_id, backfill):
+        """Count a change locally and for the next sync (caller holds the lock)"""
+        pending = self.pending.setdefault(sensor_id, [0, 0])
+        self.versions[sensor_id] = self.versions.get(sensor_id, 0) + 1
+        pending[0] += 1
+        if backfill:
+            self.backfills[sensor_id] = self.backfills.get(sensor_id, 0) + 1
+            pending[1] += 1
+
+    def _snapshot(self, sensor_ids, closed):
+        counters = self.backfills if closed else self.versions
+        index = 1 if closed else 0
+        return tuple((self.shared.get(sensor_id, (0, 0))[index], counters.get(sensor_id, 0))
+                     for sensor_id in sensor_ids)
+
+    def get_or_compute(self, key, sensor_ids, end, compute):
+        """
+        Cached result of compute() for this key
+
+        sensor_ids are the sensors the result depends on, end the end of
+        its window (None: until now).
+        """
+        if not self.enabled:
+            return compute()
+
+        closed = end is not None and end < self.closed_before()
+        now = time.monotonic()
+        with self.lock:
+            # Taken before computing: a reading ingested meanwhile invalidates the result
+            versions = self._snapshot(sensor_ids, closed)
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, _, entry_versions, entry_closed, expires_at = entry
+                if entry_versions != self._snapshot(sensor_ids, entry_closed):
+                    self.stats['invalidations'] += 1
+                    del self.entries[key]
+                elif expires_at is not None and expires_at <= now:
+                    self.stats['expirations'] += 1
+                    del self.entries[key]
+                else:
+                    self.entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return value
+            self.stats['misses'] += 1
+
+        value = compute()
+
+        ttl = self.app.config['RESULT_CACHE_CLOSED_TTL'] if closed else self.app.config['RESULT_CACHE_TTL']
+        with self.lock:
+            self.entries[key] = (value, sensor_ids, versions, closed, now + ttl if ttl else None)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.app.config['RESULT_CACHE_SIZE']:
+                self.entries.popitem(last=False)
+                self.stats['evictions'] += 1
+        return value
+
+    def discard(self, sensor_id):
+        """Invalidate every window of a sensor (deletion, compaction, backfill)"""
+        if not self.enabled:
+            return
+        with self.lock:
+            self._bump(sensor_id, True)
+
+    def sync(self):
+        """Add this process's bumps to sensor_cache_versions and read back the cached sensors' counters"""
+        if not self.enabled:
+            return
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            cached = {sensor_id for entry in self.entries.values() for sensor_id in entry[1]}
+
+        shared = {}
+        with self.app.app_context(), use_bind(INGEST_BIND):
+            try:
+                if pending:
+                    self._write(pending)
+                    db.session.commit()
+                cached = sorted(cached)
+                for start in range(0, len(cached), SYNC_CHUNK_SIZE):
+                    rows = db.session.query(
+                        SensorCacheVersion.sensor_id, SensorCacheVersion.version, SensorCacheVersion.backfill
+                    ).filter(SensorCacheVersion.sensor_id.in_(cached[start:start + SYNC_CHUNK_SIZE]))
+                    shared.update((row.sensor_id, (row.version, row.backfill)) for row in rows)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Failed to sync result cache versions, will retry: {e}")
+                with self.lock:
+                    for sensor_id, (version, backfill) in pending.items():
+                        counts = self.pending.setdefault(sensor_id, [0, 0])
+                        counts[0] += version
+                        counts[1] += backfill
+                return
+            finally:
+                db.session.remove()
+
+        with self.lock:
+            self.shared = shared
+
+    def _write(self, pending):
+        """Increment the shared counters (rows created for sensors that have none)"""
+        sensor_ids = sorted(pending)
+        known = set()
+        for start in range(0, len(sensor_ids), SYNC_CHUNK_SIZE):
+            chunk = sensor_ids[start:start + SYNC_CHUNK_SIZE]
+            known.update(row.sensor_id for row in db.session.query(SensorCacheVersion.sensor_id)
+                         .filter(SensorCacheVersion.sensor_id.in_(chunk)))
+            missing = [sensor_id for sensor_id in chunk if sensor_id not in known]
+            if missing:
+                # Deleted sensors have no row to create
+                missing = [row.id for row in db.session.query(Sensor.id).filter(Sensor.id.in_(missing))]
+            if missing:
+                dialect = db.session.get_bind(mapper=SensorCacheVersion).dialect.name
+                rows = [{'sensor_id': sensor_id, 'version': 0, 'backfill': 0} for sensor_id in missing]
+                if dialect in UPSERT_INSERTS:
+                    statement = UPSERT_INSERTS[dialect](SensorCacheVersion.__table__).on_conflict_do_nothing()
+                else:
+                    statement = SensorCacheVersion.__table__.insert()
+                db.session.execute(statement, rows)
+                known.update(missing)
+
+        increments = [{'sid': sensor_id, 'dv': version, 'db': backfill}
+                      for sensor_id, (version, backfill) in pending.items() if sensor_id in known]
+        if not increments:
+            return
+        table = SensorCacheVersion.__table__
+        db.session.execute(
+            update(table).where(table.c.sensor_id == bindparam('sid')).values(
+                version=table.c.version + bindparam('dv'),
+                backfill=table.c.backfill + bindparam('db'),
+                updated_at=datetime.utcnow()
+            ),
+            increments
+        )
+
+    def metrics(self):
+        """Hit / miss / eviction counters and size"""
+        with self.lock:
+            return dict(self.stats, size=len(self.entries), max_size=self.app.config['RESULT_CACHE_SIZE'])
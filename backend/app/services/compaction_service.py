@@ -0,0 +1,298 @@
+import json
+from datetime import datetime, timedelta
+from app.models import db, Sensor, SensorData, SensorDataRollup, SensorDataBlock
+from app.utils.encryption import EncryptionService
+from app.services.job_service import job_handler
+from app.services.query_service import reading_number
+
+# Rollup resolutions, finest first
+RESOLUTIONS = {
+    '1m': timedelta(minutes=1),
+    '1h': timedelta(hours=1)
+}
+
+
+def bucket_start(timestamp, resolution):
+    """Start of the bucket containing `timestamp`"""
+    if resolution == '1m':
+        return timestamp.replace(second=0, microsecond=0)
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def retention_policy(config, sensor_type):
+    """(raw_days, minute_days) for a sensor type"""
+    policy = config.get('RETENTION_POLICIES', {}).get(sensor_type, {})
+    return (
+        policy.get('raw_days', config['RETENTION_RAW_DAYS']),
+        policy.get('minute_days', config['RETENTION_MINUTE_DAYS'])
+    )
+
+
+def tier_cutoffs(config, sensor_type=None, now=None):
+    """
+    (raw_cutoff, minute_cutoff) datetimes for a sensor type
+
+    Readings older than raw_cutoff live in 1m rollups, older than
+    minute_cutoff in 1h rollups. Without a type, the most aggressive
+    policy is used so no tier is ever skipped by mistake.
+    """
+    now = now or datetime.utcnow()
+    if sensor_type is not None:
+        raw_days, minute_days = retention_policy(config, sensor_type)
+    else:
+        policies = [retention_policy(config, t) for t in config.get('RETENTION_POLICIES', {})]
+        policies.append(retention_policy(config, None))
+        raw_days = min(p[0] for p in policies)
+        minute_days = min(p[0] + p[1] for p in policies) - raw_days
+
+    raw_cutoff = bucket_start(now - timedelta(days=raw_days), '1m')
+    minute_cutoff = bucket_start(raw_cutoff - timedelta(days=minute_days), '1h')
+    return raw_cutoff, minute_cutoff
+
+
+def merge_stats(a, b):
+    """Merge two {count, sum, min, max} aggregates"""
+    if not a or not a['count']:
+        return b
+    if not b or not b['count']:
+        return a
+    return {
+        'count': a['count'] + b['count'],
+        'sum': a['sum'] + b['sum'],
+        'min': min(a['min'], b['min']),
+        'max': max(a['max'], b['max'])
+    }
+
+
+class CompactionService:
+    """Compacts raw readings into 1-minute then hourly rollups (run as a `compaction` job)"""
+
+    def __init__(self, app=None):
+        self.app = app
+        self.encryption_service = None
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize compaction service with Flask app"""
+        self.app = app
+        self.encryption_service = EncryptionService.from_config(app.config)
+        app.extensions['compaction'] = self
+
+    def run_once(self, job=None):
+        """
+        Compact every sensor once; returns the number of rows removed per tier
+
+        Within a job, progress is reported and checkpointed after each sensor
+        so an interrupted run resumes with the next one.
+        """
+        checkpoint = (job.checkpoint if job else None) or {}
+        totals = checkpoint.get('totals', {'raw': 0, 'blocks': 0, '1m': 0})
+        sensors = db.session.query(Sensor.id, Sensor.type).filter(
+            Sensor.status != 'deleting',
+            Sensor.id > checkpoint.get('sensor_id', 0)
+        ).order_by(Sensor.id).all()
+        for index, (sensor_id, sensor_type) in enumerate(sensors, 1):
+            raw_cutoff, minute_cutoff = tier_cutoffs(self.app.config, sensor_type)
+            compacted = {
+                'raw': self.compact_raw(sensor_id, raw_cutoff),
+                'blocks': self.compact_blocks(sensor_id, raw_cutoff),
+                '1m': self.compact_rollups(sensor_id, '1m', '1h', minute_cutoff)
+            }
+            if any(compacted.values()):
+                # Cached history of the compacted windows changes resolution
+                self.app.extensions['result_cache'].discard(sensor_id)
+            for tier, count in compacted.items():
+                totals[tier] += count
+            if job:
+                job.update(progress=100.0 * index / len(sensors),
+                           checkpoint={'sensor_id': sensor_id, 'totals': totals})
+
+        if any(totals.values()):
+            print(f"Compaction done: {totals['raw']} raw readings, {totals['blocks']} blocks, "
+                  f"{totals['1m']} minute rollups compacted")
+        return totals
+
+    def compact_raw(self, sensor_id, cutoff):
+        """Fold raw readings older than `cutoff` into 1m rollups, chunk by chunk"""
+        chunk_size = self.app.config['COMPACTION_CHUNK_SIZE']
+        compacted = 0
+        last_id = 0
+
+        while True:
+            rows = db.session.query(
+                SensorData.id, SensorData.encrypted_value, SensorData.value, SensorData.unit, SensorData.timestamp
+            ).filter(
+                SensorData.sensor_id == sensor_id,
+                SensorData.timestamp < cutoff,
+                SensorData.id > last_id
+            ).order_by(SensorData.id).limit(chunk_size).all()
+
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            buckets = {}
+            units = {}
+            done_ids = []
+            for row in rows:
+                try:
+                    value = reading_number(self.encryption_service, row)
+                except Exception as e:
+                    # Keep undecryptable readings rather than losing them
+                    print(f"Failed to decrypt sensor data {row.id} during compaction: {e}")
+                    continue
+                key = bucket_start(row.timestamp, '1m')
+                buckets[key] = merge_stats(buckets.get(key), {'count': 1, 'sum': value, 'min': value, 'max': value})
+                units[key] = row.unit
+                done_ids.append((row.id, key))
+
+            skipped = self._upsert_rollups(sensor_id, '1m', buckets, units)
+            done_ids = [row_id for row_id, key in done_ids if key not in skipped]
+            if done_ids:
+                db.session.query(SensorData).filter(SensorData.id.in_(done_ids))\
+                    .delete(synchronize_session=False)
+            db.session.commit()
+            compacted += len(done_ids)
+
+        return compacted
+
+    def compact_blocks(self, sensor_id, cutoff):
+        """Fold compressed blocks ending before `cutoff` into 1m rollups"""
+        block_storage = self.app.extensions['block_storage']
+        chunk_size = max(1, self.app.config['COMPACTION_CHUNK_SIZE'] // self.app.config['BLOCK_MAX_POINTS'])
+        compacted = 0
+        last_id = 0
+
+        while True:
+            blocks = SensorDataBlock.query.filter(
+                SensorDataBlock.sensor_id == sensor_id,
+                SensorDataBlock.end_time < cutoff,
+                SensorDataBlock.id > last_id
+            ).order_by(SensorDataBlock.id).limit(chunk_size).all()
+
+            if not blocks:
+                break
+            last_id = blocks[-1].id
+
+            buckets = {}
+            units = {}
+            done_ids = []
+            for block in blocks:
+                try:
+                    points = block_storage.decode(block)
+                except Exception as e:
+                    print(f"Failed to decrypt sensor data block {block.id} during compaction: {e}")
+                    continue
+                keys = set()
+                for timestamp, value in points:
+                    key = bucket_start(timestamp, '1m')
+                    buckets[key] = merge_stats(buckets.get(key), {'count': 1, 'sum': value, 'min': value, 'max': value})
+                    units[key] = block.unit
+                    keys.add(key)
+                done_ids.append((block.id, keys))
+
+            skipped = self._upsert_rollups(sensor_id, '1m', buckets, units)
+            done_ids = [block_id for block_id, keys in done_ids if not keys & skipped]
+            if done_ids:
+                db.session.query(SensorDataBlock).filter(SensorDataBlock.id.in_(done_ids))\
+                    .delete(synchronize_session=False)
+            db.session.commit()
+            compacted += len(done_ids)
+
+        return compacted
+
+    def compact_rollups(self, sensor_id, source, target, cutoff):
+        """Fold `source` rollups older than `cutoff` into `target` rollups"""
+        chunk_size = self.app.config['COMPACTION_CHUNK_SIZE']
+        compacted = 0
+        last_id = 0
+
+        while True:
+            rollups = SensorDataRollup.query.filter(
+                SensorDataRollup.sensor_id == sensor_id,
+                SensorDataRollup.resolution == source,
+                SensorDataRollup.bucket_start < cutoff,
+                SensorDataRollup.id > last_id
+            ).order_by(SensorDataRollup.id).limit(chunk_size).all()
+
+            if not rollups:
+                break
+            last_id = rollups[-1].id
+
+            buckets = {}
+            units = {}
+            done_ids = []
+            for rollup in rollups:
+                try:
+                    stats = self.decrypt_stats(rollup)
+                except Exception as e:
+                    # Keep undecryptable rollups rather than losing them
+                    print(f"Failed to decrypt sensor data rollup {rollup.id} during compaction: {e}")
+                    continue
+                key = bucket_start(rollup.bucket_start, target)
+                buckets[key] = merge_stats(buckets.get(key), stats)
+                units[key] = rollup.unit
+                done_ids.append((rollup.id, key))
+
+            skipped = self._upsert_rollups(sensor_id, target, buckets, units)
+            done_ids = [rollup_id for rollup_id, key in done_ids if key not in skipped]
+            if done_ids:
+                db.session.query(SensorDataRollup).filter(SensorDataRollup.id.in_(done_ids))\
+                    .delete(synchronize_session=False)
+            db.session.commit()
+            compacted += len(done_ids)
+
+        return compacted
+
+    def _upsert_rollups(self, sensor_id, resolution, buckets, units):
+        """
+        Merge aggregates into existing rollup rows (mergeable count/sum/min/max)
+
+        Returns the buckets left untouched because their existing rollup
+        could not be decrypted; their sources must be kept.
+        """
+        skipped = set()
+        if not buckets:
+            return skipped
+        existing = {
+            rollup.bucket_start: rollup
+            for rollup in SensorDataRollup.query.filter(
+                SensorDataRollup.sensor_id == sensor_id,
+                SensorDataRollup.resolution == resolution,
+                SensorDataRollup.bucket_start.in_(list(buckets))
+            )
+        }
+        for key, stats in buckets.items():
+            rollup = existing.get(key)
+            if rollup:
+                try:
+                    stats = merge_stats(self.decrypt_stats(rollup), stats)
+                except Exception as e:
+                    print(f"Failed to decrypt sensor data rollup {rollup.id} during compaction: {e}")
+                    skipped.add(key)
+                    continue
+            else:
+                rollup = SensorDataRollup(sensor_id=sensor_id, resolution=resolution,
+                                          bucket_start=key, unit=units.get(key))
+                db.session.add(rollup)
+            rollup.count = stats['count']
+            rollup.encrypted_stats = self.encrypt_stats(stats)
+        return skipped
+
+    def encrypt_stats(self, stats):
+        return self.encryption_service.encrypt(json.dumps({
+            'sum': stats['sum'], 'min': stats['min'], 'max': stats['max']
+        }))
+
+    def decrypt_stats(self, rollup):
+        stats = json.loads(self.encryption_service.decrypt(rollup.encrypted_stats))
+        stats['count'] = rollup.count
+        return stats
+
+
+@job_handler('compaction')
+def run_compaction(job):
+    """Job: one compaction pass over every sensor (scheduled every COMPACTION_INTERVAL)"""
+    return job.app.extensions['compaction'].run_once(job)
@@ -0,0 +1,83 @@
+import threading
+from app.utils.bloom import RotatingBloomFilter
+
+# Longest message ID a reading may carry
+MESSAGE_ID_MAX_LENGTH = 64
+
+
+def parse_message_id(value):
+    """Message ID of a reading as a string, or None; raises ValueError when invalid"""
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (str, int)):
+        raise ValueError('message_id must be a string or an integer')
+    value = str(value)
+    if not value or len(value) > MESSAGE_ID_MAX_LENGTH:
+        raise ValueError(f"message_id must be 1 to {MESSAGE_ID_MAX_LENGTH} characters")
+    return value
+
+
+class DedupService:
+    """
+    Duplicate suppression for readings carrying a device timestamp or a
+    message ID (MQTT redelivery, gateway retries, backfills)
+
+    Their keys go through a Bloom filter rotated every DEDUP_WINDOW
+    seconds: a new reading is "definitely not seen" without any query,
+    only the rare "maybe seen" ones are confirmed by the ingest path. The
+    unique (sensor_id, device_timestamp) and (sensor_id, message_id)
+    constraints of sensor_data catch what the filter of one process cannot
+    see (other processes, readings older than the window).
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.filter = None
+        self.stats = {'checked': 0, 'maybe_duplicates': 0, 'duplicates': 0}
+        self.lock = threading.Lock()
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize dedup service with Flask app"""
+        self.app = app
+        self.filter = RotatingBloomFilter(app.config['DEDUP_CAPACITY'], app.config['DEDUP_ERROR_RATE'],
+                                          app.config['DEDUP_WINDOW'])
+        app.extensions['dedup'] = self
+
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config.get('DEDUP_ENABLED', True)
+
+    @staticmethod
+    def keys(sensor_id, timestamp, message_id):
+        """Filter keys of a reading (none when it carries no device timestamp or message ID)"""
+        keys = []
+        if timestamp is not None:
+            keys.append(f"{sensor_id}:t:{timestamp.isoformat()}")
+        if message_id is not None:
+            keys.append(f"{sensor_id}:m:{message_id}")
+        return keys
+
+    def maybe_seen(self, sensor_id, timestamp, message_id):
+        """True when the reading may be a duplicate (to be confirmed); remembers it either way"""
+        keys = self.keys(sensor_id, timestamp, message_id)
+        if not keys:
+            return False
+        with self.lock:
+            self.stats['checked'] += 1
+            seen = self.filter.check_and_add(keys)
+            if seen:
+                self.stats['maybe_duplicates'] += 1
+        return seen
+
+    def duplicate(self):
+        """Count a confirmed duplicate"""
+        with self.lock:
+            self.stats['duplicates'] += 1
+
+    def metrics(self):
+        """Checked / maybe duplicate / duplicate counters"""
+        with self.lock:
+            return dict(self.stats)
@@ -0,0 +1,177 @@
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+from flask import current_app, g, jsonify, request
+from flask_jwt_extended import verify_jwt_in_request
+from app.models import db, DeviceKey
+
+API_KEY_HEADER = 'X-API-Key'
+KEY_PREFIX = 'dk'
+
+
+def parse_api_key(api_key):
+    """(key_id, secret) of a dk_<key_id>_<secret> key, or None when malformed"""
+    prefix, _, rest = (api_key or '').partition('_')
+    key_id, _, secret = rest.partition('_')
+    if prefix != KEY_PREFIX or not key_id or not secret:
+        return None
+    return key_id, secret
+
+
+def hash_secret(hmac_key, secret):
+    """Stored form of a key secret: HMAC-SHA256 keyed with DEVICE_KEY_SECRET"""
+    return hmac.new(hmac_key.encode('utf-8'), secret.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+class KeyCache:
+    """
+    Bounded LRU caches of key lookups: key_id -> (key_hash or None, DeviceKey id, sensor_id, expires_at)
+
+    Valid keys are kept DEVICE_KEY_CACHE_TTL seconds, at most
+    DEVICE_KEY_CACHE_SIZE of them. Unknown and revoked keys go to a
+    separate, smaller cache (DEVICE_KEY_NEGATIVE_CACHE_SIZE entries for
+    DEVICE_KEY_NEGATIVE_TTL seconds): random X-API-Key values neither grow
+    memory nor evict the keys of real devices.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.valid = OrderedDict()
+        self.negative = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key_id):
+        """Cached entry of a key, or None when unknown or expired"""
+        now = time.monotonic()
+        with self.lock:
+            for entries in (self.valid, self.negative):
+                entry = entries.get(key_id)
+                if entry is None:
+                    continue
+                if entry[3] <= now:
+                    del entries[key_id]
+                    return None
+                entries.move_to_end(key_id)
+                return entry
+        return None
+
+    def put(self, key_id, key_hash=None, device_key_id=None, sensor_id=None):
+        """Cache a lookup (key_hash None: unknown or revoked key); returns the entry"""
+        if key_hash is None:
+            entries, ttl, max_size = self.negative, 'DEVICE_KEY_NEGATIVE_TTL', 'DEVICE_KEY_NEGATIVE_CACHE_SIZE'
+        else:
+            entries, ttl, max_size = self.valid, 'DEVICE_KEY_CACHE_TTL', 'DEVICE_KEY_CACHE_SIZE'
+        entry = (key_hash, device_key_id, sensor_id, time.monotonic() + self.config[ttl])
+        with self.lock:
+            self.valid.pop(key_id, None)
+            self.negative.pop(key_id, None)
+            entries[key_id] = entry
+            while len(entries) > self.config[max_size]:
+                entries.popitem(last=False)
+        return entry
+
+    def pop(self, key_id):
+        with self.lock:
+            self.valid.pop(key_id, None)
+            self.negative.pop(key_id, None)
+
+
+class DeviceKeyService:
+    """
+    API keys of devices and gateways for HTTP ingestion
+
+    Keys look like dk_<key_id>_<secret>; only an HMAC-SHA256 of the secret
+    (keyed with DEVICE_KEY_SECRET) is stored. Verified keys are cached in
+    memory (KeyCache) for DEVICE_KEY_CACHE_TTL seconds, so a device posting
+    readings costs one HMAC and no database query. Revocation evicts the key from
+    this process' cache at once, and from other processes within the TTL.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.cache = None
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize device key service with Flask app"""
+        self.app = app
+        self.cache = KeyCache(app.config)
+        app.extensions['device_keys'] = self
+
+    def _hash(self, secret):
+        return hash_secret(self.app.config['DEVICE_KEY_SECRET'], secret)
+
+    def create(self, name, sensor_id=None, created_by=None):
+        """New key (committed); returns (DeviceKey, plaintext key shown once)"""
+        key_id = secrets.token_hex(8)
+        secret = secrets.token_urlsafe(32)
+        device_key = DeviceKey(key_id=key_id, key_hash=self._hash(secret), name=name,
+                               sensor_id=sensor_id, created_by=created_by)
+        db.session.add(device_key)
+        db.session.commit()
+        return device_key, f"{KEY_PREFIX}_{key_id}_{secret}"
+
+    def revoke(self, device_key):
+        """Revoke a key (committed) and evict it from the cache"""
+        if not device_key.revoked_at:
+            device_key.revoked_at = datetime.utcnow()
+            db.session.commit()
+        self.cache.pop(device_key.key_id)
+
+    def _lookup(self, key_id):
+        entry = self.cache.get(key_id)
+        if entry:
+            return entry
+
+        device_key = DeviceKey.query.filter_by(key_id=key_id).first()
+        if device_key and not device_key.revoked_at:
+            return self.cache.put(key_id, device_key.key_hash, device_key.id, device_key.sensor_id)
+        # Unknown and revoked keys are cached briefly too, so repeated attempts cannot hammer the database
+        return self.cache.put(key_id)
+
+    def verify(self, api_key):
+        """(DeviceKey id, sensor_id or None) of a valid key, else None"""
+        parsed = parse_api_key(api_key)
+        if parsed is None:
+            return None
+        key_id, secret = parsed
+
+        key_hash, device_key_id, sensor_id, _ = self._lookup(key_id)
+        if key_hash is None or not hmac.compare_digest(key_hash, self._hash(secret)):
+            return None
+        return device_key_id, sensor_id
+
+
+def device_key_or_jwt_required(fn):
+    """
+    Accept an X-API-Key device key or a user JWT
+
+    With a device key, g.device_key is set to (DeviceKey id, sensor_id);
+    the route must check that a sensor-scoped key only posts for its sensor
+    (device_key_allows).
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        g.device_key = None
+        api_key = request.headers.get(API_KEY_HEADER)
+        if api_key:
+            g.device_key = current_app.extensions['device_keys'].verify(api_key)
+            if g.device_key is None:
+                return jsonify({'error': 'Invalid API key'}), 401
+        else:
+            verify_jwt_in_request()
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def device_key_allows(sensor):
+    """Whether the request's device key (if any) may post readings for this sensor"""
+    device_key = g.get('device_key')
+    return device_key is None or device_key[1] is None or device_key[1] == sensor.id
@@ -0,0 +1,198 @@
+import atexit
+import json
+import math
+import threading
+from sqlalchemy.exc import IntegrityError
+from app.models import db, SensorGroupAggregate
+from app.models.routing import use_bind, INGEST_BIND
+from app.services.compaction_service import merge_stats
+from app.services.sketch_service import sketch_bucket
+from app.utils.encryption import EncryptionService
+
+
+class GroupAggregateService:
+    """
+    Hourly aggregates per (location, type) group, updated at ingest
+
+    Every reading is merged into an in-memory {count, sum, min, max} of
+    its sensor's group and hour; the buffers are merged into the
+    sensor_group_aggregates rows every GROUP_AGGREGATE_FLUSH_INTERVAL
+    seconds (and on shutdown). A site overview then reads one indexed
+    range of a few rows per group instead of every sensor's history.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.encryption_service = None
+        self.buffers = {}  # (location, type, bucket_start) -> [stats, unit]
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stop_event = threading.Event()
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize group aggregate service with Flask app"""
+        self.app = app
+        self.encryption_service = EncryptionService.from_config(app.config)
+        app.extensions['group_aggregates'] = self
+
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config.get('GROUP_AGGREGATE_ENABLED', True)
+
+    def start(self):
+        """Flush in-memory aggregates every GROUP_AGGREGATE_FLUSH_INTERVAL seconds"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._loop, name='group-aggregate-flush', daemon=True)
+        self.thread.start()
+        atexit.register(self.flush)
+
+    def _loop(self):
+        while not self.stop_event.wait(self.app.config['GROUP_AGGREGATE_FLUSH_INTERVAL']):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing group aggregates: {e}")
+
+    def add(self, sensor, timestamp, value, unit=None):
+        """Count a reading in its sensor's (location, type) hourly aggregate"""
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return
+        if not math.isfinite(value):
+            return
+        key = (sensor.location or '', sensor.type, sketch_bucket(timestamp))
+        with self.lock:
+            entry = self.buffers.get(key)
+            if entry is None:
+                self.buffers[key] = [{'count': 1, 'sum': value, 'min': value, 'max': value}, unit]
+                return
+            stats = entry[0]
+            stats['count'] += 1
+            stats['sum'] += value
+            if value < stats['min']:
+                stats['min'] = value
+            if value > stats['max']:
+                stats['max'] = value
+
+    def flush(self):
+        """Merge in-memory aggregates into the database"""
+        with self.lock:
+            pending, self.buffers = self.buffers, {}
+        if not pending:
+            return
+        with self.app.app_context(), use_bind(INGEST_BIND):
+            try:
+                self.merge_into_db(pending)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Failed to flush group aggregates, will retry: {e}")
+                with self.lock:
+                    for key, (stats, unit) in pending.items():
+                        entry = self.buffers.get(key)
+                        self.buffers[key] = [merge_stats(stats, entry[0]) if entry else stats, unit]
+            finally:
+                db.session.remove()
+
+    def merge_into_db(self, aggregates, attempts=3):
+        """Merge {(location, type, bucket_start): [stats, unit]} into stored aggregates"""
+        for attempt in range(attempts):
+            try:
+                for group in {key[:2] for key in aggregates}:
+                    buckets = [key[2] for key in aggregates if key[:2] == group]
+                    existing = {
+                        row.bucket_start: row
+                        for row in SensorGroupAggregate.query.filter(
+                            SensorGroupAggregate.location == group[0],
+                            SensorGroupAggregate.type == group[1],
+                            SensorGroupAggregate.bucket_start.in_(buckets)
+                        ).with_for_update()
+                    }
+                    for bucket in buckets:
+                        stats, unit = aggregates[(*group, bucket)]
+                        row = existing.get(bucket)
+                        if row:
+                            stats = merge_stats(self.decrypt(row), stats)
+                        else:
+                            row = SensorGroupAggregate(location=group[0], type=group[1], bucket_start=bucket, unit=unit)
+                            db.session.add(row)
+                        row.count = stats['count']
+                        row.encrypted_stats = self.encryption_service.encrypt(json.dumps(
+                            {'sum': stats['sum'], 'min': stats['min'], 'max': stats['max']}))
+                db.session.commit()
+                return
+            except IntegrityError:
+                # Another process created one of the buckets first: merge into it
+                db.session.rollback()
+                if attempt == attempts - 1:
+                    raise
+
+    def decrypt(self, row):
+        """{count, sum, min, max} of a stored aggregate"""
+        stats = json.loads(self.encryption_service.decrypt(row.encrypted_stats))
+        stats['count'] = row.count
+        return stats
+
+    def query(self, start, end, location=None, sensor_type=None, interval=None):
+        """
+        Aggregates of the groups matching the filters over [start, end)
+
+        Returns one {location, type, unit, count, avg, min, max} entry per
+        group; with an interval (a multiple of one hour), each entry also
+        gets `buckets`, one {start, count, avg, min, max} per interval with
+        data. Unflushed readings of this process are included.
+        """
+        start = sketch_bucket(start)
+        query = SensorGroupAggregate.query.filter(
+            SensorGroupAggregate.bucket_start >= start,
+            SensorGroupAggregate.bucket_start < end
+        )
+        if location is not None:
+            query = query.filter(SensorGroupAggregate.location == location)
+        if sensor_type:
+            query = query.filter(SensorGroupAggregate.type == sensor_type)
+
+        stored = []
+        for row in query:
+            try:
+                stored.append(((row.location, row.type, row.bucket_start), self.decrypt(row), row.unit))
+            except Exception as e:
+                print(f"Failed to decrypt group aggregate {row.id}: {e}")
+        with self.lock:
+            unflushed = [(key, dict(stats), unit) for key, (stats, unit) in self.buffers.items()
+                         if start <= key[2] < end
+                         and (location is None or key[0] == location)
+                         and (not sensor_type or key[1] == sensor_type)]
+
+        groups = {}
+        for (group_location, group_type, bucket), stats, unit in stored + unflushed:
+            group = groups.get((group_location, group_type))
+            if group is None:
+                group = groups[(group_location, group_type)] = {'stats': None, 'unit': unit, 'buckets': {}}
+            group['stats'] = merge_stats(group['stats'], stats)
+            if interval:
+                slot = start + (bucket - start) // interval * interval
+                group['buckets'][slot] = merge_stats(group['buckets'].get(slot), stats)
+
+        result = []
+        for (group_location, group_type), group in sorted(groups.items()):
+            entry = {'location': group_location, 'type': group_type, 'unit': group['unit'],
+                     **_summary(group['stats'])}
+            if interval:
+                entry['buckets'] = [{'start': slot, **_summary(stats)} for slot, stats in sorted(group['buckets'].items())]
+            result.append(entry)
+        return result
+
+
+def _summary(stats):
+    return {
+        'count': stats['count'],
+        'avg': stats['sum'] / stats['count'],
+        'min': stats['min'],
+        'max': stats['max']
+    }
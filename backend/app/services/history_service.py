@@ -0,0 +1,422 @@
+import json
+from flask import current_app
+from sqlalchemy import select, func, or_, and_
+from app.models import db, Sensor, SensorData, SensorDataRollup
+from app.services.compaction_service import tier_cutoffs, merge_stats
+from app.utils.encryption import EncryptionService
+from app.services.block_storage_service import to_millis
+from app.services.query_service import select_readings, stream_rows, stream_chunks, reading_value, reading_number, bucket_index
+from app.services.ingest_service import value_policy
+from app.utils.alignment import TimeGrid, align_origin
+
+
+def _sensor_type(sensor_id):
+    """Type of a sensor, None without a sensor (every sensor)"""
+    if not sensor_id:
+        return None
+    return db.session.query(Sensor.type).filter_by(id=sensor_id).scalar()
+
+
+def _rollup_tiers(sensor_type, start):
+    """Rollup resolutions a query starting at `start` may need to read"""
+    raw_cutoff, minute_cutoff = tier_cutoffs(current_app.config, sensor_type)
+
+    tiers = []
+    if start is None or start < raw_cutoff:
+        tiers.append('1m')
+    if start is None or start < minute_cutoff:
+        tiers.append('1h')
+    return tiers, raw_cutoff
+
+
+def _decrypt_rollup(encryption_service, rollup):
+    try:
+        return json.loads(encryption_service.decrypt(rollup.encrypted_stats))
+    except Exception as e:
+        print(f"Failed to decrypt rollup {rollup.id}: {e}")
+        return None
+
+
+def _block_point_dict(point):
+    """Reading dictionary for a block storage point"""
+    sensor_id, timestamp, value, unit = point
+    return {
+        'id': None,
+        'sensor_id': sensor_id,
+        'value': str(value),
+        'unit': unit,
+        'timestamp': timestamp
+    }
+
+
+def _history_rows(encryption_service, sensor_id, start, end, limit, min_value=None, max_value=None):
+    """
+    Newest-first (timestamp, kind, item, value) tuples for a range, from every tier
+
+    kind is 'raw' (item = reading row, value = string or None when it
+    cannot be decrypted), 'block' (item = block point, value = float) or
+    'rollup' (item = SensorDataRollup, value = decrypted stats or None).
+
+    With min_value / max_value, only readings (rollups: bucket averages)
+    within the bounds are returned: plain values are filtered by the
+    database, encrypted ones as they are decrypted. Raises ValueError once
+    VALUE_FILTER_MAX_SCAN encrypted readings and rollups were decrypted
+    without filling the page.
+    """
+    value_filter = min_value is not None or max_value is not None
+    max_scan = current_app.config['VALUE_FILTER_MAX_SCAN']
+    decrypted = 0
+
+    def matches(value):
+        return value is not None and (min_value is None or value >= min_value) \
+            and (max_value is None or value <= max_value)
+
+    def scanned():
+        nonlocal decrypted
+        decrypted += 1
+        if decrypted > max_scan:
+            raise ValueError(f"Value filter decrypted {max_scan} encrypted readings "
+                             f"without filling the page: narrow the date range")
+
+    sensor_type = _sensor_type(sensor_id)
+    statement = select_readings()
+    if sensor_id:
+        statement = statement.where(SensorData.sensor_id == sensor_id)
+    if start:
+        statement = statement.where(SensorData.timestamp >= start)
+    if end:
+        statement = statement.where(SensorData.timestamp <= end)
+    statement = statement.order_by(SensorData.timestamp.desc())
+
+    rows = []
+    if not value_filter:
+        # Decrypt sensor values as the rows are fetched
+        for record in stream_rows(statement.limit(limit)):
+            try:
+                rows.append((record.timestamp, 'raw', record, reading_value(encryption_service, record)))
+            except Exception as e:
+                print(f"Failed to decrypt sensor data {record.id}: {e}")
+                rows.append((record.timestamp, 'raw', record, None))
+    else:
+        encrypted = statement
+        if not sensor_id or value_policy(current_app.config, sensor_type) != 'encrypted':
+            # Plain values: WHERE value BETWEEN ... LIMIT in the database
+            plain = statement.where(SensorData.value.isnot(None))
+            if min_value is not None:
+                plain = plain.where(SensorData.value >= min_value)
+            if max_value is not None:
+                plain = plain.where(SensorData.value <= max_value)
+            for record in stream_rows(plain.limit(limit)):
+                rows.append((record.timestamp, 'raw', record, str(record.value)))
+            encrypted = statement.where(SensorData.value.is_(None))
+
+        # Encrypted values: decrypted and filtered until a page matches
+        matched = 0
+        for record in stream_rows(encrypted):
+            scanned()
+            try:
+                value = reading_value(encryption_service, record)
+            except Exception as e:
+                print(f"Failed to decrypt sensor data {record.id}: {e}")
+                continue
+            if matches(_to_float(value)):
+                rows.append((record.timestamp, 'raw', record, value))
+                matched += 1
+                if matched >= limit:
+                    break
+
+    # Sealed and hot blocks (block storage mode)
+    block_points = current_app.extensions['block_storage'].read(sensor_id, start, end, None if value_filter else limit)
+    for point in block_points:
+        if not value_filter or matches(point[2]):
+            rows.append((point[1], 'block', point, point[2]))
+
+    tiers, raw_cutoff = _rollup_tiers(sensor_type, start)
+
+    if block_points or value_filter:
+        rows.sort(key=lambda row: row[0], reverse=True)
+
+    # A full page of readings newer than the cutoff cannot be preceded by rollups
+    if len(rows) >= limit and rows[limit - 1][0] and rows[limit - 1][0] >= raw_cutoff:
+        tiers = []
+
+    for resolution in tiers:
+        rollup_query = SensorDataRollup.query.filter_by(resolution=resolution)
+        if sensor_id:
+            rollup_query = rollup_query.filter_by(sensor_id=sensor_id)
+        if start:
+            rollup_query = rollup_query.filter(SensorDataRollup.bucket_start >= start)
+        if end:
+            rollup_query = rollup_query.filter(SensorDataRollup.bucket_start <= end)
+        rollup_query = rollup_query.order_by(SensorDataRollup.bucket_start.desc())
+        if not value_filter:
+            for rollup in rollup_query.limit(limit):
+                rows.append((rollup.bucket_start, 'rollup', rollup, _decrypt_rollup(encryption_service, rollup)))
+            continue
+        matched = 0
+        for rollup in rollup_query.yield_per(100):
+            scanned()
+            stats = _decrypt_rollup(encryption_service, rollup)
+            if stats and rollup.count and matches(stats['sum'] / rollup.count):
+                rows.append((rollup.bucket_start, 'rollup', rollup, stats))
+                matched += 1
+                if matched >= limit:
+                    break
+
+    if tiers:
+        rows.sort(key=lambda row: row[0], reverse=True)
+    return rows[:limit]
+
+
+def read_history(sensor_id=None, start=None, end=None, limit=100, min_value=None, max_value=None):
+    """
+    Newest-first readings for a range, read from the right retention tier
+
+    Recent data comes from raw readings and compressed blocks (block
+    storage mode); older ranges transparently fall back to 1-minute then
+    hourly rollups (value = bucket average). min_value / max_value keep
+    only the readings within those bounds.
+    """
+    encryption_service = EncryptionService.from_config(current_app.config)
+
+    result = []
+    for _, kind, item, value in _history_rows(encryption_service, sensor_id, start, end, limit, min_value, max_value):
+        if kind == 'raw':
+            result.append(SensorData.row_dict(item, decrypted_value=value))
+        elif kind == 'block':
+            result.append(_block_point_dict(item))
+        else:
+            result.append(item.to_dict(stats=value))
+    return result
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def read_history_columns(sensor_id=None, start=None, end=None, limit=100, min_value=None, max_value=None):
+    """
+    Same readings as read_history, as one columnar series per sensor
+
+    Each series holds its metadata once and chronological parallel arrays:
+    epoch-millisecond timestamps and numeric values (null when a value
+    cannot be decrypted). Series containing rollups also get min, max and
+    count arrays (null for individual readings).
+    """
+    encryption_service = EncryptionService.from_config(current_app.config)
+    rows = _history_rows(encryption_service, sensor_id, start, end, limit, min_value, max_value)
+
+    series = {}
+    for timestamp, kind, item, value in reversed(rows):
+        if kind == 'block':
+            item_sensor_id, unit = item[0], item[3]
+        else:
+            item_sensor_id, unit = item.sensor_id, item.unit
+
+        entry = series.get(item_sensor_id)
+        if entry is None:
+            entry = series[item_sensor_id] = {'sensor_id': item_sensor_id, 'unit': unit,
+                                              'timestamps': [], 'values': []}
+        entry['timestamps'].append(to_millis(timestamp))
+
+        if kind == 'rollup':
+            if 'count' not in entry:
+                # Back-fill the aggregate columns of the points already added
+                previous = len(entry['timestamps']) - 1
+                entry.update({'min': [None] * previous, 'max': [None] * previous, 'count': [None] * previous})
+            entry['values'].append(value['sum'] / item.count if value and item.count else None)
+            entry['min'].append(value['min'] if value else None)
+            entry['max'].append(value['max'] if value else None)
+            entry['count'].append(item.count)
+        else:
+            entry['values'].append(_to_float(value))
+            if 'count' in entry:
+                entry['min'].append(None)
+                entry['max'].append(None)
+                entry['count'].append(None)
+
+    return list(series.values())
+
+
+def latest_reading(sensor_id):
+    """
+    Most recent reading of a sensor (raw row or block storage), or None
+
+    The timestamp is ISO 8601 with an explicit UTC offset (Z), so clients
+    convert it like the epoch-millisecond timestamps of the columnar history.
+    """
+    encryption_service = EncryptionService.from_config(current_app.config)
+
+    latest = None
+    record = SensorData.query.filter_by(sensor_id=sensor_id)\
+        .order_by(SensorData.timestamp.desc()).first()
+    if record:
+        try:
+            decrypted_value = reading_value(encryption_service, record)
+            latest = (record.timestamp, record.to_dict(decrypted_value=decrypted_value))
+        except Exception as e:
+            print(f"Failed to decrypt sensor data: {e}")
+
+    points = current_app.extensions['block_storage'].read(sensor_id, limit=1)
+    if points and (latest is None or points[0][1] > latest[0]):
+        latest = (points[0][1], _block_point_dict(points[0]))
+
+    if latest is None:
+        return None
+    reading = latest[1]
+    reading['timestamp'] = reading['timestamp'].isoformat() + 'Z'
+    return reading
+
+
+def aggregate_range(sensor_id, start, end=None):
+    """
+    {count, sum, min, max} over a range, merging raw readings, blocks and rollups
+
+    Plain values (VALUE_STORAGE_POLICIES both / plain) are aggregated by
+    the database; encrypted ones are decrypted and aggregated here.
+    """
+    encryption_service = EncryptionService.from_config(current_app.config)
+    sensor_type = _sensor_type(sensor_id)
+
+    conditions = [SensorData.sensor_id == sensor_id, SensorData.timestamp >= start]
+    if end:
+        conditions.append(SensorData.timestamp <= end)
+    statement = select_readings(SensorData.encrypted_value, SensorData.value).where(*conditions)
+
+    stats = None
+    if value_policy(current_app.config, sensor_type) != 'encrypted':
+        count, total, minimum, maximum = db.session.execute(
+            select(func.count(SensorData.value), func.sum(SensorData.value),
+                   func.min(SensorData.value), func.max(SensorData.value)).where(*conditions)
+        ).one()
+        if count:
+            stats = {'count': count, 'sum': total, 'min': minimum, 'max': maximum}
+        # Readings stored before the policy changed
+        statement = statement.where(SensorData.value.is_(None))
+
+    for row in stream_rows(statement):
+        try:
+            value = reading_number(encryption_service, row)
+        except Exception as e:
+            print(f"Failed to decrypt sensor data: {e}")
+            continue
+        stats = merge_stats(stats, {'count': 1, 'sum': value, 'min': value, 'max': value})
+
+    for _, _, value, _ in current_app.extensions['block_storage'].read(sensor_id, start, end):
+        stats = merge_stats(stats, {'count': 1, 'sum': value, 'min': value, 'max': value})
+
+    tiers, _ = _rollup_tiers(sensor_type, start)
+    if tiers:
+        rollup_query = SensorDataRollup.query.filter(
+            SensorDataRollup.sensor_id == sensor_id,
+            SensorDataRollup.resolution.in_(tiers),
+            SensorDataRollup.bucket_start >= start
+        )
+        if end:
+            rollup_query = rollup_query.filter(SensorDataRollup.bucket_start <= end)
+        for rollup in rollup_query:
+            rollup_stats = _decrypt_rollup(encryption_service, rollup)
+            if rollup_stats:
+                rollup_stats['count'] = rollup.count
+                stats = merge_stats(stats, rollup_stats)
+
+    return stats
+
+
+def read_aligned(sensors, start, end, interval, aggregate='avg'):
+    """
+    Time-aligned matrix of several sensors: one row per `interval` bucket
+    of [start, end), one column per sensor, `aggregate` of the bucket's
+    readings (None when it has none)
+
+    Plain values (VALUE_STORAGE_POLICIES both / plain) are bucketed and
+    aggregated by the database (GROUP BY bucket). Encrypted readings come
+    from a single streamed query, decrypted chunk by chunk and accumulated
+    with vectorized array operations; blocks and rollups (older ranges)
+    are merged into the same buckets.
+    """
+    encryption_service = EncryptionService.from_config(current_app.config)
+    origin = align_origin(start, interval)
+    grid = TimeGrid(origin, interval, -(-(end - origin) // interval), len(sensors))
+    columns = {sensor.id: column for column, sensor in enumerate(sensors)}
+    units = {}
+
+    in_range = (SensorData.timestamp >= origin, SensorData.timestamp < end)
+    encrypted = SensorData.sensor_id.in_(columns)
+    plain_ids = [sensor.id for sensor in sensors if value_policy(current_app.config, sensor.type) != 'encrypted']
+    bucket = bucket_index(SensorData.timestamp, origin, int(interval.total_seconds())) if plain_ids else None
+    if bucket is not None:
+        bucket = bucket.label('bucket')
+        statement = select(SensorData.sensor_id, bucket, func.sum(SensorData.value), func.count(SensorData.value),
+                           func.min(SensorData.value), func.max(SensorData.value), func.max(SensorData.unit))\
+            .where(SensorData.sensor_id.in_(plain_ids), SensorData.value.isnot(None), *in_range)\
+            .group_by(SensorData.sensor_id, bucket)
+        points = []
+        for sensor_id, index, total, count, minimum, maximum, unit in db.session.execute(statement):
+            units.setdefault(sensor_id, unit)
+            points.append((columns[sensor_id], origin + index * interval, total, count, minimum, maximum))
+        if points:
+            grid.add(*map(list, zip(*points)))
+        # Encrypted sensors, and readings stored before a policy change
+        encrypted = or_(SensorData.sensor_id.in_([sensor_id for sensor_id in columns if sensor_id not in plain_ids]),
+                        and_(SensorData.sensor_id.in_(plain_ids), SensorData.value.is_(None)))
+
+    statement = select_readings(SensorData.sensor_id, SensorData.encrypted_value, SensorData.value, SensorData.unit,
+                                SensorData.timestamp).where(encrypted, *in_range)
+    for chunk in stream_chunks(statement):
+        values = []
+        for row in chunk:
+            try:
+                values.append(reading_number(encryption_service, row))
+            except Exception:
+                values.append(None)  # Undecryptable or not numeric: not counted
+            units.setdefault(row.sensor_id, row.unit)
+        grid.add([columns[row.sensor_id] for row in chunk], [row.timestamp for row in chunk], values)
+
+    # Sealed and hot blocks (block storage mode)
+    block_storage = current_app.extensions['block_storage']
+    if block_storage.enabled:
+        for sensor in sensors:
+            points = [point for point in block_storage.read(sensor.id, origin, end) if point[1] < end]
+            if points:
+                units.setdefault(sensor.id, points[0][3])
+                grid.add([columns[sensor.id]] * len(points), [point[1] for point in points], [point[2] for point in points])
+
+    # Ranges older than the raw retention of any of the sensors
+    tiers = set()
+    for sensor_type in {sensor.type for sensor in sensors}:
+        raw_cutoff, minute_cutoff = tier_cutoffs(current_app.config, sensor_type)
+        tiers.update(tier for tier, cutoff in (('1m', raw_cutoff), ('1h', minute_cutoff)) if origin < cutoff)
+    if tiers:
+        rollups = SensorDataRollup.query.filter(
+            SensorDataRollup.sensor_id.in_(columns),
+            SensorDataRollup.resolution.in_(tiers),
+            SensorDataRollup.bucket_start >= origin,
+            SensorDataRollup.bucket_start < end
+        )
+        points = []
+        for rollup in rollups:
+            stats = _decrypt_rollup(encryption_service, rollup)
+            if stats and rollup.count:
+                units.setdefault(rollup.sensor_id, rollup.unit)
+                points.append((columns[rollup.sensor_id], rollup.bucket_start, stats['sum'], rollup.count, stats['min'], stats['max']))
+        if points:
+            grid.add(*map(list, zip(*points)))
+
+    missing = grid.missing()
+    return {
+        'start': origin,
+        'end': end,
+        'interval': int(interval.total_seconds()),
+        'aggregate': aggregate,
+        'sensors': [
+            {'id': sensor.id, 'sensor_id': sensor.sensor_id, 'name': sensor.name, 'type': sensor.type,
+             'location': sensor.location, 'unit': units.get(sensor.id), 'missing': missing[column]}
+            for column, sensor in enumerate(sensors)
+        ],
+        'timestamps': [to_millis(bucket) for bucket in grid.bucket_starts()],
+        'values': grid.matrix(aggregate)
+    }
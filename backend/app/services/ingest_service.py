@@ -0,0 +1,373 @@
+from datetime import datetime, timezone
+from sqlalchemy import insert, and_, or_
+from sqlalchemy.exc import IntegrityError
+from app.models import db, SensorData
+from app.services.alert_service import create_alert
+from app.services.dedup_service import parse_message_id
+from app.services.sensor_service import UPSERT_INSERTS, writable_sensor_ids
+from app.utils.encryption import EncryptionService
+
+# Value storage policies (VALUE_STORAGE_POLICIES)
+VALUE_POLICIES = ('encrypted', 'both', 'plain')
+
+
+
+class SensorDeleted(Exception):
+    """Raised when a reading's sensor was marked for deletion before the reading was written"""
+
+
+# Columns of the unique keys of sensor_data (duplicate suppression)
+DEDUP_KEY_COLUMNS = (SensorData.sensor_id, SensorData.device_timestamp, SensorData.message_id)
+
+
+def parse_reading_timestamp(value):
+    """Naive UTC datetime of an optional ISO 8601 reading timestamp"""
+    if not value:
+        return None
+    timestamp = datetime.fromisoformat(value)
+    if timestamp.tzinfo:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def parse_batch(data, max_size):
+    """
+    Validate a POST /api/sensor-data/batch body
+
+    Returns (readings, rejected): readings are (index, sensor_id, value,
+    unit, timestamp, message_id) tuples, rejected are {index, error}
+    entries for the invalid ones. Raises ValueError when the body itself
+    is invalid.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Request body must be a JSON object')
+    readings = data.get('readings')
+    if not isinstance(readings, list) or not readings:
+        raise ValueError('readings must be a non-empty list')
+    if len(readings) > max_size:
+        raise ValueError(f"At most {max_size} readings per batch")
+
+    parsed, rejected = [], []
+    for index, reading in enumerate(readings):
+        if not isinstance(reading, dict) or not reading.get('sensor_id') or reading.get('value') is None:
+            rejected.append({'index': index, 'error': 'sensor_id and value are required'})
+            continue
+        try:
+            timestamp = parse_reading_timestamp(reading.get('timestamp'))
+        except (TypeError, ValueError):
+            rejected.append({'index': index, 'error': 'Invalid timestamp'})
+            continue
+        try:
+            message_id = parse_message_id(reading.get('message_id'))
+        except ValueError as e:
+            rejected.append({'index': index, 'error': str(e)})
+            continue
+        parsed.append((index, reading['sensor_id'], reading['value'], reading.get('unit', ''), timestamp, message_id))
+    return parsed, rejected
+
+
+def value_policy(config, sensor_type):
+    """Value storage policy of a sensor type: encrypted (default), both or plain"""
+    return config.get('VALUE_STORAGE_POLICIES', {}).get(sensor_type, 'encrypted')
+
+
+def value_columns(encryption_service, policy, value):
+    """
+    encrypted_value and value columns of a reading under a storage policy
+
+    Values that are not numbers are encrypted whatever the policy.
+    """
+    number = None
+    if policy != 'encrypted':
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            pass
+    return {
+        'encrypted_value': None if policy == 'plain' and number is not None else encryption_service.encrypt(str(value)),
+        'value': number
+    }
+
+
+def stored_reading_filter(sensor_id, timestamp, message_id):
+    """WHERE clause of a sensor's stored readings with this device timestamp or message ID"""
+    conditions = []
+    if timestamp is not None:
+        conditions.append(SensorData.device_timestamp == timestamp)
+    if message_id is not None:
+        conditions.append(SensorData.message_id == message_id)
+    return and_(SensorData.sensor_id == sensor_id, or_(*conditions))
+
+
+def is_keyed(row):
+    """Whether a sensor_data row has a device timestamp or message ID (and may conflict with a stored one)"""
+    return row['device_timestamp'] is not None or row['message_id'] is not None
+
+
+def keyed_insert(dialect):
+    """
+    INSERT of keyed sensor_data rows that skips duplicates and returns
+    the keys of the rows written (None where ON CONFLICT is not supported)
+    """
+    if dialect not in UPSERT_INSERTS:
+        return None
+    return UPSERT_INSERTS[dialect](SensorData).on_conflict_do_nothing().returning(*DEDUP_KEY_COLUMNS)
+
+
+def written_rows(rows, returned):
+    """Flags of the keyed rows whose key was returned by keyed_insert()"""
+    returned = {tuple(key) for key in returned}
+    return [(row['sensor_id'], row['device_timestamp'], row['message_id']) in returned for row in rows]
+
+
+def write_readings(rows):
+    """
+    Insert sensor_data rows in the session; returns one written flag per row
+
+    Sensor statuses are checked again in the same transaction: rows of
+    sensors missing or being deleted are not inserted (flag None). Rows
+    without device timestamp or message ID cannot conflict and go through
+    a plain executemany. The others skip duplicates (ON CONFLICT DO
+    NOTHING) and return their keys: a row dropped because another process
+    stored the reading meanwhile is flagged as not written (False).
+    """
+    writable = writable_sensor_ids({row['sensor_id'] for row in rows})
+    written = [True if row['sensor_id'] in writable else None for row in rows]
+    plain = [row for index, row in enumerate(rows) if written[index] and not is_keyed(row)]
+    keyed = [index for index, row in enumerate(rows) if written[index] and is_keyed(row)]
+    if plain:
+        db.session.execute(insert(SensorData), plain)
+    if keyed:
+        statement = keyed_insert(db.session.get_bind(mapper=SensorData).dialect.name)
+        keyed_rows = [rows[index] for index in keyed]
+        if statement is None:
+            db.session.execute(insert(SensorData), keyed_rows)
+        else:
+            flags = written_rows(keyed_rows, db.session.execute(statement, keyed_rows))
+            for index, flag in zip(keyed, flags):
+                written[index] = flag
+    return written
+
+
+class IngestService:
+    """Stores incoming readings (shared by the MQTT and HTTPS ingestion paths)"""
+
+    def __init__(self, app=None):
+        self.app = app
+        self.encryption_service = None
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize ingest service with Flask app"""
+        self.app = app
+        self.encryption_service = EncryptionService.from_config(app.config)
+        for sensor_type, policy in app.config.get('VALUE_STORAGE_POLICIES', {}).items():
+            if policy not in VALUE_POLICIES:
+                raise ValueError(f"Invalid value storage policy {policy!r} for {sensor_type}: "
+                                 f"must be one of {', '.join(VALUE_POLICIES)}")
+        app.extensions['ingest'] = self
+
+    def store_reading(self, sensor, value, unit='', timestamp=None, message_id=None):
+        """
+        Persist one reading and return it as a dictionary
+
+        In block storage mode the reading goes to the sensor's hot block
+        (no row, no encryption per reading); otherwise one sensor_data row
+        is committed, encrypted and/or plain as the sensor type's
+        VALUE_STORAGE_POLICIES entry says. timestamp is the device's (None:
+        time of receipt); returns None for a duplicate of a stored reading
+        (same device timestamp or message_id); raises SensorDeleted when
+        the sensor was marked for deletion meanwhile.
+        """
+        if self.is_duplicate(sensor, timestamp, message_id):
+            return None
+        device_timestamp = timestamp
+        timestamp = timestamp or datetime.utcnow()
+
+        if self.buffer_block(sensor, value, unit, timestamp):
+            self.invalidate_results([(sensor, timestamp)])
+            self.detect_anomalies([(sensor, value)])
+            return {
+                'id': None,
+                'sensor_id': sensor.id,
+                'value': str(value),
+                'unit': unit,
+                'timestamp': timestamp
+            }
+
+        # The sensor may have been marked for deletion since it was read
+        if not writable_sensor_ids([sensor.id]):
+            raise SensorDeleted('Sensor is being deleted')
+
+        # Store sensor data (encrypted value and / or plain numeric value)
+        policy = value_policy(self.app.config, sensor.type)
+        sensor_data = SensorData(
+            sensor_id=sensor.id,
+            **value_columns(self.encryption_service, policy, value),
+            unit=unit,
+            timestamp=timestamp,
+            device_timestamp=device_timestamp,
+            message_id=message_id
+        )
+        db.session.add(sensor_data)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Stored meanwhile by another process
+            db.session.rollback()
+            if (device_timestamp is None and message_id is None) or not self.stored(sensor.id, device_timestamp, message_id):
+                raise
+            self.app.extensions['dedup'].duplicate()
+            return None
+        reading = sensor_data.to_dict(decrypted_value=str(value))
+
+        self.count_reading(sensor, value, unit, timestamp)
+        self.invalidate_results([(sensor, timestamp)])
+        self.detect_anomalies([(sensor, value)])
+        return reading
+
+    def buffer_block(self, sensor, value, unit, timestamp):
+        """
+        Block storage mode: count the reading and append it to the sensor's
+        hot block. Returns True when the reading needs no row.
+        """
+        block_storage = self.app.extensions['block_storage']
+        if not block_storage.enabled:
+            return False
+        self.count_reading(sensor, value, unit, timestamp)
+        block_storage.append(sensor.id, timestamp, value, unit)
+        return True
+
+    def count_reading(self, sensor, value, unit, timestamp):
+        """
+        In-memory part of ingestion: last-seen time, quantile sketch and
+        group aggregate. Only for stored readings (never a dropped duplicate).
+        """
+        # Last-seen time (offline detection)
+        liveness = self.app.extensions['liveness']
+        if liveness.enabled:
+            liveness.seen(sensor.id)
+
+        # Hourly quantile sketch (percentile statistics)
+        sketches = self.app.extensions['sketches']
+        if sketches.enabled:
+            sketches.add(sensor.id, timestamp, value, unit)
+
+        # Hourly (location, type) aggregate (site overviews)
+        group_aggregates = self.app.extensions['group_aggregates']
+        if group_aggregates.enabled:
+            group_aggregates.add(sensor, timestamp, value, unit)
+
+    def store_readings(self, readings, failures=None):
+        """
+        Persist (sensor, value, unit, timestamp, message_id) readings with one commit
+
+        Rows are inserted with a single executemany (no ORM objects);
+        duplicates are skipped, including rows the database drops because
+        another process stored them meanwhile. Readings of sensors marked
+        for deletion meanwhile are appended to `failures` as
+        (position, SensorDeleted) (raised when no list is given). Returns
+        the number of readings stored.
+        """
+        rows = []
+        stored = []
+        pending = set()
+        for position, (sensor, value, unit, timestamp, message_id) in enumerate(readings):
+            if self.is_duplicate(sensor, timestamp, message_id, pending):
+                continue
+            device_timestamp = timestamp
+            timestamp = timestamp or datetime.utcnow()
+            if self.buffer_block(sensor, value, unit, timestamp):
+                stored.append((sensor, value, timestamp))
+                continue
+            rows.append(((position, sensor, value, unit, timestamp), {
+                'sensor_id': sensor.id,
+                **value_columns(self.encryption_service, value_policy(self.app.config, sensor.type), value),
+                'unit': unit,
+                'timestamp': timestamp,
+                'device_timestamp': device_timestamp,
+                'message_id': message_id
+            }))
+
+        if rows:
+            written = write_readings([row for _, row in rows])
+            db.session.commit()
+            dedup = self.app.extensions['dedup']
+            deleted = []
+            for ((position, sensor, value, unit, timestamp), _), flag in zip(rows, written):
+                if flag:
+                    self.count_reading(sensor, value, unit, timestamp)
+                    stored.append((sensor, value, timestamp))
+                elif flag is None:
+                    deleted.append((position, SensorDeleted('Sensor is being deleted')))
+                else:
+                    dedup.duplicate()
+            if deleted:
+                if failures is None:
+                    raise deleted[0][1]
+                failures.extend(deleted)
+
+        self.invalidate_results([(sensor, timestamp) for sensor, _, timestamp in stored])
+        self.detect_anomalies([(sensor, value) for sensor, value, _ in stored])
+        return len(stored)
+
+    def is_duplicate(self, sensor, timestamp, message_id, pending=None):
+        """
+        True when a reading with this device timestamp or message ID is already stored
+
+        The dedup filter answers new readings without a query; possible
+        duplicates are confirmed against sensor_data and, in block storage
+        mode, the sensor's blocks. `pending` collects the keys of the
+        readings of the same batch.
+        """
+        dedup = self.app.extensions['dedup']
+        if not dedup.enabled or (timestamp is None and message_id is None):
+            return False
+        keys = dedup.keys(sensor.id, timestamp, message_id)
+        duplicate = dedup.maybe_seen(sensor.id, timestamp, message_id) and (
+            (pending is not None and not pending.isdisjoint(keys))
+            or self.stored(sensor.id, timestamp, message_id)
+            or self.in_blocks(sensor.id, timestamp)
+        )
+        if duplicate:
+            dedup.duplicate()
+        elif pending is not None:
+            pending.update(keys)
+        return duplicate
+
+    def stored(self, sensor_id, timestamp, message_id):
+        """Whether sensor_data holds a reading of this sensor with this device timestamp or message ID"""
+        return db.session.query(SensorData.id).filter(
+            stored_reading_filter(sensor_id, timestamp, message_id)
+        ).first() is not None
+
+    def in_blocks(self, sensor_id, timestamp):
+        """
+        Whether the sensor's hot or sealed blocks hold a point at this device timestamp
+
+        Blocks keep no message ID: in block storage mode, readings carrying
+        only a message_id are never dropped as duplicates.
+        """
+        block_storage = self.app.extensions['block_storage']
+        return block_storage.enabled and timestamp is not None and block_storage.contains(sensor_id, timestamp)
+
+    def invalidate_results(self, readings):
+        """Bump the result cache versions of stored (sensor, timestamp) readings"""
+        result_cache = self.app.extensions['result_cache']
+        if result_cache.enabled:
+            for sensor, timestamp in readings:
+                result_cache.bump(sensor.id, timestamp)
+
+    def detect_anomalies(self, readings):
+        """Open alerts for anomalous (sensor, value) readings (streaming detector, ANOMALY_ENABLED)"""
+        anomalies = self.app.extensions['anomalies']
+        if not anomalies.active:
+            return
+        try:
+            for sensor, alert in anomalies.evaluate(readings):
+                create_alert(sensor, **alert)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error checking anomalies: {e}")
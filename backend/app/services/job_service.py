@@ -0,0 +1,277 @@
+import json
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from app.models import db, Job
+
+# Job type -> handler(JobContext), filled by @job_handler
+HANDLERS = {}
+# Job types that may be submitted through POST /api/jobs
+SUBMITTABLE = set()
+# Job types that must run to completion once queued (POST /api/jobs/<id>/cancel refused)
+NON_CANCELLABLE = set()
+
+
+def job_handler(job_type, submittable=True, cancellable=True):
+    """Register a function as the handler of a job type"""
+    def decorator(func):
+        HANDLERS[job_type] = func
+        if submittable:
+            SUBMITTABLE.add(job_type)
+        if not cancellable:
+            NON_CANCELLABLE.add(job_type)
+        return func
+    return decorator
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler when cancellation was requested"""
+
+
+class JobInterrupted(Exception):
+    """Raised inside a handler when its worker stops or lost ownership of the job"""
+
+
+class JobContext:
+    """What a handler sees of its job: params, checkpoint and progress reporting"""
+
+    def __init__(self, service, job, worker):
+        self.service = service
+        self.app = service.app
+        self.job_id = job.id
+        self.worker_id = job.worker_id
+        self.params = job.params_dict
+        self.checkpoint = job.checkpoint_dict
+        self.final_attempt = job.attempts >= job.max_attempts
+        self.worker = worker
+
+    def update(self, progress=None, message=None, checkpoint=None):
+        """
+        Save progress/checkpoint and heartbeat (commits the session)
+
+        Handlers must call this between chunks of work: it raises
+        JobCancelled when the job was cancelled and JobInterrupted when the
+        worker is stopping or the job was handed over to another worker.
+        """
+        values = {'heartbeat_at': datetime.utcnow()}
+        if progress is not None:
+            values['progress'] = round(min(100.0, progress), 1)
+        if message is not None:
+            values['message'] = message[:255]
+        if checkpoint is not None:
+            self.checkpoint = checkpoint
+            values['checkpoint'] = json.dumps(checkpoint)
+
+        owned = db.session.query(Job).filter(
+            Job.id == self.job_id,
+            Job.status == 'running',
+            Job.worker_id == self.worker_id
+        ).update(values, synchronize_session=False)
+        db.session.commit()
+
+        if not owned:
+            raise JobInterrupted('Job is no longer owned by this worker')
+        if db.session.query(Job.cancel_requested).filter(Job.id == self.job_id).scalar():
+            raise JobCancelled('Cancellation requested')
+        if self.worker and self.worker.stop_event.is_set():
+            raise JobInterrupted('Worker is stopping')
+
+    def sleep(self, seconds):
+        """
+        Pause between chunks (throttling), heartbeating every third of
+        JOB_HEARTBEAT_TIMEOUT so a long pause does not get the job requeued
+        as dead. Raises like update().
+        """
+        deadline = time.monotonic() + seconds
+        interval = self.app.config['JOB_HEARTBEAT_TIMEOUT'] / 3
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, interval))
+            if deadline > time.monotonic():
+                self.update()
+
+
+class JobService:
+    """Database-backed job queue (no external broker)"""
+
+    def __init__(self, app=None):
+        self.app = app
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize job service with Flask app"""
+        self.app = app
+        app.extensions['jobs'] = self
+
+    def submit(self, job_type, params=None, priority=0, created_by=None, unique=False, parent_id=None):
+        """Queue a job; with unique=True an existing queued/running job of the type is returned instead"""
+        if job_type not in HANDLERS:
+            raise ValueError(f"Unknown job type: {job_type}")
+
+        if unique:
+            existing = Job.query.filter(
+                Job.type == job_type,
+                Job.status.in_(['queued', 'running'])
+            ).first()
+            if existing:
+                return existing
+
+        job = Job(
+            type=job_type,
+            params=json.dumps(params or {}),
+            priority=priority,
+            parent_id=parent_id,
+            created_by=created_by,
+            max_attempts=self.app.config['JOB_MAX_ATTEMPTS']
+        )
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    def cancel(self, job):
+        """Cancel a queued job now, or ask the worker of a running job to stop"""
+        if job.status == 'queued':
+            job.status = 'cancelled'
+            job.finished_at = datetime.utcnow()
+        elif job.status == 'running':
+            job.cancel_requested = True
+        db.session.commit()
+        return job
+
+    def claim(self, worker_id):
+        """Take the highest priority queued job (FOR UPDATE SKIP LOCKED), or None"""
+        job = Job.query.filter(Job.status == 'queued')\
+            .order_by(Job.priority.desc(), Job.id)\
+            .with_for_update(skip_locked=True).first()
+        if not job:
+            db.session.rollback()
+            return None
+
+        # Conditional update: also safe on databases without row locks (SQLite)
+        now = datetime.utcnow()
+        claimed = db.session.query(Job).filter(Job.id == job.id, Job.status == 'queued').update({
+            'status': 'running',
+            'worker_id': worker_id,
+            'heartbeat_at': now,
+            'attempts': Job.attempts + 1,
+            'started_at': job.started_at or now
+        }, synchronize_session=False)
+        db.session.commit()
+        if not claimed:
+            return None
+        return db.session.get(Job, job.id)
+
+    def requeue_stale(self):
+        """Give back jobs whose worker stopped sending heartbeats"""
+        stale = datetime.utcnow() - timedelta(seconds=self.app.config['JOB_HEARTBEAT_TIMEOUT'])
+        jobs = Job.query.filter(Job.status == 'running', Job.heartbeat_at < stale)\
+            .with_for_update(skip_locked=True).all()
+        for job in jobs:
+            print(f"Job {job.id} ({job.type}) lost its worker {job.worker_id}")
+            self._retry_or_fail(job, 'Worker stopped responding')
+        db.session.commit()
+        return len(jobs)
+
+    def _retry_or_fail(self, job, error):
+        job.error = error
+        job.worker_id = None
+        if job.attempts >= job.max_attempts:
+            job.status = 'failed'
+            job.finished_at = datetime.utcnow()
+        else:
+            # Resumes from its last checkpoint
+            job.status = 'queued'
+
+    def run(self, job, worker=None):
+        """Run a claimed job to completion, cancellation or failure"""
+        context = JobContext(self, job, worker)
+        try:
+            result = HANDLERS[job.type](context)
+        except JobCancelled:
+            db.session.rollback()
+            job.status = 'cancelled'
+            job.finished_at = datetime.utcnow()
+        except JobInterrupted as e:
+            db.session.rollback()
+            if job.worker_id == context.worker_id and job.status == 'running':
+                job.status = 'queued'
+                job.worker_id = None
+                job.attempts -= 1
+            print(f"Job {job.id} ({job.type}) interrupted: {e}")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Job {job.id} ({job.type}) failed: {e}")
+            self._retry_or_fail(job, str(e))
+        else:
+            job.status = 'completed'
+            job.progress = 100.0
+            job.result = json.dumps(result) if result is not None else None
+            job.error = None
+            job.finished_at = datetime.utcnow()
+        db.session.commit()
+        return job
+
+
+class JobWorker:
+    """Polls the jobs table and runs jobs one at a time (see worker.py)"""
+
+    def __init__(self, app, name=None):
+        self.app = app
+        self.worker_id = name or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        self.stop_event = threading.Event()
+        self.schedules = []  # [job_type, interval, params, last_submitted]
+
+    def schedule(self, job_type, interval, params=None):
+        """Submit a job every `interval` seconds (skipped while one is queued or running)"""
+        self.schedules.append([job_type, interval, params, None])
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run_once(self):
+        """Run at most one job; returns it, or None when the queue is empty"""
+        service = self.app.extensions['jobs']
+        with self.app.app_context():
+            try:
+                self._submit_scheduled(service)
+                service.requeue_stale()
+                job = service.claim(self.worker_id)
+                if job:
+                    print(f"Running job {job.id} ({job.type})")
+                    service.run(job, self)
+                    print(f"Job {job.id} ({job.type}) {job.status}")
+                return job
+            finally:
+                db.session.remove()
+
+    def run_forever(self):
+        print(f"Job worker {self.worker_id} started")
+        while not self.stop_event.is_set():
+            try:
+                job = self.run_once()
+            except Exception as e:
+                print(f"Job worker error: {e}")
+                job = None
+            if job is None:
+                self.stop_event.wait(self.app.config['JOB_POLL_INTERVAL'])
+        print(f"Job worker {self.worker_id} stopped")
+
+    def start(self):
+        """Run the worker in a daemon thread (JOB_EMBEDDED_WORKER, development)"""
+        thread = threading.Thread(target=self.run_forever, name='job-worker', daemon=True)
+        thread.start()
+        return thread
+
+    def _submit_scheduled(self, service):
+        now = datetime.utcnow()
+        for entry in self.schedules:
+            job_type, interval, params, last = entry
+            if last is None or (now - last).total_seconds() >= interval:
+                service.submit(job_type, params, unique=True)
+                entry[3] = now
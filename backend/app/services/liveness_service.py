@@ -0,0 +1,274 @@
+import atexit
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+from app.models import db, Sensor, SensorLiveness
+from app.models.routing import use_bind, INGEST_BIND
+from app.services.alert_service import create_alert, resolve_alerts
+from app.services.sensor_service import writable_sensor_ids
+
+OFFLINE_ALERT = 'sensor_offline'
+
+
+class LivenessService:
+    """
+    Offline detection of silent sensors (LIVENESS_ENABLED)
+
+    The ingest path only records, in memory, when a sensor was last seen.
+    A monitor thread keeps one deadline per sensor in a heap (last seen +
+    the timeout of its type) and sleeps until the earliest one: a sensor
+    whose deadline passed without data gets a sensor_offline alert, resolved
+    when data resumes. The work depends on readings and timeouts, not on
+    the fleet size times a polling rate.
+
+    Last-seen times are written to sensor_liveness every
+    LIVENESS_SYNC_INTERVAL seconds: ingest processes check them before
+    reporting a sensor offline, and a restart resumes the deadlines.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.last_seen = {}  # sensor_id -> datetime
+        self.timeouts = {}  # sensor_id -> timedelta, None when not monitored
+        self.deadlines = []  # heap of (deadline, sensor_id), at most one per tracked sensor
+        self.tracked = set()  # sensors with a deadline in the heap
+        self.offline = set()  # sensors reported offline
+        self.new = set()  # seen without a deadline (first reading or back online)
+        self.dirty = set()  # seen since the last sync
+        self.started_at = None
+        self.condition = threading.Condition()
+        self.thread = None
+        self.stop_event = threading.Event()
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize liveness service with Flask app"""
+        self.app = app
+        app.extensions['liveness'] = self
+
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config.get('LIVENESS_ENABLED', True)
+
+    def timeout_for(self, sensor_type):
+        """Silence after which a sensor of this type is offline (None: not monitored)"""
+        seconds = self.app.config['LIVENESS_TIMEOUTS'].get(sensor_type, self.app.config['LIVENESS_DEFAULT_TIMEOUT'])
+        return timedelta(seconds=seconds) if seconds else None
+
+    def start(self):
+        """Start the monitor thread"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.started_at = datetime.utcnow()
+        self.thread = threading.Thread(target=self._loop, name='liveness-monitor', daemon=True)
+        self.thread.start()
+        atexit.register(self.sync)
+
+    def stop(self):
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify()
+
+    def seen(self, sensor_id):
+        """Record that a sensor sent data (ingest path)"""
+        now = datetime.utcnow()
+        with self.condition:
+            self.last_seen[sensor_id] = now
+            self.dirty.add(sensor_id)
+            if self.timeouts.get(sensor_id, 0) is None:
+                return  # Type not monitored
+            if (sensor_id not in self.tracked or sensor_id in self.offline) and sensor_id not in self.new:
+                self.new.add(sensor_id)
+                self.condition.notify()
+
+    def discard(self, sensor_id):
+        """Stop monitoring a sensor (sensor deletion)"""
+        with self.condition:
+            self.last_seen.pop(sensor_id, None)
+            self.timeouts.pop(sensor_id, None)
+            for pending in (self.tracked, self.offline, self.new, self.dirty):
+                pending.discard(sensor_id)
+
+    def _loop(self):
+        with self.app.app_context():
+            try:
+                self._load()
+            except Exception as e:
+                print(f"Error loading sensor liveness: {e}")
+            finally:
+                db.session.remove()
+
+        interval = self.app.config['LIVENESS_SYNC_INTERVAL']
+        next_sync = time.monotonic() + interval
+        while not self.stop_event.is_set():
+            with self.condition:
+                wait = next_sync - time.monotonic()
+                if self.deadlines:
+                    wait = min(wait, (self.deadlines[0][0] - datetime.utcnow()).total_seconds())
+                if not self.new and wait > 0:
+                    self.condition.wait(wait)
+                new, self.new = self.new, set()
+
+            resumed = False
+            with self.app.app_context(), use_bind(INGEST_BIND):
+                try:
+                    resumed = self._arm(new) if new else False
+                    self._expire()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Error checking sensor liveness: {e}")
+                finally:
+                    db.session.remove()
+
+            if resumed or time.monotonic() >= next_sync:
+                self.sync()
+                next_sync = time.monotonic() + interval
+
+    def _push(self, sensor_id):
+        """Arm a sensor's deadline (caller holds the lock)"""
+        # No sensor is judged before this process listened for a full timeout
+        last_seen = max(self.last_seen[sensor_id], self.started_at)
+        heapq.heappush(self.deadlines, (last_seen + self.timeouts[sensor_id], sensor_id))
+        self.tracked.add(sensor_id)
+
+    def _load(self):
+        """Resume the deadlines saved by previous runs (one query at startup)"""
+        rows = db.session.query(
+            SensorLiveness.sensor_id, SensorLiveness.last_seen_at, SensorLiveness.offline_since, Sensor.type
+        ).join(Sensor, Sensor.id == SensorLiveness.sensor_id).filter(Sensor.status != 'deleting')
+        with self.condition:
+            for sensor_id, last_seen_at, offline_since, sensor_type in rows:
+                self.timeouts.setdefault(sensor_id, self.timeout_for(sensor_type))
+                self.last_seen[sensor_id] = max(self.last_seen.get(sensor_id, last_seen_at), last_seen_at)
+                if offline_since is not None and self.last_seen[sensor_id] <= offline_since:
+                    self.offline.add(sensor_id)
+                elif self.timeouts[sensor_id] and sensor_id not in self.tracked:
+                    self._push(sensor_id)
+
+    def _arm(self, sensor_ids):
+        """Arm the deadlines of newly seen sensors; True if one of them was offline"""
+        unknown = [sensor_id for sensor_id in sensor_ids if sensor_id not in self.timeouts]
+        types = {}
+        if unknown:
+            types = dict(db.session.query(Sensor.id, Sensor.type).filter(Sensor.id.in_(unknown)))
+
+        resumed = False
+        with self.condition:
+            for sensor_id in unknown:
+                self.timeouts[sensor_id] = self.timeout_for(types[sensor_id]) if sensor_id in types else None
+            for sensor_id in sensor_ids:
+                if sensor_id not in self.last_seen or not self.timeouts.get(sensor_id):
+                    continue
+                if sensor_id in self.offline:
+                    self.offline.discard(sensor_id)
+                    resumed = True
+                if sensor_id not in self.tracked:
+                    self._push(sensor_id)
+        return resumed
+
+    def _expire(self):
+        """Report the sensors whose deadline passed without data"""
+        now = datetime.utcnow()
+        expired = []
+        with self.condition:
+            while self.deadlines and self.deadlines[0][0] <= now:
+                _, sensor_id = heapq.heappop(self.deadlines)
+                self.tracked.discard(sensor_id)
+                if not self.timeouts.get(sensor_id) or sensor_id not in self.last_seen:
+                    continue  # Discarded meanwhile
+                if max(self.last_seen[sensor_id], self.started_at) + self.timeouts[sensor_id] > now:
+                    self._push(sensor_id)  # Seen since the deadline was armed
+                else:
+                    expired.append(sensor_id)
+        if not expired:
+            return
+
+        # Readings received by other ingest processes
+        rows = {row.sensor_id: row for row in SensorLiveness.query.filter(SensorLiveness.sensor_id.in_(expired))}
+        offline = []
+        with self.condition:
+            for sensor_id in expired:
+                row = rows.get(sensor_id)
+                if row is not None and row.last_seen_at > self.last_seen.get(sensor_id, row.last_seen_at):
+                    self.last_seen[sensor_id] = row.last_seen_at
+                if sensor_id not in self.last_seen:
+                    continue
+                if max(self.last_seen[sensor_id], self.started_at) + self.timeouts[sensor_id] > now:
+                    self._push(sensor_id)
+                elif row is not None and row.offline_since is not None:
+                    self.offline.add(sensor_id)  # Already reported by another process
+                else:
+                    offline.append(sensor_id)
+        if not offline:
+            return
+
+        sensors = Sensor.query.filter(Sensor.id.in_(offline), Sensor.status != 'deleting').all()
+        for sensor in sensors:
+            row = rows.get(sensor.id)
+            if row is None:
+                row = SensorLiveness(sensor_id=sensor.id, last_seen_at=self.last_seen[sensor.id])
+                db.session.add(row)
+            row.offline_since = now
+            if self.app.config['LIVENESS_SET_STATUS'] and sensor.status == 'active':
+                sensor.status = 'offline'
+        db.session.commit()
+
+        with self.condition:
+            self.offline.update(sensor.id for sensor in sensors)
+        for sensor in sensors:
+            last_seen = self.last_seen.get(sensor.id, now)
+            create_alert(
+                sensor,
+                alert_type=OFFLINE_ALERT,
+                message=f"{sensor.name} has sent no data since {last_seen:%Y-%m-%d %H:%M:%S} UTC",
+                severity='warning',
+                threshold=self.timeouts[sensor.id].total_seconds(),
+                actual_value=round((now - last_seen).total_seconds())
+            )
+
+    def sync(self):
+        """Save the last-seen times and resolve the offline alerts of sensors sending data again"""
+        with self.condition:
+            changed = {sensor_id: self.last_seen[sensor_id] for sensor_id in self.dirty if sensor_id in self.last_seen}
+            self.dirty = set()
+        if not changed:
+            return
+        with self.app.app_context(), use_bind(INGEST_BIND):
+            try:
+                # Sensors deleted meanwhile, possibly from another process
+                writable = writable_sensor_ids(changed)
+                for sensor_id in set(changed) - writable:
+                    self.discard(sensor_id)
+                changed = {sensor_id: last_seen for sensor_id, last_seen in changed.items() if sensor_id in writable}
+                existing = {row.sensor_id: row for row in SensorLiveness.query.filter(
+                    SensorLiveness.sensor_id.in_(changed))}
+                resumed = []
+                for sensor_id, last_seen in changed.items():
+                    row = existing.get(sensor_id)
+                    if row is None:
+                        db.session.add(SensorLiveness(sensor_id=sensor_id, last_seen_at=last_seen))
+                        continue
+                    row.last_seen_at = max(row.last_seen_at, last_seen)
+                    if row.offline_since is not None and last_seen > row.offline_since:
+                        row.offline_since = None
+                        resumed.append(sensor_id)
+
+                if resumed:
+                    resolve_alerts(resumed, OFFLINE_ALERT)
+                    if self.app.config['LIVENESS_SET_STATUS']:
+                        Sensor.query.filter(Sensor.id.in_(resumed), Sensor.status == 'offline')\
+                            .update({'status': 'active'}, synchronize_session=False)
+                db.session.commit()
+                if resumed:
+                    print(f"{len(resumed)} sensors back online")
+            except Exception as e:
+                db.session.rollback()
+                print(f"Failed to sync sensor liveness, will retry: {e}")
+                with self.condition:
+                    self.dirty.update(sensor_id for sensor_id in changed if sensor_id in self.last_seen)
+            finally:
+                db.session.remove()
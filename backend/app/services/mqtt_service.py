@@ -1,8 +1,66 @@
 import paho.mqtt.client as mqtt
 import json
-from datetime import datetime
-from app.models import db, Sensor, SensorData, Alert
-from app.utils.encryption import EncryptionService
+from app.models import db, Sensor
+from app.models.routing import use_bind, INGEST_BIND
+from app.services.alert_service import create_alert
+from app.services.dedup_service import parse_message_id
+from app.services.ingest_service import parse_reading_timestamp, SensorDeleted
+
+# Alert thresholds by sensor type; an alert is resolved once values are back
+# inside the band by at least `hysteresis` (ALERT_AUTO_RESOLVE)
+ALERT_THRESHOLDS = {
+    'temperature': {'high': 35, 'low': 10, 'hysteresis': 1},
+    'humidity': {'high': 80, 'low': 30, 'hysteresis': 3},
+    'soil_moisture': {'low': 20, 'hysteresis': 2},
+    'light': {'high': 10000, 'hysteresis': 500}
+}
+
+
+def threshold_alerts(sensor, value):
+    """Alerts (create_alert keyword arguments) a value triggers for its sensor type"""
+    sensor_thresholds = ALERT_THRESHOLDS.get(sensor.type)
+    if not sensor_thresholds:
+        return []
+
+    alerts = []
+
+    # Check high threshold
+    if 'high' in sensor_thresholds and value > sensor_thresholds['high']:
+        alerts.append({
+            'alert_type': f"high_{sensor.type}",
+            'message': f"{sensor.name} value is too high: {value}",
+            'severity': 'warning',
+            'threshold': sensor_thresholds['high'],
+            'actual_value': value
+        })
+
+    # Check low threshold
+    if 'low' in sensor_thresholds and value < sensor_thresholds['low']:
+        alerts.append({
+            'alert_type': f"low_{sensor.type}",
+            'message': f"{sensor.name} value is too low: {value}",
+            'severity': 'warning',
+            'threshold': sensor_thresholds['low'],
+            'actual_value': value
+        })
+
+    return alerts
+
+
+def threshold_resolutions(sensor, value):
+    """Threshold alert types a value clears (back inside the band by at least the hysteresis)"""
+    sensor_thresholds = ALERT_THRESHOLDS.get(sensor.type)
+    if not sensor_thresholds:
+        return []
+
+    margin = sensor_thresholds.get('hysteresis', 0)
+    alert_types = []
+    if 'high' in sensor_thresholds and value <= sensor_thresholds['high'] - margin:
+        alert_types.append(f"high_{sensor.type}")
+    if 'low' in sensor_thresholds and value >= sensor_thresholds['low'] + margin:
+        alert_types.append(f"low_{sensor.type}")
+    return alert_types
+
 
 class MQTTService:
     """Service for handling MQTT connections and sensor data"""
@@ -10,7 +68,6 @@ class MQTTService:
     def __init__(self, app=None):
         self.app = app
         self.client = None
-        self.encryption_service = None
 
         if app:
             self.init_app(app)
@@ -18,7 +75,6 @@ class MQTTService:
     def init_app(self, app):
         """Initialize MQTT service with Flask app"""
         self.app = app
-        self.encryption_service = EncryptionService(app.config['ENCRYPTION_KEY'])
 
         # Create MQTT client (compatible with paho-mqtt 2.x)
         self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id="iot_platform_server")
@@ -84,7 +140,16 @@ class MQTTService:
                 print("Invalid message format: missing sensor_id or value")
                 return
 
-            with self.app.app_context():
+            # Optional device timestamp and message ID (duplicate suppression)
+            try:
+                timestamp = parse_reading_timestamp(payload.get('timestamp'))
+                message_id = parse_message_id(payload.get('message_id'))
+            except (TypeError, ValueError) as e:
+                print(f"Invalid message format: {e}")
+                return
+
+            # Ingest writes use their own connection pool
+            with self.app.app_context(), use_bind(INGEST_BIND):
                 # Find or create sensor
                 sensor = Sensor.query.filter_by(sensor_id=sensor_id).first()
                 if not sensor:
@@ -97,19 +162,14 @@ class MQTTService:
                     db.session.add(sensor)
                     db.session.commit()
                     print(f"Created new sensor: {sensor_id}")
+                elif sensor.status == 'deleting':
+                    print(f"Ignoring data from sensor {sensor_id}: sensor is being deleted")
+                    return
 
-                # Encrypt sensor value
-                encrypted_value = self.encryption_service.encrypt(str(value))
-
-                # Store sensor data
-                sensor_data = SensorData(
-                    sensor_id=sensor.id,
-                    encrypted_value=encrypted_value,
-                    unit=unit,
-                    timestamp=datetime.utcnow()
-                )
-                db.session.add(sensor_data)
-                db.session.commit()
+                # Store sensor data (row or block storage mode)
+                if self.app.extensions['ingest'].store_reading(sensor, value, unit, timestamp, message_id) is None:
+                    print(f"Ignoring duplicate data from sensor {sensor_id}")
+                    return
 
                 print(f"Stored data from sensor {sensor_id}: {value} {unit}")
 
@@ -118,75 +178,32 @@ class MQTTService:
 
         except json.JSONDecodeError:
             print(f"Failed to decode JSON message: {msg.payload}")
+        except SensorDeleted:
+            print(f"Ignoring data from sensor {sensor_id}: sensor is being deleted")
         except Exception as e:
             print(f"Error processing message: {e}")
 
     def check_alerts(self, sensor, value):
-        """Check if sensor value triggers any alerts"""
+        """Check if sensor value triggers any alerts, or clears open ones"""
         try:
-            # Define thresholds based on sensor type
-            thresholds = {
-                'temperature': {'high': 35, 'low': 10},
-                'humidity': {'high': 80, 'low': 30},
-                'soil_moisture': {'low': 20},
-                'light': {'high': 10000}
-            }
-
-            if sensor.type not in thresholds:
-                return
+            for alert in threshold_alerts(sensor, value):
+                self.create_alert(sensor, **alert)
 
-            sensor_thresholds = thresholds[sensor.type]
-
-            # Check high threshold
-            if 'high' in sensor_thresholds and value > sensor_thresholds['high']:
-                self.create_alert(
-                    sensor,
-                    f"high_{sensor.type}",
-                    f"{sensor.name} value is too high: {value}",
-                    'warning',
-                    sensor_thresholds['high'],
-                    value
-                )
-
-            # Check low threshold
-            if 'low' in sensor_thresholds and value < sensor_thresholds['low']:
-                self.create_alert(
-                    sensor,
-                    f"low_{sensor.type}",
-                    f"{sensor.name} value is too low: {value}",
-                    'warning',
-                    sensor_thresholds['low'],
-                    value
-                )
+            # Resolve alerts the value is back from (with hysteresis)
+            self.app.extensions['alert_lifecycle'].resolve_cleared(sensor, value)
 
         except Exception as e:
+            db.session.rollback()
             print(f"Error checking alerts: {e}")
 
     def create_alert(self, sensor, alert_type, message, severity, threshold, actual_value):
         """Create an alert if one doesn't already exist for this condition"""
         try:
-            # Check if an unresolved alert already exists
-            existing_alert = Alert.query.filter_by(
-                sensor_id=sensor.id,
-                alert_type=alert_type,
-                is_resolved=False
-            ).first()
-
-            if not existing_alert:
-                alert = Alert(
-                    sensor_id=sensor.id,
-                    alert_type=alert_type,
-                    message=message,
-                    severity=severity,
-                    threshold_value=threshold,
-                    actual_value=actual_value,
-                    is_resolved=False
-                )
-                db.session.add(alert)
-                db.session.commit()
-                print(f"Created alert: {message}")
+            create_alert(sensor, alert_type, message, severity, threshold, actual_value)
+            self.app.extensions['alert_lifecycle'].opened(sensor.id, alert_type)
 
         except Exception as e:
+            db.session.rollback()
             print(f"Error creating alert: {e}")
 
     def publish(self, topic, payload):
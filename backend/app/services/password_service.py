@@ -0,0 +1,72 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import bcrypt
+
+
+class PasswordServiceBusy(Exception):
+    """Raised when too many password operations are already pending (login overload)"""
+
+
+class PasswordService:
+    """
+    bcrypt hashing and verification on a bounded dedicated executor
+
+    At most PASSWORD_HASH_WORKERS hashes run at once, so a login burst
+    cannot take every CPU from the rest of the API (bcrypt releases the
+    GIL). Up to PASSWORD_HASH_QUEUE more requests queue behind them;
+    beyond that PasswordServiceBusy is raised at once and the route
+    answers 503 instead of piling up. An admitted request without a result
+    after PASSWORD_HASH_WAIT seconds gets PasswordServiceBusy too (its
+    hash is cancelled if it has not started).
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.executor = None
+        self.slots = None
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize password service with Flask app"""
+        self.app = app
+        workers = app.config['PASSWORD_HASH_WORKERS']
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self.slots = threading.BoundedSemaphore(workers + app.config['PASSWORD_HASH_QUEUE'])
+        app.extensions['passwords'] = self
+
+    @property
+    def rounds(self):
+        return self.app.config['BCRYPT_ROUNDS']
+
+    def _run(self, func, *args):
+        if not self.slots.acquire(blocking=False):
+            raise PasswordServiceBusy('Too many password operations in progress')
+        try:
+            future = self.executor.submit(func, *args)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        try:
+            return future.result(timeout=self.app.config['PASSWORD_HASH_WAIT'])
+        except TimeoutError:
+            future.cancel()
+            raise PasswordServiceBusy('Password operation timed out') from None
+
+    def hash(self, password):
+        """bcrypt hash of a password with BCRYPT_ROUNDS"""
+        hashed = self._run(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(self.rounds))
+        return hashed.decode('utf-8')
+
+    def check(self, password, password_hash):
+        """Verify a password against a bcrypt hash"""
+        return self._run(bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+
+    def needs_rehash(self, password_hash):
+        """Whether a hash was made with another work factor than BCRYPT_ROUNDS"""
+        try:
+            return int(password_hash.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
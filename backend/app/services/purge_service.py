@@ -0,0 +1,124 @@
+from datetime import datetime
+from app.models import db, Sensor, SensorData, SensorDataRollup, SensorDataBlock, SensorDataSketch, Alert, DeviceKey, SensorAnomalyState, SensorLiveness, SensorDeletion, AlertArchive, SensorCacheVersion
+from app.services.job_service import job_handler, JobInterrupted
+
+# Tables holding a sensor's history, purged in this order before the sensor row
+PURGED_MODELS = (SensorData, SensorDataBlock, SensorDataRollup, SensorDataSketch, SensorAnomalyState, SensorLiveness, Alert, AlertArchive, DeviceKey, SensorCacheVersion)
+
+
+class SensorPurgeService:
+    """
+    Background deletion of sensors with large histories
+
+    DELETE /api/sensors/<id> only marks the sensor as 'deleting', records a
+    SensorDeletion and queues a sensor_purge job; the job worker then removes
+    its readings, blocks, rollups and alerts PURGE_CHUNK_SIZE rows at a time
+    (one short transaction per chunk, nothing loaded by the ORM) and finally
+    the sensor row itself.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize purge service with Flask app"""
+        self.app = app
+        app.extensions['sensor_purge'] = self
+
+    def request_deletion(self, sensor, requested_by=None):
+        """Mark a sensor as deleting and queue its purge; returns the SensorDeletion"""
+        deletion = SensorDeletion.query.filter(
+            SensorDeletion.sensor_id == sensor.id,
+            SensorDeletion.status.in_(['pending', 'running'])
+        ).first()
+        if deletion:
+            return deletion
+
+        sensor.status = 'deleting'
+        deletion = SensorDeletion(
+            sensor_id=sensor.id,
+            sensor_ref=sensor.sensor_id,
+            status='pending',
+            requested_by=requested_by
+        )
+        db.session.add(deletion)
+        db.session.flush()
+
+        job = self.app.extensions['jobs'].submit(
+            'sensor_purge', {'deletion_id': deletion.id}, priority=10, created_by=requested_by
+        )
+        deletion.job_id = job.id
+        db.session.commit()
+
+        # Unsealed readings of the sensor must not be written back (other
+        # processes drop theirs when they flush, see writable_sensor_ids)
+        self.app.extensions['block_storage'].discard(sensor.id)
+        self.app.extensions['sketches'].discard(sensor.id)
+        self.app.extensions['anomalies'].discard(sensor.id)
+        self.app.extensions['liveness'].discard(sensor.id)
+        self.app.extensions['result_cache'].discard(sensor.id)
+        self.app.extensions['alert_lifecycle'].discard(sensor.id)
+
+        return deletion
+
+    def purge(self, deletion, job):
+        """Delete a sensor's history chunk by chunk, then the sensor itself"""
+        chunk_size = self.app.config['PURGE_CHUNK_SIZE']
+        sensor_id = deletion.sensor_id
+
+        deletion.status = 'running'
+        if deletion.started_at is None:
+            deletion.started_at = datetime.utcnow()
+        if deletion.total_rows is None:
+            deletion.total_rows = sum(
+                db.session.query(model.id).filter(model.sensor_id == sensor_id).count()
+                for model in PURGED_MODELS
+            )
+        db.session.commit()
+
+        for model in PURGED_MODELS:
+            while True:
+                ids = [row.id for row in db.session.query(model.id)
+                       .filter(model.sensor_id == sensor_id).limit(chunk_size)]
+                if not ids:
+                    break
+                deleted = db.session.query(model).filter(model.id.in_(ids))\
+                    .delete(synchronize_session=False)
+                deletion.deleted_rows = (deletion.deleted_rows or 0) + deleted
+                db.session.commit()
+                # Nothing to checkpoint: the remaining rows are the state
+                job.update(progress=deletion.to_dict()['progress'],
+                           message=f"{deletion.deleted_rows} rows deleted")
+
+        db.session.query(Sensor).filter(Sensor.id == sensor_id).delete(synchronize_session=False)
+        deletion.status = 'completed'
+        deletion.finished_at = datetime.utcnow()
+        db.session.commit()
+        print(f"Sensor {deletion.sensor_ref} deleted ({deletion.deleted_rows} rows purged)")
+        return {'sensor_id': sensor_id, 'deleted_rows': deletion.deleted_rows}
+
+
+@job_handler('sensor_purge', submittable=False, cancellable=False)
+def run_sensor_purge(job):
+    """
+    Job: purge a sensor scheduled by DELETE /api/sensors/<id>
+
+    Not cancellable: the sensor is already hidden as 'deleting' and part
+    of its history may be gone, so the purge always runs to completion.
+    """
+    deletion = db.session.get(SensorDeletion, job.params['deletion_id'])
+    try:
+        return job.app.extensions['sensor_purge'].purge(deletion, job)
+    except JobInterrupted:
+        raise
+    except Exception as e:
+        if job.final_attempt:
+            db.session.rollback()
+            deletion.status = 'failed'
+            deletion.error = str(e)
+            deletion.finished_at = datetime.utcnow()
+            db.session.commit()
+        raise
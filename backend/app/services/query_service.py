@@ -0,0 +1,63 @@
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import select, func, extract, cast, Integer
+from app.models import db, SensorData
+
+# Columns of a reading, enough for SensorData.row_dict
+READING_COLUMNS = (SensorData.id, SensorData.sensor_id, SensorData.encrypted_value, SensorData.value,
+                   SensorData.unit, SensorData.timestamp)
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def select_readings(*columns):
+    """Core select of reading columns (all of READING_COLUMNS by default)"""
+    return select(*(columns or READING_COLUMNS))
+
+
+def stream_rows(statement, chunk_size=None):
+    """
+    Plain rows of a Core select, fetched READ_CHUNK_SIZE at a time
+
+    No ORM objects are built (no identity map or attribute instrumentation)
+    and PostgreSQL uses a server-side cursor, so memory stays bounded by the
+    chunk size whatever the number of rows read.
+    """
+    for partition in stream_chunks(statement, chunk_size):
+        yield from partition
+
+
+def stream_chunks(statement, chunk_size=None):
+    """Lists of at most READ_CHUNK_SIZE plain rows of a Core select (see stream_rows)"""
+    chunk_size = chunk_size or current_app.config['READ_CHUNK_SIZE']
+    result = db.session.execute(statement.execution_options(yield_per=chunk_size))
+    yield from result.partitions()
+
+
+def reading_value(encryption_service, row):
+    """Value of a reading row as a string: its plain column when stored, decrypted otherwise"""
+    if row.value is not None:
+        return str(row.value)
+    return encryption_service.decrypt(row.encrypted_value)
+
+
+def reading_number(encryption_service, row):
+    """Numeric value of a reading row (no decryption for plain values)"""
+    if row.value is not None:
+        return row.value
+    return float(encryption_service.decrypt(row.encrypted_value))
+
+
+def bucket_index(column, origin, seconds):
+    """
+    SQL expression of the `seconds`-wide bucket index of a timestamp
+    column counted from `origin` (whole seconds), or None when the
+    database has no implementation
+    """
+    dialect = db.session.get_bind(mapper=SensorData).dialect.name
+    origin = int((origin - EPOCH).total_seconds())
+    if dialect == 'postgresql':
+        return cast(func.floor((extract('epoch', column) - origin) / seconds), Integer)
+    if dialect == 'sqlite':
+        return (cast(func.strftime('%s', column), Integer) - origin) // seconds
+    return None
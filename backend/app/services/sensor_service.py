@@ -0,0 +1,246 @@
+from datetime import datetime
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql, sqlite
+from app.models import db, Sensor
+
+# Statuses a client may set (deleting is reserved to sensor deletion)
+SENSOR_STATUSES = ('active', 'inactive', 'maintenance', 'offline')
+
+# Editable columns and their maximum length (None: text)
+SENSOR_FIELDS = {'name': 100, 'type': 50, 'location': 200, 'status': 20, 'description': None}
+REQUIRED_FIELDS = ('name', 'type')
+
+# Dialects with INSERT ... ON CONFLICT
+UPSERT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+# Rows per INSERT statement (SQLite allows 32766 bound parameters)
+INSERT_CHUNK_SIZE = 1000
+
+
+def parse_sensor_fields(item, partial=False):
+    """
+    Editable fields of a sensor from a request item
+
+    Returns (fields, error); name and type are required unless
+    partial=True. Only the provided fields are returned.
+    """
+    fields = {}
+    for field, max_length in SENSOR_FIELDS.items():
+        if field not in item:
+            continue
+        value = item[field]
+        if value is not None and not isinstance(value, str):
+            return None, f"{field} must be a string"
+        if max_length and value and len(value) > max_length:
+            return None, f"{field} is longer than {max_length} characters"
+        fields[field] = value
+
+    if not partial:
+        if any(not fields.get(field) for field in REQUIRED_FIELDS):
+            return None, 'sensor_id, name, and type are required'
+    elif any(field in fields and not fields[field] for field in REQUIRED_FIELDS):
+        return None, 'name and type cannot be empty'
+    if 'status' in fields and fields['status'] not in SENSOR_STATUSES:
+        return None, f"status must be one of {', '.join(SENSOR_STATUSES)}"
+    return fields, None
+
+
+def parse_bulk_items(data, key, max_size):
+    """The list under `key` of a bulk request body; raises ValueError when invalid"""
+    if not isinstance(data, dict):
+        raise ValueError('Request body must be a JSON object')
+    items = data.get(key)
+    if not isinstance(items, list) or not items:
+        raise ValueError(f"{key} must be a non-empty list")
+    if len(items) > max_size:
+        raise ValueError(f"At most {max_size} {key} per request")
+    return items
+
+
+def _sensor_ref(item):
+    """Sensor reference (id or sensor_id) of an update item, or None"""
+    if not isinstance(item, dict):
+        return None
+    if isinstance(item.get('id'), int) and not isinstance(item.get('id'), bool):
+        return item['id']
+    if isinstance(item.get('sensor_id'), str) and item['sensor_id']:
+        return item['sensor_id']
+    return None
+
+
+def writable_sensor_ids(sensor_ids):
+    """
+    The ids among `sensor_ids` of sensors that still exist and are not
+    being deleted (one query). Writes and background flushes re-check with
+    it and drop the data of the others: sensor rows held in memory (or
+    cached) may be stale, the sensor deleted from another process.
+    """
+    if not sensor_ids:
+        return set()
+    return {sensor_id for (sensor_id,) in db.session.query(Sensor.id).filter(
+        Sensor.id.in_(set(sensor_ids)), Sensor.status != 'deleting')}
+
+
+def find_sensors(refs):
+    """{ref: (id, sensor_id, status)} for ids and sensor_id strings, one query per kind"""
+    ids = {ref for ref in refs if isinstance(ref, int)}
+    names = {ref for ref in refs if isinstance(ref, str)}
+    found = {}
+    columns = (Sensor.id, Sensor.sensor_id, Sensor.status)
+    if ids:
+        found.update((row.id, tuple(row)) for row in db.session.execute(db.select(*columns).where(Sensor.id.in_(ids))))
+    if names:
+        found.update((row.sensor_id, tuple(row)) for row in db.session.execute(
+            db.select(*columns).where(Sensor.sensor_id.in_(names))))
+    return found
+
+
+def bulk_create_sensors(items, upsert=False):
+    """
+    Create sensors in one transaction (upsert=True: update existing ones)
+
+    Duplicates are found with one query; rows are written with INSERT ...
+    ON CONFLICT (sensor_id), so a sensor created concurrently is reported
+    instead of failing the whole request. Sensors being deleted are never
+    updated. Returns one {index, sensor_id, result, id | error} per item.
+    """
+    results = [None] * len(items)
+    valid = {}  # sensor_id -> (index, fields)
+    for index, item in enumerate(items):
+        sensor_ref = item.get('sensor_id') if isinstance(item, dict) else None
+        if not isinstance(sensor_ref, str) or not sensor_ref or len(sensor_ref) > 100:
+            results[index] = {'index': index, 'sensor_id': sensor_ref, 'result': 'error',
+                              'error': 'sensor_id must be a string of at most 100 characters'}
+            continue
+        fields, error = parse_sensor_fields(item)
+        if error:
+            results[index] = {'index': index, 'sensor_id': sensor_ref, 'result': 'error', 'error': error}
+        elif sensor_ref in valid:
+            results[index] = {'index': index, 'sensor_id': sensor_ref, 'result': 'error',
+                              'error': 'Duplicate sensor_id in request'}
+        else:
+            valid[sensor_ref] = (index, fields)
+
+    existing = {sensor_ref: status for _, sensor_ref, status in find_sensors(set(valid)).values()}
+    rows = []
+    for sensor_ref, (index, fields) in valid.items():
+        if sensor_ref not in existing:
+            rows.append((sensor_ref, fields))
+        elif not upsert:
+            results[index] = {'index': index, 'sensor_id': sensor_ref, 'result': 'error', 'error': 'Sensor ID already exists'}
+        elif existing[sensor_ref] == 'deleting':
+            results[index] = {'index': index, 'sensor_id': sensor_ref, 'result': 'error', 'error': 'Sensor is being deleted'}
+        else:
+            rows.append((sensor_ref, fields))
+
+    dialect = db.session.get_bind(mapper=Sensor).dialect.name
+    if dialect not in UPSERT_INSERTS:
+        raise RuntimeError(f"Bulk sensor provisioning is not supported on {dialect}")
+    insert = UPSERT_INSERTS[dialect]
+
+    # One statement per set of provided fields, so an upsert only overwrites those
+    # (INSERT ... VALUES needs the same columns on every row)
+    now = datetime.utcnow()
+    groups = {}
+    for sensor_ref, fields in rows:
+        groups.setdefault(tuple(sorted(fields)), []).append({
+            'sensor_id': sensor_ref, 'status': 'active', 'created_at': now, 'updated_at': now, **fields
+        })
+
+    written = {}
+    for columns, values in groups.items():
+        for start in range(0, len(values), INSERT_CHUNK_SIZE):
+            statement = insert(Sensor).values(values[start:start + INSERT_CHUNK_SIZE])
+            if upsert:
+                statement = statement.on_conflict_do_update(
+                    index_elements=[Sensor.sensor_id],
+                    set_={**{column: statement.excluded[column] for column in columns}, 'updated_at': now},
+                    where=Sensor.status != 'deleting'
+                )
+            else:
+                statement = statement.on_conflict_do_nothing(index_elements=[Sensor.sensor_id])
+            for sensor_id, sensor_ref in db.session.execute(statement.returning(Sensor.id, Sensor.sensor_id)):
+                written[sensor_ref] = sensor_id
+    db.session.commit()
+
+    for sensor_ref, (index, fields) in valid.items():
+        if results[index]:
+            continue
+        if sensor_ref in written:
+            results[index] = {'index': index, 'sensor_id': sensor_ref, 'id': written[sensor_ref],
+                              'result': 'updated' if sensor_ref in existing else 'created'}
+        else:
+            # Created (or marked for deletion) by another request meanwhile
+            results[index] = {'index': index, 'sensor_id': sensor_ref, 'result': 'error',
+                              'error': 'Sensor is being deleted' if upsert else 'Sensor ID already exists'}
+    return results
+
+
+def bulk_update_sensors(items):
+    """
+    Update sensors identified by id or sensor_id in one transaction
+
+    Sensors are looked up with one query and written with one bulk UPDATE
+    by primary key; sensors being deleted are never updated. Returns one
+    {index, id, result | error} per item.
+    """
+    results = [None] * len(items)
+    sensors = find_sensors({ref for ref in map(_sensor_ref, items) if ref is not None})
+
+    rows = {}  # id -> (index, fields)
+    for index, item in enumerate(items):
+        ref = _sensor_ref(item)
+        if ref is None:
+            results[index] = {'index': index, 'result': 'error', 'error': 'id or sensor_id is required'}
+            continue
+        fields, error = parse_sensor_fields(item, partial=True)
+        sensor = sensors.get(ref)
+        if error is None and sensor is None:
+            error = 'Sensor not found'
+        elif error is None and sensor[2] == 'deleting':
+            error = 'Sensor is being deleted'
+        elif error is None and sensor[0] in rows:
+            error = 'Duplicate sensor in request'
+        if error:
+            results[index] = {'index': index, 'sensor_id': ref, 'result': 'error', 'error': error}
+            continue
+        rows[sensor[0]] = (index, fields)
+        results[index] = {'index': index, 'id': sensor[0], 'sensor_id': sensor[1], 'result': 'updated'}
+
+    now = datetime.utcnow()
+    changes = [{'id': sensor_id, 'updated_at': now, **fields} for sensor_id, (_, fields) in rows.items()]
+    if changes:
+        db.session.execute(update(Sensor).where(Sensor.status != 'deleting'), changes,
+                           execution_options={'synchronize_session': None})
+        # Marked for deletion by another request meanwhile: left untouched
+        for (sensor_id,) in db.session.query(Sensor.id).filter(Sensor.id.in_(rows), Sensor.status == 'deleting'):
+            index = rows[sensor_id][0]
+            results[index] = {'index': index, 'id': sensor_id, 'sensor_id': results[index]['sensor_id'],
+                              'result': 'error', 'error': 'Sensor is being deleted'}
+    db.session.commit()
+    return results
+
+
+def bulk_set_status(refs, status):
+    """Set the status of sensors (ids or sensor_id strings) with one UPDATE; one result per ref"""
+    refs = [ref if isinstance(ref, (int, str)) and not isinstance(ref, bool) else None for ref in refs]
+    sensors = find_sensors({ref for ref in refs if ref is not None})
+    results, ids = [], set()
+    for index, ref in enumerate(refs):
+        sensor = sensors.get(ref) if ref is not None else None
+        if sensor is None:
+            results.append({'index': index, 'sensor_id': ref, 'result': 'error', 'error': 'Sensor not found'})
+        elif sensor[2] == 'deleting':
+            results.append({'index': index, 'sensor_id': ref, 'result': 'error', 'error': 'Sensor is being deleted'})
+        else:
+            ids.add(sensor[0])
+            results.append({'index': index, 'id': sensor[0], 'sensor_id': sensor[1], 'result': 'updated'})
+
+    if ids:
+        db.session.execute(
+            update(Sensor).where(Sensor.id.in_(ids), Sensor.status != 'deleting')
+            .values(status=status, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+    return results
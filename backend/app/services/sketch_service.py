@@ -0,0 +1,315 @@
+import atexit
+import math
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from app.models import db, Sensor, SensorData, SensorDataBlock, SensorDataSketch
+from app.models.routing import use_bind, INGEST_BIND
+from app.services.job_service import job_handler
+from app.services.query_service import reading_number
+from app.services.sensor_service import writable_sensor_ids
+from app.utils.encryption import EncryptionService
+from app.utils.sketch import DDSketch
+
+
+def sketch_bucket(timestamp):
+    """Hourly bucket of a reading"""
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+class SketchService:
+    """
+    Per-sensor hourly quantile sketches, updated at ingest
+
+    Readings are added to in-memory sketches, merged into the
+    sensor_data_sketches rows every SKETCH_FLUSH_INTERVAL seconds (and on
+    shutdown). Percentile queries merge one sketch per hour of the range,
+    so their cost does not depend on the number of readings.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.encryption_service = None
+        self.buffers = {}  # (sensor_id, bucket_start) -> [DDSketch, unit, first timestamp]
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stop_event = threading.Event()
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize sketch service with Flask app"""
+        self.app = app
+        self.encryption_service = EncryptionService.from_config(app.config)
+        app.extensions['sketches'] = self
+
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config.get('SKETCH_ENABLED', True)
+
+    def new_sketch(self):
+        return DDSketch(self.app.config['SKETCH_RELATIVE_ACCURACY'])
+
+    def start(self):
+        """Flush in-memory sketches every SKETCH_FLUSH_INTERVAL seconds"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._loop, name='sketch-flush', daemon=True)
+        self.thread.start()
+        atexit.register(self.flush)
+
+    def _loop(self):
+        while not self.stop_event.wait(self.app.config['SKETCH_FLUSH_INTERVAL']):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing sketches: {e}")
+
+    def add(self, sensor_id, timestamp, value, unit=None):
+        """Count a reading in its sensor's hourly sketch"""
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return
+        if not math.isfinite(value):
+            return
+        key = (sensor_id, sketch_bucket(timestamp))
+        # Millisecond precision, as block storage keeps the reading
+        timestamp = timestamp.replace(microsecond=timestamp.microsecond // 1000 * 1000)
+        with self.lock:
+            entry = self.buffers.get(key)
+            if entry is None:
+                entry = self.buffers[key] = [self.new_sketch(), unit, timestamp]
+            entry[0].add(value)
+            entry[2] = min(entry[2], timestamp)
+
+    def discard(self, sensor_id):
+        """Drop the unflushed sketches of a sensor (sensor deletion)"""
+        with self.lock:
+            self.buffers = {key: entry for key, entry in self.buffers.items() if key[0] != sensor_id}
+
+    def flush(self):
+        """Merge in-memory sketches into the database"""
+        with self.lock:
+            pending, self.buffers = self.buffers, {}
+        if not pending:
+            return
+        with self.app.app_context(), use_bind(INGEST_BIND):
+            try:
+                failed = self.merge_into_db(pending)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Failed to flush sketches, will retry: {e}")
+                failed = pending
+            finally:
+                db.session.remove()
+        if failed:
+            with self.lock:
+                for key, (sketch, unit, first) in failed.items():
+                    entry = self.buffers.get(key)
+                    if entry:
+                        sketch.merge(entry[0])
+                        first = min(first, entry[2])
+                    self.buffers[key] = [sketch, unit, first]
+
+    def merge_into_db(self, sketches, attempts=3):
+        """
+        Merge {(sensor_id, bucket_start): (DDSketch, unit, first timestamp)}
+        into stored sketches; a first timestamp of None marks a sketch of
+        every reading of the hour (backfill)
+
+        Sketches of sensors missing or being deleted (purged from any
+        process) are dropped. When the single commit fails, sensors are
+        merged one by one, so one failing sensor does not hold back the
+        others. Returns the sketches that could not be written.
+        """
+        by_sensor = {}
+        for (sensor_id, bucket), entry in sketches.items():
+            by_sensor.setdefault(sensor_id, {})[bucket] = entry
+        try:
+            self._merge_sensors(by_sensor, attempts)
+            return {}
+        except Exception as e:
+            db.session.rollback()
+            if len(by_sensor) == 1:
+                print(f"Failed to merge sketches: {e}")
+                return dict(sketches)
+            print(f"Failed to merge sketches, retrying sensor by sensor: {e}")
+
+        failed = {}
+        for sensor_id, buckets in by_sensor.items():
+            try:
+                self._merge_sensors({sensor_id: buckets}, attempts)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Failed to merge the sketches of sensor {sensor_id}: {e}")
+                failed.update(((sensor_id, bucket), entry) for bucket, entry in buckets.items())
+        return failed
+
+    def _merge_sensors(self, by_sensor, attempts):
+        """Merge {sensor_id: {bucket_start: entry}} in one transaction"""
+        for attempt in range(attempts):
+            try:
+                for sensor_id in writable_sensor_ids(by_sensor):
+                    buckets = by_sensor[sensor_id]
+                    existing = {
+                        row.bucket_start: row
+                        for row in SensorDataSketch.query.filter(
+                            SensorDataSketch.sensor_id == sensor_id,
+                            SensorDataSketch.bucket_start.in_(list(buckets))
+                        ).with_for_update()
+                    }
+                    for bucket, (sketch, unit, first) in buckets.items():
+                        row = existing.get(bucket)
+                        if row:
+                            sketch = self.decrypt(row).merge(sketch)
+                            if row.first_timestamp is None or first is None:
+                                first = None
+                            else:
+                                first = min(row.first_timestamp, first)
+                        else:
+                            row = SensorDataSketch(sensor_id=sensor_id, bucket_start=bucket, unit=unit)
+                            db.session.add(row)
+                        row.first_timestamp = first
+                        row.count = sketch.count
+                        row.encrypted_sketch = self.encryption_service.encrypt(sketch.to_json())
+                db.session.commit()
+                return
+            except IntegrityError:
+                # Another process created one of the buckets first: merge into it
+                db.session.rollback()
+                if attempt == attempts - 1:
+                    raise
+
+    def decrypt(self, row):
+        return DDSketch.from_json(self.encryption_service.decrypt(row.encrypted_sketch))
+
+    def query(self, sensor_id, start, end):
+        """Merged sketch of the hours overlapping [start, end] and the number of buckets read"""
+        merged = self.new_sketch()
+        buckets = 0
+        rows = SensorDataSketch.query.filter(
+            SensorDataSketch.sensor_id == sensor_id,
+            SensorDataSketch.bucket_start >= sketch_bucket(start),
+            SensorDataSketch.bucket_start <= end
+        )
+        for row in rows:
+            try:
+                merged.merge(self.decrypt(row))
+                buckets += 1
+            except Exception as e:
+                print(f"Failed to decrypt sketch {row.id}: {e}")
+
+        # Readings not flushed yet by this process
+        with self.lock:
+            unflushed = [sketch for (sid, bucket), (sketch, _, _) in self.buffers.items()
+                         if sid == sensor_id and sketch_bucket(start) <= bucket <= end]
+        for sketch in unflushed:
+            merged.merge(sketch)
+        return merged, buckets
+
+
+def _first_reading_after(sensor_id, after):
+    """Timestamp of the sensor's first raw reading or block at/after `after`, or None"""
+    candidates = [
+        db.session.query(func.min(SensorData.timestamp))
+        .filter(SensorData.sensor_id == sensor_id, SensorData.timestamp >= after).scalar(),
+        db.session.query(func.min(SensorDataBlock.start_time))
+        .filter(SensorDataBlock.sensor_id == sensor_id, SensorDataBlock.end_time >= after).scalar()
+    ]
+    candidates = [max(candidate, after) for candidate in candidates if candidate is not None]
+    return min(candidates) if candidates else None
+
+
+@job_handler('sketch_backfill')
+def run_sketch_backfill(job):
+    """
+    Job: build the hourly sketches of existing raw readings and blocks
+
+    Works sensor by sensor, one day of readings at a time. Hours already
+    fed by ingestion only get the readings older than their first
+    ingested one, so no reading is counted twice. Optional params:
+    sensor_id.
+    """
+    service = job.app.extensions['sketches']
+    # Hours that ended less than two flush intervals ago may still have
+    # unflushed ingest buffers in some process: they are left to ingestion
+    until = sketch_bucket(datetime.utcnow() - timedelta(seconds=2 * job.app.config['SKETCH_FLUSH_INTERVAL']))
+    checkpoint = job.checkpoint or {'sensor_id': 0, 'day': None, 'buckets': 0}
+
+    query = db.session.query(Sensor.id).filter(Sensor.id >= checkpoint['sensor_id']).order_by(Sensor.id)
+    if job.params.get('sensor_id'):
+        query = query.filter(Sensor.id == job.params['sensor_id'])
+    sensor_ids = [row.id for row in query]
+
+    for index, sensor_id in enumerate(sensor_ids):
+        day = None
+        if sensor_id == checkpoint['sensor_id'] and checkpoint['day']:
+            day = datetime.fromisoformat(checkpoint['day'])
+
+        while True:
+            first = _first_reading_after(sensor_id, day or datetime.min)
+            if first is None or first >= until:
+                break
+            day = sketch_bucket(first).replace(hour=0)
+            day_end = min(day + timedelta(days=1), until)
+
+            # Hours fed by ingestion -> their first ingested reading (None: complete)
+            counted = dict(db.session.query(SensorDataSketch.bucket_start, SensorDataSketch.first_timestamp).filter(
+                SensorDataSketch.sensor_id == sensor_id,
+                SensorDataSketch.bucket_start >= day,
+                SensorDataSketch.bucket_start < day_end
+            ).all())
+            sketches = {}
+
+            def add(timestamp, value, unit):
+                if not math.isfinite(value):
+                    return
+                bucket = sketch_bucket(timestamp)
+                if bucket in counted and (counted[bucket] is None or timestamp >= counted[bucket]):
+                    return
+                key = (sensor_id, bucket)
+                if key not in sketches:
+                    sketches[key] = (service.new_sketch(), unit, None)
+                sketches[key][0].add(value)
+
+            rows = db.session.query(SensorData.encrypted_value, SensorData.value, SensorData.unit, SensorData.timestamp).filter(
+                SensorData.sensor_id == sensor_id,
+                SensorData.timestamp >= day,
+                SensorData.timestamp < day_end
+            )
+            for row in rows:
+                try:
+                    add(row.timestamp, reading_number(service.encryption_service, row), row.unit)
+                except Exception:
+                    continue
+
+            blocks = SensorDataBlock.query.filter(
+                SensorDataBlock.sensor_id == sensor_id,
+                SensorDataBlock.end_time >= day,
+                SensorDataBlock.start_time < day_end
+            )
+            for block in blocks:
+                try:
+                    points = job.app.extensions['block_storage'].decode(block)
+                except Exception:
+                    continue
+                for timestamp, value in points:
+                    if day <= timestamp < day_end:
+                        add(timestamp, value, block.unit)
+
+            if sketches:
+                if service.merge_into_db(sketches):
+                    raise RuntimeError(f"Failed to write the sketches of sensor {sensor_id}")
+                job.app.extensions['result_cache'].discard(sensor_id)
+            checkpoint['buckets'] += len(sketches)
+
+            day = day_end
+            checkpoint.update({'sensor_id': sensor_id, 'day': day.isoformat()})
+            job.update(progress=100.0 * index / len(sensor_ids), checkpoint=checkpoint,
+                       message=f"{checkpoint['buckets']} hourly sketches built")
+
+    return {'buckets': checkpoint['buckets']}
@@ -0,0 +1,78 @@
+from datetime import timedelta
+import numpy
+
+AGGREGATES = ('avg', 'min', 'max', 'sum', 'count')
+
+
+class TimeGrid:
+    """
+    count / sum / min / max per (time bucket, column) over a fixed range
+
+    Buckets are `interval` wide from `origin`. Readings are added chunk by
+    chunk as parallel arrays; bucket indexes and accumulation are
+    vectorized (bincount and ufunc.at over a flat bucket * columns index).
+    """
+
+    def __init__(self, origin, interval, buckets, columns):
+        self.origin = origin
+        self.interval = interval
+        self.buckets = buckets
+        self.columns = columns
+        size = buckets * columns
+        self.count = numpy.zeros(size)
+        self.sum = numpy.zeros(size)
+        self.min = numpy.full(size, numpy.inf)
+        self.max = numpy.full(size, -numpy.inf)
+
+    def bucket_starts(self):
+        return [self.origin + i * self.interval for i in range(self.buckets)]
+
+    def add(self, columns, timestamps, values, counts=None, mins=None, maxs=None):
+        """
+        Accumulate points: column indexes, timestamps and values (None or
+        NaN are skipped). Aggregated points (rollups) pass values as sums
+        with their counts, mins and maxs.
+        """
+        if not timestamps:
+            return
+
+        values = numpy.array(values, dtype=float)
+        offsets = numpy.array(timestamps, dtype='datetime64[us]') - numpy.datetime64(self.origin, 'us')
+        buckets = offsets // numpy.timedelta64(self.interval)
+        keep = (buckets >= 0) & (buckets < self.buckets) & ~numpy.isnan(values)
+        index = (buckets * self.columns + numpy.array(columns))[keep].astype(numpy.int64)
+        values = values[keep]
+
+        size = len(self.count)
+        counts = numpy.array(counts, dtype=float)[keep] if counts is not None else None
+        self.count += numpy.bincount(index, weights=counts, minlength=size)
+        self.sum += numpy.bincount(index, weights=values, minlength=size)
+        numpy.minimum.at(self.min, index, numpy.array(mins, dtype=float)[keep] if mins is not None else values)
+        numpy.maximum.at(self.max, index, numpy.array(maxs, dtype=float)[keep] if maxs is not None else values)
+
+    def matrix(self, aggregate):
+        """One row per bucket, one value per column; None marks a bucket without data"""
+        empty = self.count == 0
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            values = {
+                'avg': lambda: self.sum / self.count,
+                'min': lambda: self.min,
+                'max': lambda: self.max,
+                'sum': lambda: self.sum,
+                'count': lambda: self.count
+            }[aggregate]()
+        values = numpy.where(empty, numpy.nan, values).reshape(self.buckets, self.columns).tolist()
+        cast = int if aggregate == 'count' else float
+        return [[None if value != value else cast(value) for value in row] for row in values]
+
+    def missing(self):
+        """Number of buckets without data, per column"""
+        return (self.count.reshape(self.buckets, self.columns) == 0).sum(axis=0).tolist()
+
+
+def align_origin(start, interval):
+    """Start of the `interval` bucket containing `start` (buckets aligned on the epoch)"""
+    seconds = int(interval.total_seconds())
+    epoch = start.replace(year=1970, month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+    elapsed = int((start - epoch).total_seconds())
+    return epoch + timedelta(seconds=elapsed - elapsed % seconds)
@@ -0,0 +1,87 @@
+"""
+Streaming anomaly detection with constant state per sensor
+
+Each sensor keeps an exponentially weighted mean and variance of its
+values (and of the change between consecutive readings) plus a counter of
+identical readings. A reading is checked against the state before being
+added to it, so its cost is a handful of float operations.
+"""
+
+import math
+
+# Alert types raised by the detector
+OUTLIER = 'anomaly_outlier'  # Far from the recent mean (EWMA z-score)
+JUMP = 'anomaly_jump'  # Sudden change between two consecutive readings
+STUCK = 'anomaly_stuck'  # Same value repeated (flatline, frozen sensor)
+
+
+class AnomalyState:
+    """EWMA statistics of one sensor (fixed size, serializable as a list)"""
+
+    __slots__ = ('count', 'mean', 'var', 'delta_var', 'last', 'repeats')
+
+    def __init__(self, count=0, mean=0.0, var=0.0, delta_var=0.0, last=None, repeats=0):
+        self.count = count
+        self.mean = mean
+        self.var = var
+        self.delta_var = delta_var
+        self.last = last
+        self.repeats = repeats
+
+    def to_list(self):
+        return [self.count, self.mean, self.var, self.delta_var, self.last, self.repeats]
+
+    @classmethod
+    def from_list(cls, values):
+        return cls(*values)
+
+
+class AnomalyDetector:
+    """
+    Per-reading checks: z-score against the EWMA mean, z-score of the change
+    since the previous reading, and repeated identical values
+
+    Nothing is reported during the first `warmup` readings of a sensor.
+    Deviations are measured against at least 1% of the mean, so a sensor
+    that was perfectly flat does not flag every small variation.
+    """
+
+    def __init__(self, alpha=0.05, warmup=30, z_threshold=4.0, jump_threshold=6.0, stuck_count=30):
+        self.alpha = alpha
+        self.warmup = warmup
+        self.z_threshold = z_threshold
+        self.jump_threshold = jump_threshold
+        self.stuck_count = stuck_count
+
+    def _scale(self, variance, mean):
+        return max(math.sqrt(variance), 0.01 * abs(mean), 1e-9)
+
+    def update(self, state, value):
+        """Add a value to a sensor's state; returns [(alert type, baseline)] for the anomalies it shows"""
+        anomalies = []
+        alpha = self.alpha
+
+        if state.count == 0:
+            state.mean = value
+        else:
+            delta = value - state.last
+            if state.count >= self.warmup:
+                if abs(value - state.mean) > self.z_threshold * self._scale(state.var, state.mean):
+                    anomalies.append((OUTLIER, state.mean))
+                if abs(delta) > self.jump_threshold * self._scale(state.delta_var, state.mean):
+                    anomalies.append((JUMP, state.last))
+
+            state.repeats = state.repeats + 1 if delta == 0 else 0
+            if state.repeats + 1 == self.stuck_count:
+                anomalies.append((STUCK, value))
+
+            # Exponentially weighted mean / variance (West's incremental form)
+            diff = value - state.mean
+            increment = alpha * diff
+            state.mean += increment
+            state.var = (1 - alpha) * (state.var + diff * increment)
+            state.delta_var = (1 - alpha) * state.delta_var + alpha * delta * delta
+
+        state.count += 1
+        state.last = value
+        return anomalies
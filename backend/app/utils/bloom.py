@@ -0,0 +1,68 @@
+"""
+Bloom filters for duplicate suppression
+
+A Bloom filter answers "definitely not seen" or "maybe seen" with a fixed
+number of bits per key: no false negatives, and false positives at a rate
+set by its size. The rotating variant keeps two generations so keys are
+remembered for one to two time windows in bounded memory.
+"""
+
+import hashlib
+import math
+import time
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter of strings sized for `capacity` keys at `error_rate` false positives"""
+
+    def __init__(self, capacity, error_rate=0.0001):
+        self.capacity = capacity
+        self.size = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RotatingBloomFilter:
+    """
+    Two-generation Bloom filter: keys added during the current window are
+    checked against it and the previous one; a full or expired generation
+    becomes the previous one and a new one starts.
+    """
+
+    def __init__(self, capacity, error_rate=0.0001, window=3600):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.window = window
+        self.current = None
+        self.previous = None
+        self.started = None
+
+    def _rotate(self, now):
+        if self.current is None or now - self.started >= self.window or self.current.count >= self.capacity:
+            self.previous = self.current
+            self.current = BloomFilter(self.capacity, self.error_rate)
+            self.started = now
+
+    def check_and_add(self, keys):
+        """True when any of the keys may have been added before; adds them all"""
+        self._rotate(time.monotonic())
+        seen = any(key in self.current or (self.previous is not None and key in self.previous) for key in keys)
+        for key in keys:
+            self.current.add(key)
+        return seen
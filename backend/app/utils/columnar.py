@@ -0,0 +1,41 @@
+try:
+    import pyarrow
+except ImportError:  # pyarrow is optional, only needed for format=arrow
+    pyarrow = None
+
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+
+def series_to_arrow(series):
+    """
+    Arrow IPC stream of columnar series (format=arrow)
+
+    One record batch per series with sensor_id, timestamp (ms), value and,
+    for rollups, min / max / count columns; the unit is stored once in the
+    batch schema metadata.
+    """
+    if pyarrow is None:
+        raise RuntimeError('pyarrow is not installed')
+
+    schema = pyarrow.schema([
+        ('sensor_id', pyarrow.int32()),
+        ('timestamp', pyarrow.timestamp('ms')),
+        ('value', pyarrow.float64()),
+        ('min', pyarrow.float64()),
+        ('max', pyarrow.float64()),
+        ('count', pyarrow.int64())
+    ])
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, schema) as writer:
+        for entry in series:
+            size = len(entry['timestamps'])
+            batch = pyarrow.record_batch([
+                pyarrow.array([entry['sensor_id']] * size, pyarrow.int32()),
+                pyarrow.array(entry['timestamps'], pyarrow.int64()).cast(pyarrow.timestamp('ms')),
+                pyarrow.array(entry['values'], pyarrow.float64()),
+                pyarrow.array(entry.get('min', [None] * size), pyarrow.float64()),
+                pyarrow.array(entry.get('max', [None] * size), pyarrow.float64()),
+                pyarrow.array(entry.get('count', [None] * size), pyarrow.int64())
+            ], schema=schema.with_metadata({'sensor_id': str(entry['sensor_id']), 'unit': entry['unit'] or ''}))
+            writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
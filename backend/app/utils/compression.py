@@ -0,0 +1,88 @@
+import gzip
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, gzip is used instead
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/csv', 'text/plain', 'text/html',
+                          'application/vnd.apache.arrow.stream'}
+
+
+def _accepted_encodings(header):
+    """{encoding: q} from an Accept-Encoding header"""
+    accepted = {}
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    return accepted
+
+
+class ResponseCompressor:
+    """
+    Negotiated gzip / brotli compression of responses (COMPRESSION_ENABLED)
+
+    Responses of a compressible type larger than COMPRESSION_MIN_SIZE bytes
+    are compressed with the best encoding the client accepts (brotli when
+    the Brotli package is installed, else gzip).
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize response compression with Flask app"""
+        self.app = app
+        if app.config.get('COMPRESSION_ENABLED', True):
+            app.after_request(self._after_request)
+
+    def choose_encoding(self, accept_encoding):
+        accepted = _accepted_encodings(accept_encoding or '')
+        candidates = ['br', 'gzip'] if brotli is not None else ['gzip']
+        wildcard = accepted.get('*', 0.0)
+        best, best_q = None, 0.0
+        for encoding in candidates:
+            q = accepted.get(encoding, wildcard)
+            if q > best_q:
+                best, best_q = encoding, q
+        return best
+
+    def compress(self, data, encoding):
+        config = self.app.config
+        if encoding == 'br':
+            return brotli.compress(data, quality=config['COMPRESSION_BROTLI_QUALITY'])
+        return gzip.compress(data, compresslevel=config['COMPRESSION_GZIP_LEVEL'], mtime=0)
+
+    def _after_request(self, response):
+        response.vary.add('Accept-Encoding')
+
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code < 200 or response.status_code >= 300
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        data = response.get_data()
+        if len(data) < self.app.config['COMPRESSION_MIN_SIZE']:
+            return response
+
+        encoding = self.choose_encoding(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+
+        response.set_data(self.compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        return response
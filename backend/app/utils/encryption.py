@@ -3,14 +3,49 @@ from Crypto.Random import get_random_bytes
 from Crypto.Util.Padding import pad, unpad
 import base64
 
+# Separates the key ID from the base64 payload ("k2:<base64>"); never part of base64
+KEY_ID_SEPARATOR = ':'
+
 class EncryptionService:
-    """Service for AES-256 encryption/decryption"""
+    """
+    Service for AES-256 encryption/decryption
+
+    Supports a keyring: new data is encrypted with the active key and
+    prefixed with its key ID, so records encrypted with different keys can
+    coexist (and be re-encrypted progressively). Records without a key ID
+    were written before the keyring existed and use the legacy key.
+    """
 
-    def __init__(self, key):
+    def __init__(self, key, keyring=None, active_key_id=None):
         """
         Initialize encryption service with a key
         Key should be 32 bytes for AES-256
+
+        keyring maps key IDs to keys; active_key_id selects the key used
+        for new data (legacy unprefixed format when not set).
         """
+        self.key = self._normalize_key(key)
+        self.keys = {}
+        for key_id, keyring_key in (keyring or {}).items():
+            if not key_id or KEY_ID_SEPARATOR in key_id:
+                raise ValueError(f"Invalid encryption key ID: {key_id!r}")
+            self.keys[key_id] = self._normalize_key(keyring_key)
+
+        if active_key_id and active_key_id not in self.keys:
+            raise ValueError(f"Active encryption key ID {active_key_id!r} is not in the keyring")
+        self.active_key_id = active_key_id or None
+
+    @classmethod
+    def from_config(cls, config):
+        """Encryption service for ENCRYPTION_KEY, ENCRYPTION_KEYS and ENCRYPTION_KEY_ID"""
+        return cls(
+            config['ENCRYPTION_KEY'],
+            keyring=config.get('ENCRYPTION_KEYS'),
+            active_key_id=config.get('ENCRYPTION_KEY_ID')
+        )
+
+    @staticmethod
+    def _normalize_key(key):
         if isinstance(key, str):
             # Ensure key is exactly 32 bytes
             key = key.encode('utf-8')
@@ -18,7 +53,21 @@ class EncryptionService:
                 key = key.ljust(32, b'\0')
             elif len(key) > 32:
                 key = key[:32]
-        self.key = key
+        return key
+
+    @staticmethod
+    def key_id_of(encrypted_data):
+        """Key ID of an encrypted record (None for the legacy format)"""
+        key_id, separator, _ = encrypted_data.partition(KEY_ID_SEPARATOR)
+        return key_id if separator else None
+
+    def needs_rotation(self, encrypted_data):
+        """True when a record is not encrypted with the active key"""
+        return self.key_id_of(encrypted_data) != self.active_key_id
+
+    def rotate(self, encrypted_data):
+        """Re-encrypt a record with the active key"""
+        return self.encrypt(self.decrypt_bytes(encrypted_data))
 
     def encrypt(self, plaintext):
         """
@@ -34,16 +83,19 @@ class EncryptionService:
         # Generate random IV
         iv = get_random_bytes(AES.block_size)
 
-        # Create cipher
-        cipher = AES.new(self.key, AES.MODE_CBC, iv)
+        # Create cipher with the active key
+        key = self.keys[self.active_key_id] if self.active_key_id else self.key
+        cipher = AES.new(key, AES.MODE_CBC, iv)
 
         # Pad and encrypt
         padded_data = pad(plaintext, AES.block_size)
         ciphertext = cipher.encrypt(padded_data)
 
         # Combine IV and ciphertext, then encode to base64
-        encrypted_data = iv + ciphertext
-        return base64.b64encode(encrypted_data).decode('utf-8')
+        encrypted_data = base64.b64encode(iv + ciphertext).decode('utf-8')
+        if self.active_key_id:
+            return f"{self.active_key_id}{KEY_ID_SEPARATOR}{encrypted_data}"
+        return encrypted_data
 
     def decrypt(self, encrypted_data):
         """
@@ -51,7 +103,24 @@ class EncryptionService:
         Input should be base64 encoded string
         Returns decrypted plaintext as string
         """
+        return self.decrypt_bytes(encrypted_data).decode('utf-8')
+
+    def decrypt_bytes(self, encrypted_data):
+        """
+        Decrypt encrypted data
+        Input should be base64 encoded string
+        Returns decrypted plaintext as bytes (for binary payloads)
+        """
         try:
+            # Select the key from the key ID prefix (legacy key without one)
+            key = self.key
+            key_id, separator, payload = encrypted_data.partition(KEY_ID_SEPARATOR)
+            if separator:
+                if key_id not in self.keys:
+                    raise ValueError(f"unknown key ID {key_id!r}")
+                key = self.keys[key_id]
+                encrypted_data = payload
+
             # Decode from base64
             encrypted_bytes = base64.b64decode(encrypted_data)
 
@@ -60,12 +129,10 @@ class EncryptionService:
             ciphertext = encrypted_bytes[AES.block_size:]
 
             # Create cipher
-            cipher = AES.new(self.key, AES.MODE_CBC, iv)
+            cipher = AES.new(key, AES.MODE_CBC, iv)
 
             # Decrypt and unpad
             padded_plaintext = cipher.decrypt(ciphertext)
-            plaintext = unpad(padded_plaintext, AES.block_size)
-
-            return plaintext.decode('utf-8')
+            return unpad(padded_plaintext, AES.block_size)
         except Exception as e:
             raise ValueError(f"Decryption failed: {str(e)}")
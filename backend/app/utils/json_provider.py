@@ -0,0 +1,79 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the standard library is used instead
+    orjson = None
+
+
+def _default(value):
+    """Types the encoders do not handle natively"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider using orjson when installed (JSON_PROVIDER=orjson)
+
+    Datetimes are encoded natively as ISO 8601 (same output as isoformat()),
+    so models can return datetime objects instead of formatting every
+    timestamp in Python. Falls back to the standard json module with the
+    same datetime handling when orjson is missing.
+    """
+    sort_keys = False
+    compact = True
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        kwargs.setdefault('default', _default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('separators', (',', ':'))
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if orjson is not None:
+            data = orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        else:
+            data = self.dumps(obj)
+        return self._app.response_class(data, mimetype=self.mimetype)
+
+
+class StdlibJSONProvider(FastJSONProvider):
+    """Same encoding as FastJSONProvider with the standard json module (JSON_PROVIDER=json)"""
+
+    def dumps(self, obj, **kwargs):
+        kwargs.setdefault('default', _default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('separators', (',', ':'))
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps(obj), mimetype=self.mimetype)
+
+
+JSON_PROVIDERS = {
+    'orjson': FastJSONProvider,
+    'json': StdlibJSONProvider
+}
@@ -0,0 +1,183 @@
+import cProfile
+import io
+import os
+import pstats
+import random
+import time
+from datetime import datetime
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    from pyinstrument import Profiler as PyinstrumentProfiler
+except ImportError:  # pyinstrument is optional
+    PyinstrumentProfiler = None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """Remember when a statement started (stack for nested executes)"""
+    conn.info.setdefault('profiling_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """Record statement duration in the current request profile"""
+    starts = conn.info.get('profiling_query_start')
+    if not starts:
+        return
+    elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+
+    # Only requests are profiled (MQTT thread has no request context)
+    if not has_request_context():
+        return
+    profile = g.get('_request_profile')
+    if profile is None:
+        return
+
+    profile['sql_count'] += 1
+    profile['sql_time_ms'] += elapsed_ms
+    profile['statements'].append((elapsed_ms, statement))
+
+    slow_query_ms = profile['slow_query_ms']
+    if slow_query_ms and elapsed_ms >= slow_query_ms:
+        print(f"[profiling] Slow query ({elapsed_ms:.1f} ms) on {request.method} {request.path}: "
+              f"{' '.join(statement.split())}")
+
+
+class RequestProfiler:
+    """
+    Opt-in request profiler (PROFILING_ENABLED)
+
+    For every request it records the number of SQL statements, the total
+    database time and the slowest statements, and exposes them as
+    X-Profile-* response headers. Requests slower than
+    PROFILING_SLOW_REQUEST_MS are logged with their slowest statements.
+
+    Add ?_profile=sql to a JSON request to get a `_debug` payload with the
+    slowest statements, or ?_profile=cpu to capture a CPU profile of that
+    single request (cProfile, or pyinstrument when installed and selected).
+    PROFILING_SAMPLE_RATE captures CPU profiles for a random share of requests.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Install SQL listeners and request hooks when profiling is enabled"""
+        self.app = app
+
+        if not app.config.get('PROFILING_ENABLED'):
+            return
+
+        # Listen on the Engine class so every engine (primary, binds) is covered
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+        print("Request profiling enabled")
+
+    def before_request(self):
+        """Start collecting metrics for the current request"""
+        config = self.app.config
+        mode = request.args.get('_profile')
+
+        g._request_profile = {
+            'start': time.perf_counter(),
+            'sql_count': 0,
+            'sql_time_ms': 0.0,
+            'statements': [],
+            'slow_query_ms': config.get('PROFILING_SLOW_QUERY_MS'),
+            'mode': mode,
+            'cpu_profiler': None
+        }
+
+        sample_rate = config.get('PROFILING_SAMPLE_RATE', 0)
+        if mode == 'cpu' or (sample_rate and random.random() < sample_rate):
+            g._request_profile['cpu_profiler'] = self._start_cpu_profiler()
+
+    def after_request(self, response):
+        """Attach metrics to the response and log slow requests"""
+        profile = g.pop('_request_profile', None)
+        if profile is None:
+            return response
+
+        config = self.app.config
+        elapsed_ms = (time.perf_counter() - profile['start']) * 1000
+        slowest = sorted(profile['statements'], key=lambda s: s[0], reverse=True)
+        slowest = slowest[:config.get('PROFILING_TOP_QUERIES', 5)]
+
+        response.headers['X-Profile-Request-Time-Ms'] = f"{elapsed_ms:.2f}"
+        response.headers['X-Profile-SQL-Count'] = str(profile['sql_count'])
+        response.headers['X-Profile-SQL-Time-Ms'] = f"{profile['sql_time_ms']:.2f}"
+
+        cpu_report = None
+        if profile['cpu_profiler'] is not None:
+            cpu_file, cpu_report = self._stop_cpu_profiler(profile['cpu_profiler'])
+            response.headers['X-Profile-File'] = cpu_file
+
+        if elapsed_ms >= config.get('PROFILING_SLOW_REQUEST_MS', 500):
+            print(f"[profiling] Slow request: {request.method} {request.full_path.rstrip('?')} "
+                  f"{response.status_code} in {elapsed_ms:.1f} ms "
+                  f"({profile['sql_count']} queries, {profile['sql_time_ms']:.1f} ms SQL)")
+            for duration, statement in slowest:
+                print(f"[profiling]   {duration:.1f} ms  {' '.join(statement.split())}")
+
+        if profile['mode'] in ('sql', 'cpu') and response.is_json and not response.direct_passthrough:
+            payload = response.get_json(silent=True)
+            if isinstance(payload, dict):
+                payload['_debug'] = {
+                    'request_time_ms': round(elapsed_ms, 2),
+                    'sql_count': profile['sql_count'],
+                    'sql_time_ms': round(profile['sql_time_ms'], 2),
+                    'slowest_queries': [
+                        {'time_ms': round(duration, 2), 'statement': statement}
+                        for duration, statement in slowest
+                    ]
+                }
+                if cpu_report is not None:
+                    payload['_debug']['cpu_profile'] = cpu_report
+                response.set_data(self.app.json.dumps(payload))
+
+        return response
+
+    def _start_cpu_profiler(self):
+        """Start a CPU profiler for the current request"""
+        if self.app.config.get('PROFILING_ENGINE') == 'pyinstrument' and PyinstrumentProfiler:
+            profiler = PyinstrumentProfiler()
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        return profiler
+
+    def _stop_cpu_profiler(self, profiler):
+        """Stop the profiler, save its output and return (file, text report)"""
+        output_dir = self.app.config.get('PROFILING_OUTPUT_DIR', 'profiles')
+        os.makedirs(output_dir, exist_ok=True)
+        endpoint = (request.endpoint or 'unknown').replace('.', '_')
+        basename = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}_{request.method}_{endpoint}"
+
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            path = os.path.join(output_dir, f"{basename}.prof")
+            profiler.dump_stats(path)
+
+            stream = io.StringIO()
+            stats = pstats.Stats(profiler, stream=stream)
+            stats.sort_stats('cumulative').print_stats(30)
+            report = stream.getvalue()
+        else:
+            profiler.stop()
+            path = os.path.join(output_dir, f"{basename}.html")
+            with open(path, 'w') as f:
+                f.write(profiler.output_html())
+            report = profiler.output_text()
+
+        print(f"[profiling] CPU profile saved to {path}")
+        return path, report
@@ -0,0 +1,131 @@
+"""
+DDSketch quantile sketch
+
+Values are counted in logarithmic bins of ratio gamma = (1 + a) / (1 - a),
+so any quantile is answered with a relative error of at most `a`. Two
+sketches with the same accuracy merge exactly by adding bin counts, which
+makes them suitable for per-bucket storage merged at query time.
+"""
+
+import bisect
+import json
+import math
+
+# Values closer to zero than this are counted as zero
+MIN_INDEXABLE_VALUE = 1e-9
+
+
+class DDSketch:
+    """Mergeable quantile sketch with relative accuracy guarantees"""
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.positive = {}  # bin key -> count
+        self.negative = {}  # bin key of -value -> count
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _key(self, value):
+        return math.ceil(math.log(value) / self.log_gamma)
+
+    def _value(self, key):
+        """Representative value of a bin (relative error <= accuracy)"""
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value, count=1):
+        value = float(value)
+        if value > MIN_INDEXABLE_VALUE:
+            key = self._key(value)
+            self.positive[key] = self.positive.get(key, 0) + count
+        elif value < -MIN_INDEXABLE_VALUE:
+            key = self._key(-value)
+            self.negative[key] = self.negative.get(key, 0) + count
+        else:
+            self.zero_count += count
+        self.count += count
+        self.sum += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        """Add the counts of another sketch (same accuracy) into this one"""
+        if other.count == 0:
+            return self
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError('Cannot merge sketches with different accuracies')
+        for key, count in other.positive.items():
+            self.positive[key] = self.positive.get(key, 0) + count
+        for key, count in other.negative.items():
+            self.negative[key] = self.negative.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def _bins(self):
+        """(representative value, count) in ascending value order"""
+        for key in sorted(self.negative, reverse=True):
+            yield -self._value(key), self.negative[key]
+        if self.zero_count:
+            yield 0.0, self.zero_count
+        for key in sorted(self.positive):
+            yield self._value(key), self.positive[key]
+
+    def quantile(self, q):
+        """Value at quantile q (0-1), or None when empty"""
+        if self.count == 0:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+
+        rank = q * (self.count - 1)
+        cumulative = 0
+        for value, count in self._bins():
+            cumulative += count
+            if cumulative > rank:
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def histogram(self, edges):
+        """Approximate counts between consecutive edges (values binned by representative)"""
+        counts = [0] * (len(edges) - 1)
+        for value, count in self._bins():
+            value = min(max(value, self.min), self.max)
+            index = min(max(bisect.bisect_right(edges, value) - 1, 0), len(counts) - 1)
+            counts[index] += count
+        return counts
+
+    def to_json(self):
+        return json.dumps({
+            'a': self.relative_accuracy,
+            'p': self.positive,
+            'n': self.negative,
+            'z': self.zero_count,
+            'c': self.count,
+            's': self.sum,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None
+        }, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, data):
+        data = json.loads(data)
+        sketch = cls(data['a'])
+        sketch.positive = {int(key): count for key, count in data['p'].items()}
+        sketch.negative = {int(key): count for key, count in data['n'].items()}
+        sketch.zero_count = data['z']
+        sketch.count = data['c']
+        sketch.sum = data['s']
+        if sketch.count:
+            sketch.min = data['min']
+            sketch.max = data['max']
+        return sketch
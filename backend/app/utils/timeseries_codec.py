@@ -0,0 +1,166 @@
+"""
+Gorilla-style time-series block codec
+
+Timestamps (integer milliseconds) are stored as delta-of-delta with
+variable-length prefixes, values (float64) as XOR with the previous value
+storing only the meaningful bits. Regular sampling and slowly changing
+values compress to a few bits per point.
+"""
+
+import struct
+
+# (prefix, prefix bits, value bits) for delta-of-delta ranges
+_DOD_BUCKETS = [
+    (0b10, 2, 7),
+    (0b110, 3, 9),
+    (0b1110, 4, 12),
+]
+
+
+class BitWriter:
+    """Append-only bit buffer"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.acc = 0
+        self.nbits = 0
+
+    def write(self, value, nbits):
+        self.acc = (self.acc << nbits) | (value & ((1 << nbits) - 1))
+        self.nbits += nbits
+        while self.nbits >= 8:
+            self.nbits -= 8
+            self.buffer.append((self.acc >> self.nbits) & 0xFF)
+        self.acc &= (1 << self.nbits) - 1
+
+    def getvalue(self):
+        data = bytes(self.buffer)
+        if self.nbits:
+            data += bytes([(self.acc << (8 - self.nbits)) & 0xFF])
+        return data
+
+
+class BitReader:
+    """Sequential reader over a bit buffer"""
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def read(self, nbits):
+        start = self.pos >> 3
+        end = (self.pos + nbits + 7) >> 3
+        chunk = int.from_bytes(self.data[start:end], 'big')
+        shift = end * 8 - (self.pos + nbits)
+        self.pos += nbits
+        return (chunk >> shift) & ((1 << nbits) - 1)
+
+
+def _float_bits(value):
+    return struct.unpack('>Q', struct.pack('>d', value))[0]
+
+
+def _bits_float(bits):
+    return struct.unpack('>d', struct.pack('>Q', bits))[0]
+
+
+def _signed(value, nbits):
+    """Two's complement decode of an nbits field"""
+    if value >= 1 << (nbits - 1):
+        value -= 1 << nbits
+    return value
+
+
+def encode_block(points):
+    """
+    Encode [(timestamp_ms, value), ...] (sorted by time) into bytes
+    """
+    writer = BitWriter()
+    writer.write(len(points), 32)
+    if not points:
+        return writer.getvalue()
+
+    first_ts, first_value = points[0]
+    writer.write(first_ts, 64)
+    previous_bits = _float_bits(float(first_value))
+    writer.write(previous_bits, 64)
+
+    previous_ts = first_ts
+    previous_delta = 0
+    previous_leading, previous_trailing = 65, 0
+
+    for ts, value in points[1:]:
+        # Timestamp: delta-of-delta
+        delta = ts - previous_ts
+        dod = delta - previous_delta
+        if dod == 0:
+            writer.write(0, 1)
+        else:
+            for prefix, prefix_bits, value_bits in _DOD_BUCKETS:
+                if -(1 << (value_bits - 1)) <= dod < (1 << (value_bits - 1)):
+                    writer.write(prefix, prefix_bits)
+                    writer.write(dod, value_bits)
+                    break
+            else:
+                writer.write(0b1111, 4)
+                writer.write(dod, 64)
+        previous_ts, previous_delta = ts, delta
+
+        # Value: XOR with previous value
+        bits = _float_bits(float(value))
+        xor = bits ^ previous_bits
+        previous_bits = bits
+        if xor == 0:
+            writer.write(0, 1)
+            continue
+        writer.write(1, 1)
+        leading = min(64 - xor.bit_length(), 31)
+        trailing = (xor & -xor).bit_length() - 1
+        if leading >= previous_leading and trailing >= previous_trailing:
+            writer.write(0, 1)
+            writer.write(xor >> previous_trailing, 64 - previous_leading - previous_trailing)
+        else:
+            meaningful = 64 - leading - trailing
+            writer.write(1, 1)
+            writer.write(leading, 5)
+            writer.write(meaningful & 0x3F, 6)  # 64 is stored as 0
+            writer.write(xor >> trailing, meaningful)
+            previous_leading, previous_trailing = leading, trailing
+
+    return writer.getvalue()
+
+
+def decode_block(data):
+    """Decode bytes produced by encode_block into [(timestamp_ms, value), ...]"""
+    reader = BitReader(data)
+    count = reader.read(32)
+    if not count:
+        return []
+
+    ts = reader.read(64)
+    bits = reader.read(64)
+    points = [(ts, _bits_float(bits))]
+
+    delta = 0
+    leading, trailing = 0, 0
+    for _ in range(count - 1):
+        if reader.read(1):
+            for prefix, prefix_bits, value_bits in _DOD_BUCKETS:
+                # Consume the remaining prefix bits one at a time
+                if reader.read(1) == 0:
+                    dod = _signed(reader.read(value_bits), value_bits)
+                    break
+            else:
+                dod = _signed(reader.read(64), 64)
+            delta += dod
+        ts += delta
+
+        if reader.read(1):
+            if reader.read(1):
+                leading = reader.read(5)
+                meaningful = reader.read(6) or 64
+                trailing = 64 - leading - meaningful
+            bits ^= reader.read(64 - leading - trailing) << trailing
+        points.append((ts, _bits_float(bits)))
+
+    return points
@@ -0,0 +1 @@
+"""Backend benchmark suite (run with `python -m benchmarks`)"""
@@ -0,0 +1,334 @@
+"""
+Benchmark cases for the backend hot paths
+
+Read cases run before ingest cases because ingestion grows the dataset.
+"""
+
+import json
+from types import SimpleNamespace
+from .harness import benchmark
+
+
+# ---------------------------------------------------------------------------
+# Micro benchmarks
+# ---------------------------------------------------------------------------
+
+@benchmark('encrypt', group='micro')
+def bench_encrypt(ctx):
+    from app.utils.encryption import EncryptionService
+
+    encryption_service = EncryptionService.from_config(ctx.app.config)
+    values = [str(round(ctx.rng.uniform(0, 100), 2)) for _ in range(1000)]
+
+    def run():
+        for value in values:
+            encryption_service.encrypt(value)
+    return run, len(values)
+
+
+@benchmark('decrypt', group='micro')
+def bench_decrypt(ctx):
+    from app.utils.encryption import EncryptionService
+
+    encryption_service = EncryptionService.from_config(ctx.app.config)
+    ciphertexts = [encryption_service.encrypt(str(round(ctx.rng.uniform(0, 100), 2))) for _ in range(1000)]
+
+    def run():
+        for ciphertext in ciphertexts:
+            encryption_service.decrypt(ciphertext)
+    return run, len(ciphertexts)
+
+
+def _block_points(ctx, count=3600):
+    start = 1_700_000_000_000
+    value = 20.0
+    points = []
+    for i in range(count):
+        value = round(value + ctx.rng.uniform(-0.2, 0.2), 1)
+        points.append((start + i * 1000, value))
+    return points
+
+
+@benchmark('block_encode_encrypt_3600', group='micro')
+def bench_block_encode(ctx):
+    from app.utils.encryption import EncryptionService
+    from app.utils.timeseries_codec import encode_block
+
+    encryption_service = EncryptionService.from_config(ctx.app.config)
+    points = _block_points(ctx)
+
+    def run():
+        encryption_service.encrypt(encode_block(points))
+    return run, len(points)
+
+
+@benchmark('block_decrypt_decode_3600', group='micro')
+def bench_block_decode(ctx):
+    from app.utils.encryption import EncryptionService
+    from app.utils.timeseries_codec import encode_block, decode_block
+
+    encryption_service = EncryptionService.from_config(ctx.app.config)
+    payload = encryption_service.encrypt(encode_block(_block_points(ctx)))
+
+    def run():
+        decode_block(encryption_service.decrypt_bytes(payload))
+    return run, 3600
+
+
+@benchmark('anomaly_update', group='micro')
+def bench_anomaly_update(ctx):
+    from app.utils.anomaly import AnomalyDetector, AnomalyState
+
+    detector = AnomalyDetector()
+    states = [AnomalyState() for _ in range(100)]
+    values = [ctx.rng.gauss(20, 0.5) for _ in range(1000)]
+
+    def run():
+        for index, value in enumerate(values):
+            detector.update(states[index % len(states)], value)
+    return run, len(values)
+
+
+@benchmark('dedup_check', group='micro')
+def bench_dedup_check(ctx):
+    from datetime import datetime, timedelta
+    from app.utils.bloom import RotatingBloomFilter
+
+    bloom = RotatingBloomFilter(1000000, 0.0001)
+    start = datetime.utcnow()
+    keys = [f"{i % 100}:t:{(start + timedelta(seconds=i)).isoformat()}" for i in range(1000)]
+    rounds = iter(range(1000000))
+
+    def run():
+        # New keys every round: the common, not-seen-before case
+        offset = f"{next(rounds)}:"
+        for key in keys:
+            bloom.check_and_add([offset + key])
+    return run, len(keys)
+
+
+def _history_payload(ctx, count=10000):
+    from datetime import datetime, timedelta
+
+    now = datetime.utcnow()
+    return {'data': [
+        {'id': i, 'sensor_id': ctx.sensor_ids[i % len(ctx.sensor_ids)], 'value': str(round(ctx.rng.uniform(0, 50), 2)),
+         'unit': '°C', 'timestamp': now - timedelta(seconds=i)}
+        for i in range(count)
+    ], 'total': count}
+
+
+@benchmark('serialize_history_10000_json', group='micro')
+def bench_serialize_stdlib(ctx):
+    from app.utils.json_provider import StdlibJSONProvider
+
+    provider = StdlibJSONProvider(ctx.app)
+    payload = _history_payload(ctx)
+
+    def run():
+        provider.response(payload)
+    return run, len(payload['data'])
+
+
+@benchmark('serialize_history_10000_fast', group='micro')
+def bench_serialize_fast(ctx):
+    from app.utils.json_provider import FastJSONProvider
+
+    provider = FastJSONProvider(ctx.app)
+    payload = _history_payload(ctx)
+
+    def run():
+        provider.response(payload)
+    return run, len(payload['data'])
+
+
+def _read_readings(ctx, name, read):
+    """Decrypt and convert every seeded reading; peak memory stored in ctx.extra"""
+    import tracemalloc
+    from app.utils.encryption import EncryptionService
+
+    encryption_service = EncryptionService.from_config(ctx.app.config)
+
+    def run():
+        result = read(encryption_service)
+        ctx.db.session.remove()
+        return result
+
+    tracemalloc.start()
+    count = len(run())
+    ctx.extra[name] = {'rows': count, 'peak_kb': tracemalloc.get_traced_memory()[1] // 1024}
+    tracemalloc.stop()
+    return run, count
+
+
+@benchmark('read_readings_orm', group='micro')
+def bench_read_readings_orm(ctx):
+    from app.models import SensorData
+
+    def read(encryption_service):
+        return [record.to_dict(decrypted_value=encryption_service.decrypt(record.encrypted_value))
+                for record in SensorData.query.order_by(SensorData.id).all()]
+    return _read_readings(ctx, 'read_readings_orm', read)
+
+
+@benchmark('read_readings_core', group='micro')
+def bench_read_readings_core(ctx):
+    from app.models import SensorData
+    from app.services.query_service import select_readings, stream_rows
+
+    def read(encryption_service):
+        return [SensorData.row_dict(row, decrypted_value=encryption_service.decrypt(row.encrypted_value))
+                for row in stream_rows(select_readings().order_by(SensorData.id))]
+    return _read_readings(ctx, 'read_readings_core', read)
+
+
+# ---------------------------------------------------------------------------
+# Read endpoints
+# ---------------------------------------------------------------------------
+
+def _get(ctx, url):
+    def run():
+        response = ctx.client.get(url, headers=ctx.headers)
+        assert response.status_code == 200, response.get_data(as_text=True)
+    return run
+
+
+@benchmark('api_latest')
+def bench_latest(ctx):
+    return _get(ctx, '/api/sensor-data/latest'), 1
+
+
+@benchmark('api_stats')
+def bench_stats(ctx):
+    return _get(ctx, f"/api/sensor-data/stats/{ctx.sensor_ids[0]}"), 1
+
+
+@benchmark('api_quantiles_48h')
+def bench_quantiles(ctx):
+    from datetime import datetime, timedelta
+
+    start = (datetime.utcnow() - timedelta(hours=48)).isoformat()
+    return _get(ctx, f"/api/sensor-data/quantiles/{ctx.sensor_ids[0]}?start_date={start}"), 1
+
+
+@benchmark('api_history_1000')
+def bench_history(ctx):
+    return _get(ctx, f"/api/sensor-data?sensor_id={ctx.sensor_ids[0]}&limit=1000"), 1
+
+
+def _history_10000(ctx, name, encoding, response_format='rows'):
+    url = f'/api/sensor-data?limit=10000&format={response_format}'
+    headers = dict(ctx.headers, **({'Accept-Encoding': encoding} if encoding else {}))
+    response = ctx.client.get(url, headers=headers)
+    ctx.extra[name] = {
+        'bytes': len(response.data),
+        'content_encoding': response.headers.get('Content-Encoding', 'identity')
+    }
+
+    def run():
+        response = ctx.client.get(url, headers=headers)
+        assert response.status_code == 200
+    return run, 1
+
+
+@benchmark('api_history_10000')
+def bench_history_10000(ctx):
+    return _history_10000(ctx, 'api_history_10000', None)
+
+
+@benchmark('api_history_10000_gzip')
+def bench_history_10000_gzip(ctx):
+    return _history_10000(ctx, 'api_history_10000_gzip', 'gzip')
+
+
+@benchmark('api_history_10000_br')
+def bench_history_10000_br(ctx):
+    return _history_10000(ctx, 'api_history_10000_br', 'br, gzip;q=0.8')
+
+
+@benchmark('api_history_10000_columnar')
+def bench_history_10000_columnar(ctx):
+    return _history_10000(ctx, 'api_history_10000_columnar', None, 'columnar')
+
+
+@benchmark('api_history_10000_columnar_gzip')
+def bench_history_10000_columnar_gzip(ctx):
+    return _history_10000(ctx, 'api_history_10000_columnar_gzip', 'gzip', 'columnar')
+
+
+@benchmark('api_aligned_24h_5m')
+def bench_aligned(ctx):
+    ids = ','.join(str(sensor_id) for sensor_id in ctx.sensor_ids)
+    return _get(ctx, f"/api/sensor-data/aligned?sensor_ids={ids}&interval=300"), 1
+
+
+@benchmark('api_history_range')
+def bench_history_range(ctx):
+    from datetime import datetime, timedelta
+
+    end = datetime.utcnow() - timedelta(hours=12)
+    start = end - timedelta(hours=6)
+    url = (f"/api/sensor-data?sensor_id={ctx.sensor_ids[0]}"
+           f"&start_date={start.isoformat()}&end_date={end.isoformat()}&limit=10000")
+    return _get(ctx, url), 1
+
+
+@benchmark('api_alerts')
+def bench_alerts(ctx):
+    return _get(ctx, '/api/alerts?limit=100'), 1
+
+
+@benchmark('api_alerts_summary')
+def bench_alerts_summary(ctx):
+    return _get(ctx, '/api/alerts/summary'), 1
+
+
+# ---------------------------------------------------------------------------
+# Ingestion
+# ---------------------------------------------------------------------------
+
+def _mqtt_messages(ctx, count):
+    sensors = [('BENCH_INGEST_TEMP', 'temperature', '°C'), ('BENCH_INGEST_HUM', 'humidity', '%')]
+    messages = []
+    for i in range(count):
+        sensor_id, sensor_type, unit = sensors[i % len(sensors)]
+        payload = {'sensor_id': sensor_id, 'value': round(ctx.rng.uniform(0, 50), 2),
+                   'unit': unit, 'type': sensor_type}
+        messages.append(SimpleNamespace(topic='iot/sensors/data', payload=json.dumps(payload).encode()))
+    return messages
+
+
+@benchmark('ingest_mqtt_single')
+def bench_ingest_single(ctx):
+    from app import mqtt_service
+
+    message = _mqtt_messages(ctx, 1)[0]
+
+    def run():
+        mqtt_service.on_message(None, None, message)
+    return run, 1
+
+
+@benchmark('ingest_mqtt_batch_100')
+def bench_ingest_batch(ctx):
+    from app import mqtt_service
+
+    messages = _mqtt_messages(ctx, 100)
+
+    def run():
+        for message in messages:
+            mqtt_service.on_message(None, None, message)
+    return run, len(messages)
+
+
+@benchmark('ingest_http_single')
+def bench_ingest_http(ctx):
+    from app.models import Sensor
+
+    sensor = Sensor.query.get(ctx.sensor_ids[0])
+    payload = {'sensor_id': sensor.sensor_id, 'value': 21.5, 'unit': '°C'}
+
+    def run():
+        response = ctx.client.post('/api/sensor-data', json=payload, headers=ctx.headers)
+        assert response.status_code == 201, response.get_data(as_text=True)
+    return run, 1
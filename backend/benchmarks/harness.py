@@ -0,0 +1,272 @@
+"""
+Benchmark harness: case registry, seeded dataset, timing and baseline comparison
+"""
+
+import atexit
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+
+# Registered benchmark cases, in execution order: name -> (setup, group)
+CASES = {}
+
+# Background services started by create_app: (extension, final flush)
+BACKGROUND_SERVICES = (
+    ('block_storage', 'seal_all'),
+    ('sketches', 'flush'),
+    ('group_aggregates', 'flush'),
+    ('anomalies', 'checkpoint'),
+    ('liveness', 'sync'),
+    ('result_cache', 'sync'),
+)
+
+
+def benchmark(name, group='macro'):
+    """
+    Register a benchmark case
+
+    The decorated setup function receives the BenchContext and returns
+    (fn, ops): `fn()` is the timed callable and `ops` the number of
+    operations it performs per call (used for ops/s).
+    """
+    def decorator(setup):
+        CASES[name] = (setup, group)
+        return setup
+    return decorator
+
+
+class _NullWriter:
+    """Swallow the app's print() output while timing"""
+
+    def write(self, text):
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+class BenchContext:
+    """Flask app, test client and seeded dataset shared by the cases"""
+
+    def __init__(self, database_url, rows, sensors, alerts, seed):
+        # Must be set before the config module is imported
+        os.environ['TEST_DATABASE_URL'] = database_url
+
+        from app import create_app
+        from app.models import db
+
+        self.rows = rows
+        self.sensors = sensors
+        self.alerts = alerts
+        self.rng = random.Random(seed)
+        # Extra per-case measurements (e.g. response bytes): name -> {metric: value}
+        self.extra = {}
+
+        with redirect_stdout(_NullWriter()):
+            self.app = create_app('testing')
+        self.db = db
+        self.client = self.app.test_client()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+        self._reset_database()
+        self.sensor_ids = self._seed()
+
+        response = self.client.post('/api/auth/login', json={'username': 'admin', 'password': 'admin123'})
+        self.headers = {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+    def _reset_database(self):
+        """Start from empty tables so every run sees the same dataset"""
+        from app.models import User
+
+        self.db.drop_all()
+        self.db.create_all()
+        admin = User(username='admin', email='admin@example.com', role='admin')
+        admin.set_password('admin123')
+        self.db.session.add(admin)
+        self.db.session.commit()
+
+    def _seed(self):
+        """Insert sensors, encrypted readings over the last 48 hours and alerts"""
+        from app.models import Sensor, SensorData, Alert
+        from app.utils.encryption import EncryptionService
+        from app.services.sketch_service import sketch_bucket
+
+        encryption_service = EncryptionService.from_config(self.app.config)
+        types = ['temperature', 'humidity', 'soil_moisture', 'light']
+        ranges = {'temperature': (5, 40), 'humidity': (20, 95), 'soil_moisture': (5, 80), 'light': (0, 15000)}
+        units = {'temperature': '°C', 'humidity': '%', 'soil_moisture': '%', 'light': 'lux'}
+
+        sensors = []
+        for i in range(self.sensors):
+            sensor_type = types[i % len(types)]
+            sensors.append(Sensor(sensor_id=f"BENCH_{i:04d}", name=f"Bench {sensor_type} {i}",
+                                  type=sensor_type, location=f"Zone {i % 5}", status='active'))
+        self.db.session.add_all(sensors)
+        self.db.session.commit()
+
+        now = datetime.utcnow()
+        span = timedelta(hours=48).total_seconds()
+        sketch_service = self.app.extensions['sketches']
+        sketches = {}
+        chunk = []
+        for i in range(self.rows):
+            sensor = sensors[i % len(sensors)]
+            low, high = ranges[sensor.type]
+            value = round(self.rng.uniform(low, high), 2)
+            timestamp = now - timedelta(seconds=span * i / max(self.rows, 1))
+            chunk.append({
+                'sensor_id': sensor.id,
+                'encrypted_value': encryption_service.encrypt(str(value)),
+                'unit': units[sensor.type],
+                'timestamp': timestamp
+            })
+            # Hourly quantile sketches, as ingestion would have built them
+            key = (sensor.id, sketch_bucket(timestamp))
+            if key not in sketches:
+                sketches[key] = (sketch_service.new_sketch(), units[sensor.type], None)
+            sketches[key][0].add(value)
+            if len(chunk) == 5000:
+                self.db.session.execute(SensorData.__table__.insert(), chunk)
+                chunk = []
+        if chunk:
+            self.db.session.execute(SensorData.__table__.insert(), chunk)
+        sketch_service.merge_into_db(sketches)
+
+        alerts = []
+        for i in range(self.alerts):
+            sensor = sensors[i % len(sensors)]
+            alerts.append({
+                'sensor_id': sensor.id,
+                'alert_type': f"high_{sensor.type}",
+                'message': f"{sensor.name} value is too high",
+                'severity': self.rng.choice(['warning', 'critical']),
+                'threshold_value': 35.0,
+                'actual_value': 40.0,
+                'is_resolved': self.rng.random() < 0.7,
+                'created_at': now - timedelta(minutes=i)
+            })
+        if alerts:
+            self.db.session.execute(Alert.__table__.insert(), alerts)
+        self.db.session.commit()
+
+        return [sensor.id for sensor in sensors]
+
+    def close(self):
+        """Stop and flush the background services while the database still exists"""
+        with redirect_stdout(_NullWriter()):
+            for name, flush in BACKGROUND_SERVICES:
+                service = self.app.extensions[name]
+                if service.thread is None:
+                    continue
+                getattr(service, 'stop', service.stop_event.set)()
+                service.thread.join(timeout=10)
+                getattr(service, flush)()
+                atexit.unregister(getattr(service, flush))
+        self.db.session.remove()
+        self.app_context.pop()
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def run_cases(ctx, names, rounds, warmup, min_time):
+    """Time every selected case and return its statistics"""
+    results = {}
+    for name in names:
+        setup, group = CASES[name]
+        fn, ops = setup(ctx)
+
+        with redirect_stdout(_NullWriter()):
+            for _ in range(warmup):
+                fn()
+
+            timings = []
+            started = time.perf_counter()
+            while len(timings) < rounds or (time.perf_counter() - started < min_time and len(timings) < rounds * 10):
+                t0 = time.perf_counter()
+                fn()
+                timings.append(time.perf_counter() - t0)
+
+        median = statistics.median(timings)
+        results[name] = {
+            'group': group,
+            'ops': ops,
+            'rounds': len(timings),
+            'min_s': min(timings),
+            'median_s': median,
+            'mean_s': statistics.mean(timings),
+            'stdev_s': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+            'ops_per_s': ops / median if median else None
+        }
+        print(f"  {name:<28} {median * 1000:>10.3f} ms/call  {results[name]['ops_per_s']:>12.1f} ops/s")
+        if name in ctx.extra:
+            results[name]['extra'] = ctx.extra[name]
+            print(f"  {'':<28} " + '  '.join(f"{key}={value}" for key, value in ctx.extra[name].items()))
+    return results
+
+
+def build_report(ctx, results):
+    """Machine-readable report with the environment needed to compare runs"""
+    return {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'git_revision': _git_revision(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'database': ctx.db.engine.dialect.name,
+            'rows': ctx.rows,
+            'sensors': ctx.sensors,
+            'alerts': ctx.alerts
+        },
+        'results': results
+    }
+
+
+def compare(report, baseline, threshold):
+    """Print median ratios against a baseline report; return regressed case names"""
+    regressions = []
+    print(f"\n{'case':<28} {'baseline ms':>12} {'current ms':>12} {'change':>9}")
+    for name, current in report['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            print(f"{name:<28} {'-':>12} {current['median_s'] * 1000:>12.3f} {'new':>9}")
+            continue
+        ratio = current['median_s'] / previous['median_s'] if previous['median_s'] else 1.0
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = '  faster'
+        print(f"{name:<28} {previous['median_s'] * 1000:>12.3f} {current['median_s'] * 1000:>12.3f} "
+              f"{(ratio - 1) * 100:>+8.1f}%{flag}")
+
+    baseline_meta = baseline.get('meta', {})
+    for key in ('rows', 'sensors', 'database'):
+        if baseline_meta.get(key) != report['meta'].get(key):
+            print(f"Warning: baseline {key}={baseline_meta.get(key)} differs from current "
+                  f"{key}={report['meta'].get(key)}")
+    return regressions
+
+
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_report(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
@@ -0,0 +1,43 @@
+"""
+Serveur d'ingestion asynchrone de la plateforme IoT (ASGI)
+Expose POST /api/sensor-data et /api/sensor-data/batch (même contrat que
+l'API Flask) et, si INGEST_ASYNC_MQTT=true, consomme aussi le broker MQTT.
+Les écritures passent par un pilote PostgreSQL asynchrone (asyncpg) par lots.
+
+Dépendances optionnelles : pip install -r requirements-async.txt
+
+Exemples :
+    python ingest_server.py
+    python ingest_server.py --port 5001 --workers 4
+"""
+
+import argparse
+import os
+
+import uvicorn
+
+
+def parse_args():
+    """Lire les options de la ligne de commande"""
+    parser = argparse.ArgumentParser(description="Serveur d'ingestion asynchrone IoT")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("INGEST_PORT", 5001)))
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Nombre de processus (un seul si le consommateur MQTT est activé)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    # Chaque processus recevrait tous les messages MQTT : un seul consommateur
+    if args.workers > 1 and os.getenv("INGEST_ASYNC_MQTT", "false").lower() == "true":
+        raise SystemExit("INGEST_ASYNC_MQTT=true nécessite --workers 1")
+
+    print(f"Démarrage de l'ingestion asynchrone sur {args.host}:{args.port}")
+    uvicorn.run("app.asgi:create_asgi_app", factory=True, host=args.host, port=args.port,
+                workers=args.workers, access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@
 Script de test pour envoyer des données de capteurs via HTTPS
 """
 
+import os
 import requests
 import json
 import time
@@ -12,6 +13,9 @@ from datetime import datetime
 API_URL = "http://localhost:5000/api"
 USERNAME = "admin"
 PASSWORD = "admin123"
+# Clé API d'appareil (POST /api/device-keys) : si définie, les mesures sont
+# envoyées avec l'en-tête X-API-Key au lieu du token JWT
+DEVICE_API_KEY = os.getenv("DEVICE_API_KEY")
 
 # Capteurs à tester
 SENSORS = [
@@ -78,7 +82,10 @@ def create_sensors(token):
 def send_sensor_data(token):
     """Envoyer des données de capteurs"""
     print("\nEnvoi de données de capteurs...")
-    headers = {"Authorization": f"Bearer {token}"}
+    if DEVICE_API_KEY:
+        headers = {"X-API-Key": DEVICE_API_KEY}
+    else:
+        headers = {"Authorization": f"Bearer {token}"}
 
     iteration = 0
     while True:
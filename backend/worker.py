@@ -0,0 +1,72 @@
+"""
+Worker des tâches de fond de la plateforme IoT
+Consomme la file de tâches stockée en base (table jobs) dans des processus
+séparés de l'API : compaction, suppression de capteurs, etc.
+
+Exemples :
+    python worker.py
+    python worker.py --processes 4
+"""
+
+import argparse
+import multiprocessing
+import os
+import signal
+
+from app import create_app, create_job_worker
+
+
+def parse_args():
+    """Lire les options de la ligne de commande"""
+    parser = argparse.ArgumentParser(description="Worker des tâches de fond IoT")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="Nombre de processus worker (défaut : JOB_WORKERS)")
+    return parser.parse_args()
+
+
+def run_worker(config_name, index):
+    """Boucle d'un processus worker (arrêt propre sur SIGTERM / SIGINT)"""
+    app = create_app(config_name, with_ingest=False)
+    worker = create_job_worker(app, name=f"{os.uname().nodename}:{os.getpid()}:{index}")
+
+    # La tâche en cours s'arrête à son prochain point de reprise et retourne dans la file
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    signal.signal(signal.SIGINT, lambda *_: worker.stop())
+
+    worker.run_forever()
+
+
+def main():
+    args = parse_args()
+    config_name = os.getenv("FLASK_ENV", "development")
+
+    processes = args.processes
+    if processes is None:
+        from config import config
+        processes = config[config_name].JOB_WORKERS
+
+    if processes <= 1:
+        run_worker(config_name, 0)
+        return
+
+    print(f"Démarrage de {processes} processus worker")
+    context = multiprocessing.get_context("spawn")
+    children = [context.Process(target=run_worker, args=(config_name, index), name=f"job-worker-{index}")
+                for index in range(processes)]
+    for child in children:
+        child.start()
+
+    def forward(signum, _frame):
+        for child in children:
+            if child.is_alive():
+                os.kill(child.pid, signum)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+
+    for child in children:
+        child.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,20 @@ CREATE INDEX IF NOT EXISTS idx_sensor_data_timestamp ON sensor_data(timestamp);
 CREATE INDEX IF NOT EXISTS idx_alerts_sensor_id ON alerts(sensor_id);
 CREATE INDEX IF NOT EXISTS idx_alerts_created_at ON alerts(created_at);
 CREATE INDEX IF NOT EXISTS idx_alerts_is_resolved ON alerts(is_resolved);
+CREATE INDEX IF NOT EXISTS idx_alerts_resolved_at ON alerts(resolved_at);
+
+-- Plain numeric values (VALUE_STORAGE_POLICIES), for databases created before this column
+ALTER TABLE sensor_data ADD COLUMN IF NOT EXISTS value DOUBLE PRECISION;
+ALTER TABLE sensor_data ALTER COLUMN encrypted_value DROP NOT NULL;
+
+-- Duplicate suppression keys (device timestamp / message ID), for databases created before these columns
+ALTER TABLE sensor_data ADD COLUMN IF NOT EXISTS device_timestamp TIMESTAMP;
+ALTER TABLE sensor_data ADD COLUMN IF NOT EXISTS message_id VARCHAR(64);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_sensor_data_device_timestamp ON sensor_data(sensor_id, device_timestamp);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_sensor_data_message_id ON sensor_data(sensor_id, message_id);
+
+-- First reading counted by ingestion per hourly sketch (sketch_backfill), for databases created before this column
+ALTER TABLE sensor_data_sketches ADD COLUMN IF NOT EXISTS first_timestamp TIMESTAMP;
 
 -- Grant privileges (adjust username as needed)
 -- GRANT ALL PRIVILEGES ON DATABASE iot_platform TO your_username;
@@ -49,13 +49,15 @@ const Dashboard = () => {
       const response = await sensorDataAPI.getAll({
         sensor_id: sensorId,
         limit: 50,
+        format: 'columnar',
       });
 
-      const formattedData = response.data.data.map((item) => ({
-        time: format(new Date(item.timestamp), 'HH:mm'),
-        value: parseFloat(item.value),
-        timestamp: item.timestamp,
-      })).reverse();
+      const series = response.data.series[0];
+      const formattedData = series ? series.timestamps.map((timestamp, index) => ({
+        time: format(new Date(timestamp), 'HH:mm'),
+        value: series.values[index],
+        timestamp,
+      })) : [];
 
       setSensorHistory(formattedData);
     } catch (error) {